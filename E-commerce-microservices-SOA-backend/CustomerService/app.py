@@ -1,9 +1,21 @@
 from flask import Flask, request, jsonify
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
 from decimal import Decimal
 import logging
-import requests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.config import env_int, service_url
+from common.db import ReadRouter, install_read_routing
+from common.deadlines import install_deadline
+from common.logs import configure_logging
+from common.metrics import install_metrics, instrument_connection
+from common.pagination import decode_cursor, page, parse_page_size
+from common.serve import run_service
+from common.tracing import install_tracing
 
 # ============================================================
 # Configuration
@@ -16,27 +28,35 @@ DB_CONFIG = {
     "database": "ecommerce_system"
 }
 
-ORDER_SERVICE_URL = "http://localhost:5001"
+ORDER_SERVICE_URL = service_url('order')
+
+ORDER_HISTORY_DEFAULT_LIMIT = env_int('ORDER_HISTORY_DEFAULT_LIMIT', 20)
+ORDER_HISTORY_MAX_LIMIT = env_int('ORDER_HISTORY_MAX_LIMIT', 100)
 
 app = Flask(__name__)
+install_metrics(app)
+install_tracing(app, 'customer')
+install_deadline(app)
+install_read_routing(app)
 
 # Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+configure_logging('customer')
 logger = logging.getLogger(__name__)
 
 
 def get_db_connection():
     """Create database connection"""
     try:
-        return mysql.connector.connect(**DB_CONFIG)
+        return instrument_connection(mysql.connector.connect(**DB_CONFIG))
     except Error as e:
         logger.error(f"Database connection error: {e}")
         raise
 
 
+# Read-only endpoints use a replica when DB_READ_REPLICAS is set
+read_router = ReadRouter(get_db_connection, DB_CONFIG)
+
+
 def decimal_to_float(value):
     """Convert Decimal to float"""
     if isinstance(value, Decimal):
@@ -54,7 +74,7 @@ def get_customer(customer_id):
     logger.info(f"📋 GET /api/customers/{customer_id}")
     
     try:
-        conn = get_db_connection()
+        conn = read_router.connection(customer_id)
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -90,73 +110,116 @@ def get_customer(customer_id):
 
 @app.route('/api/customers/<int:customer_id>/orders', methods=['GET'])
 def get_customer_orders(customer_id):
-    """Get customer order history (calls Order Service)"""
+    """Get customer order history, newest first
+
+    Without limit or after the whole history is returned, as before.
+    With either, one keyset page is returned: limit, after (the previous
+    page's next_cursor). include_items (default true; false returns order
+    summaries only) applies to both.
+    """
     logger.info(f"📦 GET /api/customers/{customer_id}/orders")
     
     try:
-        # First, verify customer exists
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT customer_id, name FROM customers WHERE customer_id = %s", (customer_id,))
-        customer = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if not customer:
-            logger.warning(f"⚠️ Customer {customer_id} not found")
-            return jsonify({'error': 'Customer not found'}), 404
-        
-        # Get orders from database
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT o.order_id, o.customer_id, o.total_amount, o.subtotal, 
-                   o.discount, o.tax, o.status, o.created_at
-            FROM orders o
-            WHERE o.customer_id = %s
-            ORDER BY o.created_at DESC
-        """, (customer_id,))
-        
-        orders = cursor.fetchall()
-        
-        # Get items for each order
-        for order in orders:
-            order_id = order['order_id']
+        paged = bool(request.args.get('limit') or request.args.get('after'))
+        limit = None
+        if paged:
+            limit = parse_page_size(
+                request.args.get('limit'), ORDER_HISTORY_DEFAULT_LIMIT, ORDER_HISTORY_MAX_LIMIT
+            )
+        include_items = request.args.get('include_items', 'true').strip().lower() not in ('0', 'false', 'no')
+        after = None
+        if request.args.get('after'):
+            after = decode_cursor(request.args['after']).get('order_id')
+            if not isinstance(after, int):
+                raise ValueError('Invalid cursor')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        conn = read_router.connection(customer_id)
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT customer_id, name FROM customers WHERE customer_id = %s", (customer_id,))
+            customer = cursor.fetchone()
             
-            cursor.execute("""
-                SELECT oi.*, i.product_name
-                FROM order_items oi
-                JOIN inventory i ON oi.product_id = i.product_id
-                WHERE oi.order_id = %s
-            """, (order_id,))
+            if not customer:
+                cursor.close()
+                logger.warning(f"⚠️ Customer {customer_id} not found")
+                return jsonify({'error': 'Customer not found'}), 404
             
-            items = cursor.fetchall()
+            # idx_customer_id is (customer_id, order_id), so a page is a range
+            # read of limit + 1 index entries whatever its depth
+            conditions = "o.customer_id = %s"
+            params = [customer_id]
+            if after is not None:
+                conditions += " AND o.order_id < %s"
+                params.append(after)
+            limit_sql = ""
+            if paged:
+                limit_sql = "LIMIT %s"
+                params.append(limit + 1)
             
-            # Convert datetime and Decimal
-            if order.get('created_at'):
-                order['created_at'] = order['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-            
-            for key in list(order.keys()):
-                if isinstance(order[key], Decimal):
-                    order[key] = float(order[key])
+            cursor.execute(f"""
+                SELECT o.order_id, o.customer_id, o.total_amount, o.subtotal, 
+                       o.discount, o.tax, o.status, o.created_at
+                FROM orders o FORCE INDEX (idx_customer_id)
+                WHERE {conditions}
+                ORDER BY o.order_id DESC
+                {limit_sql}
+            """, params)
+            if paged:
+                orders, next_cursor = page(
+                    cursor.fetchall(), limit, lambda order: {'order_id': order['order_id']}
+                )
+                # The page is not the whole history; count it from the index
+                cursor.execute("""
+                    SELECT COUNT(*) AS total FROM orders FORCE INDEX (idx_customer_id)
+                    WHERE customer_id = %s
+                """, (customer_id,))
+                total_orders = cursor.fetchone()['total']
+            else:
+                orders, next_cursor = cursor.fetchall(), None
+                total_orders = len(orders)
             
-            for item in items:
-                for key in list(item.keys()):
-                    if isinstance(item[key], Decimal):
-                        item[key] = float(item[key])
+            # Items of the whole page in one query, grouped in memory
+            if include_items and orders:
+                items_by_order = {order['order_id']: [] for order in orders}
+                placeholders = ', '.join(['%s'] * len(items_by_order))
+                cursor.execute(f"""
+                    SELECT oi.*, i.product_name
+                    FROM order_items oi
+                    JOIN inventory i ON oi.product_id = i.product_id
+                    WHERE oi.order_id IN ({placeholders})
+                    ORDER BY oi.order_id, oi.item_id
+                """, list(items_by_order))
+                
+                for item in cursor.fetchall():
+                    for key in list(item.keys()):
+                        item[key] = decimal_to_float(item[key])
+                    items_by_order[item['order_id']].append(item)
+                
+                for order in orders:
+                    order['items'] = items_by_order[order['order_id']]
             
-            order['items'] = items
+            cursor.close()
+        finally:
+            conn.close()
         
-        cursor.close()
-        conn.close()
+        for order in orders:
+            if order.get('created_at'):
+                order['created_at'] = order['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+            for key in list(order.keys()):
+                order[key] = decimal_to_float(order[key])
         
         logger.info(f"✅ Found {len(orders)} orders for customer {customer_id}")
         
         return jsonify({
             'customer_id': customer_id,
             'customer_name': customer['name'],
-            'total_orders': len(orders),
+            'total_orders': total_orders,
+            'count': len(orders),
+            'limit': limit,
+            'next_cursor': next_cursor,
             'orders': orders
         }), 200
         
@@ -170,7 +233,12 @@ def get_customer_orders(customer_id):
 
 @app.route('/api/customers/<int:customer_id>/loyalty', methods=['PUT'])
 def update_loyalty_points(customer_id):
-    """Update customer loyalty points"""
+    """Update customer loyalty points
+
+    With an ``order_id`` the points are recorded in loyalty_ledger in the
+    same transaction, so a redelivered award for an order already credited
+    changes nothing and reports ``already_applied``.
+    """
     logger.info(f"⭐ PUT /api/customers/{customer_id}/loyalty")
     
     try:
@@ -180,6 +248,9 @@ def update_loyalty_points(customer_id):
             return jsonify({'error': 'points_to_add is required'}), 400
         
         points_to_add = int(data['points_to_add'])
+        order_id = data.get('order_id')
+        if order_id is not None:
+            order_id = int(order_id)
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
@@ -196,7 +267,25 @@ def update_loyalty_points(customer_id):
             conn.close()
             return jsonify({'error': 'Customer not found'}), 404
         
-        conn.commit()
+        already_applied = False
+        if order_id is not None:
+            try:
+                cursor.execute("""
+                    INSERT INTO loyalty_ledger (order_id, customer_id, points)
+                    VALUES (%s, %s, %s)
+                """, (order_id, customer_id, points_to_add))
+            except Error as e:
+                if e.errno != errorcode.ER_DUP_ENTRY:
+                    raise
+                # Redelivery: undo the increment above
+                already_applied = True
+        
+        if already_applied:
+            conn.rollback()
+            logger.info(f"ℹ️ Points for order {order_id} already applied")
+        else:
+            conn.commit()
+            read_router.note_write(customer_id)
         
         # Get updated customer
         cursor.execute("""
@@ -209,14 +298,16 @@ def update_loyalty_points(customer_id):
         cursor.close()
         conn.close()
         
-        logger.info(f"✅ Added {points_to_add} points to customer {customer_id}")
-        logger.info(f"   New total: {customer['loyalty_points']} points")
+        if not already_applied:
+            logger.info(f"✅ Added {points_to_add} points to customer {customer_id}")
+            logger.info(f"   New total: {customer['loyalty_points']} points")
         
         return jsonify({
             'success': True,
             'customer_id': customer_id,
             'customer_name': customer['name'],
-            'points_added': points_to_add,
+            'points_added': 0 if already_applied else points_to_add,
+            'already_applied': already_applied,
             'total_points': customer['loyalty_points']
         }), 200
         
@@ -233,7 +324,7 @@ def get_all_customers():
     logger.info("📋 GET /api/customers/all")
     
     try:
-        conn = get_db_connection()
+        conn = read_router.connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -265,6 +356,11 @@ def get_all_customers():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/stats/read-routing', methods=['GET'])
+def read_routing_stats():
+    return jsonify(read_router.stats()), 200
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -302,8 +398,4 @@ if __name__ == '__main__':
         logger.error("Service may not work properly!")
         logger.info("=" * 60)
     
-    app.run(
-        host='0.0.0.0',
-        port=5004,
-        debug=True
-    )
\ No newline at end of file
+    run_service(app, 'customer', 5004)
\ No newline at end of file
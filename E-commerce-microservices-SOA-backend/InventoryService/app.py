@@ -1,9 +1,30 @@
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, url_for
 import mysql.connector
 from mysql.connector import pooling, Error
 from decimal import Decimal
 import logging
+import os
+import sys
+import threading
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.config import env_bool, env_float, env_int
+from common.db import ReadRouter, install_read_routing
+from common.deadlines import install_deadline
+from common.etags import conditional, not_modified, version_etag
+from common.logs import configure_logging
+from common.metrics import install_metrics, instrument_connection
+from common.pagination import decode_cursor, page, parse_fields, parse_page_size
+from common.serve import after_fork, on_shutdown, run_service
+from common.tracing import install_tracing
+from catalog_cache import CatalogCache
+from product_listing import (
+    PRODUCT_FIELDS, build_listing_query, matches, parse_after, parse_listing_filters, project
+)
+from reservations import ReservationIndex, ReservationSweeper
 
 # ============================================================
 # Configuration
@@ -16,36 +37,82 @@ DB_CONFIG = {
     "database": "ecommerce_system",
     "autocommit": False
 }
-POOL_SIZE = 5
+POOL_SIZE = env_int('INVENTORY_POOL_SIZE', 5)
+MAX_BATCH_SIZE = 1000
+LIST_DEFAULT_LIMIT = env_int('INVENTORY_LIST_DEFAULT_LIMIT', 100)
+LIST_MAX_LIMIT = env_int('INVENTORY_LIST_MAX_LIMIT', 1000)
+
+# Stock holds for checkout sessions
+RESERVATION_TTL = 900
+RESERVATION_MAX_TTL = 3600
+RESERVATION_SWEEP_INTERVAL = 30
+RESERVATION_SWEEP_BATCH = 500
+# A committed reservation with no order this long after its commit lost
+# its order (crash, failed release) and its stock is put back
+RESERVATION_ORPHAN_GRACE = env_int('RESERVATION_ORPHAN_GRACE', 300)
+
+# In-memory catalog. Browsing may be CATALOG_MAX_STALENESS seconds behind
+# the database; the batch stock check only uses the cache when
+# CATALOG_STOCK_MAX_STALENESS is above 0, and reads the database otherwise
+CATALOG_CACHE_ENABLED = env_bool('CATALOG_CACHE_ENABLED', True)
+CATALOG_MAX_STALENESS = env_float('CATALOG_MAX_STALENESS', 2)
+CATALOG_STOCK_MAX_STALENESS = env_float('CATALOG_STOCK_MAX_STALENESS', 0)
+CATALOG_FULL_RELOAD_INTERVAL = env_float('CATALOG_FULL_RELOAD_INTERVAL', 300)
+# Longest an inventory write may stay uncommitted; each refresh re-reads
+# rows updated this long before the previous one
+CATALOG_MAX_TRANSACTION = env_int('CATALOG_MAX_TRANSACTION', 60)
+# Clients may reuse a catalog response this long, then revalidate it
+# with its ETag
+CATALOG_CACHE_CONTROL = f"public, max-age={env_int('CATALOG_HTTP_MAX_AGE', 2)}"
 
 app = Flask(__name__)
+install_metrics(app)
+install_tracing(app, 'inventory')
+install_deadline(app)
+install_read_routing(app)
 
 # Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+configure_logging('inventory')
 logger = logging.getLogger(__name__)
 
 # ============================================================
 # Database Connection Pool
 # ============================================================
 
-try:
-    pool = mysql.connector.pooling.MySQLConnectionPool(
-        pool_name="inventory_pool",
-        pool_size=POOL_SIZE,
-        **DB_CONFIG
-    )
-    logger.info("✓ Database connection pool created successfully")
-except Error as e:
-    logger.error(f"✗ Error creating DB pool: {e}")
-    raise RuntimeError(f"Error creating DB pool: {e}")
+# Created on first use in each process: connections opened before a
+# pre-fork server forks would be shared by every worker
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                try:
+                    _pool = mysql.connector.pooling.MySQLConnectionPool(
+                        pool_name=f"inventory_pool_{os.getpid()}",
+                        pool_size=POOL_SIZE,
+                        **DB_CONFIG
+                    )
+                    _pool_pid = os.getpid()
+                    logger.info("✓ Database connection pool created successfully")
+                except Error as e:
+                    logger.error(f"✗ Error creating DB pool: {e}")
+                    raise RuntimeError(f"Error creating DB pool: {e}")
+    return _pool
 
 
 def get_conn():
     
-    return pool.get_connection()
+    return instrument_connection(get_pool().get_connection())
+
+
+# Catalog reads use a replica when DB_READ_REPLICAS is set; stock checks
+# and reservations stay on the primary
+read_router = ReadRouter(get_conn, DB_CONFIG, sticky_scope='product')
 
 
 def decimal_to_native(value):
@@ -57,82 +124,239 @@ def decimal_to_native(value):
     return value
 
 
+PRODUCT_COLUMNS = """product_id, product_name, quantity_available, quantity_reserved,
+                   unit_price, last_updated"""
+
+
 def row_to_item(row):
     """Convert database row to dictionary."""
-    (product_id, product_name, quantity_available, unit_price, last_updated) = row
+    (product_id, product_name, quantity_available, quantity_reserved, unit_price, last_updated) = row
     return {
         "product_id": product_id,
         "product_name": product_name,
         "quantity_available": quantity_available,
+        "quantity_reserved": quantity_reserved,
+        "available_to_promise": quantity_available - quantity_reserved,
         "unit_price": decimal_to_native(unit_price),
         "last_updated": last_updated.isoformat() if last_updated else None
     }
 
 
+# Loaded from the primary: the version check must see every write
+catalog = CatalogCache(
+    get_conn, PRODUCT_COLUMNS, row_to_item,
+    max_transaction_seconds=CATALOG_MAX_TRANSACTION,
+    full_reload_interval=CATALOG_FULL_RELOAD_INTERVAL
+)
+
+
 # ============================================================
 # API Endpoints
 # ============================================================
 
 @app.route('/inventory', methods=['GET'])
 def list_products():
+    """List products by product_id
+
+    Without limit or after every product is returned, as before. With
+    either, one keyset page is returned and the cursor of the next page
+    comes back in the X-Next-Cursor header and as a rel="next" Link; the
+    body is a plain array both ways. fields (comma-separated projection),
+    in_stock, min_price and max_price apply to both.
+    """
+    logger.info("📦 GET /inventory - Listing products")
     
-    logger.info("📦 GET /inventory - Listing all products")
+    try:
+        filters = parse_listing_filters(request.args)
+        paged = bool(request.args.get('limit') or request.args.get('after'))
+        limit = None
+        if paged:
+            limit = parse_page_size(request.args.get('limit'), LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT)
+        fields = parse_fields(request.args.get('fields'), PRODUCT_FIELDS, always=('product_id',))
+        after = parse_after(decode_cursor(request.args['after'])) if request.args.get('after') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
+    etag = None
     try:
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT product_id, product_name, quantity_available, 
-                   unit_price, last_updated 
-            FROM inventory
-            ORDER BY product_id
-        """)
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        items = [row_to_item(r) for r in rows]
-        logger.info(f"✓ Found {len(items)} products")
-        
-        return jsonify(items), 200
-        
+        if CATALOG_CACHE_ENABLED:
+            # A snapshot swapped in after this only tags newer content
+            # with an older version, which the next request corrects
+            etag = version_etag(catalog.version(CATALOG_MAX_STALENESS))
+            unchanged = not_modified(etag, CATALOG_CACHE_CONTROL)
+            if unchanged is not None:
+                return unchanged
+            items = catalog.scan(
+                CATALOG_MAX_STALENESS, after, limit + 1 if paged else None, matches(filters)
+            )
+        else:
+            sql, params = build_listing_query(PRODUCT_COLUMNS, filters, after, limit)
+            conn = read_router.connection()
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            items = [row_to_item(r) for r in rows]
     except Error as e:
         logger.error(f"✗ Database error: {e}")
         return jsonify({"error": str(e)}), 500
 
+    next_cursor = None
+    if paged:
+        items, next_cursor = page(items, limit, lambda item: {'product_id': item['product_id']})
+    logger.info(f"✓ Found {len(items)} products")
+
+    response = jsonify([project(item, fields) for item in items])
+    if next_cursor:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for("list_products", **args)}>; rel="next"'
+    return conditional(response, CATALOG_CACHE_CONTROL, etag)
+
 
 @app.route('/inventory/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     
     logger.info(f"🔍 GET /inventory/{product_id} - Checking product")
     
+    etag = None
     try:
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT product_id, product_name, quantity_available, 
-                   unit_price, last_updated 
-            FROM inventory 
-            WHERE product_id = %s
-        """, (product_id,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        if CATALOG_CACHE_ENABLED:
+            etag = version_etag(catalog.version(CATALOG_MAX_STALENESS))
+            unchanged = not_modified(etag, CATALOG_CACHE_CONTROL)
+            if unchanged is not None:
+                return unchanged
+            product = catalog.get(product_id, CATALOG_MAX_STALENESS)
+        else:
+            conn = read_router.connection(product_id)
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {PRODUCT_COLUMNS}
+                FROM inventory 
+                WHERE product_id = %s
+            """, (product_id,))
+            row = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            product = row_to_item(row) if row else None
         
-        if not row:
+        if not product:
             logger.warning(f"⚠ Product {product_id} not found")
             return jsonify({"error": "Product not found"}), 404
         
-        product = row_to_item(row)
         logger.info(f"✓ Product found: {product['product_name']}, Available: {product['quantity_available']}")
         
-        return jsonify(product), 200
+        return conditional(jsonify(product), CATALOG_CACHE_CONTROL, etag)
         
     except Error as e:
         logger.error(f"✗ Database error: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+def fetch_stock(product_ids):
+    """Current rows of some products, read from the primary"""
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {PRODUCT_COLUMNS}
+            FROM inventory 
+            WHERE product_id IN ({placeholders})
+        """, tuple(product_ids))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    return {row[0]: row_to_item(row) for row in rows}
+
+
+@app.route('/inventory/batch', methods=['POST'])
+def get_products_batch():
+    """Look up many products in one query.
+
+    Body: {"items": [{"product_id": 1, "quantity": 2}, ...]}
+    or    {"product_ids": [1, 2, 3]}
+
+    When quantities are given, every line that cannot be served is reported
+    in ``shortfalls`` so the caller gets all problems in one response.
+    """
+    data = request.get_json(force=True, silent=True)
+    if not data:
+        return jsonify({"error": "JSON body required"}), 400
+
+    requested = {}
+    if "items" in data:
+        if not isinstance(data["items"], list):
+            return jsonify({"error": "items must be a list"}), 400
+        for idx, item in enumerate(data["items"]):
+            if not isinstance(item, dict) or not isinstance(item.get("product_id"), int):
+                return jsonify({"error": f"Invalid product_id at index {idx}"}), 400
+            quantity = item.get("quantity", 0)
+            if not isinstance(quantity, int) or quantity < 0:
+                return jsonify({"error": f"Invalid quantity at index {idx}"}), 400
+            # The same product may appear on several cart lines
+            requested[item["product_id"]] = requested.get(item["product_id"], 0) + quantity
+    elif "product_ids" in data:
+        if not isinstance(data["product_ids"], list):
+            return jsonify({"error": "product_ids must be a list"}), 400
+        for idx, product_id in enumerate(data["product_ids"]):
+            if not isinstance(product_id, int):
+                return jsonify({"error": f"Invalid product_id at index {idx}"}), 400
+            requested.setdefault(product_id, 0)
+    else:
+        return jsonify({"error": "items or product_ids is required"}), 400
+
+    if not requested:
+        return jsonify({"error": "No products requested"}), 400
+    if len(requested) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} products per batch"}), 400
+
+    logger.info(f"📦 POST /inventory/batch - Checking {len(requested)} products")
+
+    product_ids = list(requested.keys())
+
+    try:
+        if CATALOG_CACHE_ENABLED and CATALOG_STOCK_MAX_STALENESS > 0:
+            cached = catalog.items(CATALOG_STOCK_MAX_STALENESS)
+            products = {pid: cached[pid] for pid in product_ids if pid in cached}
+        else:
+            products = fetch_stock(product_ids)
+    except Error as e:
+        logger.error(f"✗ Database error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    missing = [pid for pid in product_ids if pid not in products]
+    shortfalls = []
+    for product_id, quantity in requested.items():
+        product = products.get(product_id)
+        if product is None:
+            shortfalls.append({
+                "product_id": product_id,
+                "requested": quantity,
+                "available": 0,
+                "reason": "not_found"
+            })
+        elif product["available_to_promise"] < quantity:
+            shortfalls.append({
+                "product_id": product_id,
+                "requested": quantity,
+                "available": product["available_to_promise"],
+                "reason": "insufficient_stock"
+            })
+
+    logger.info(f"✓ Found {len(products)} products, {len(shortfalls)} shortfalls")
+
+    return jsonify({
+        "products": [products[pid] for pid in product_ids if pid in products],
+        "missing": missing,
+        "shortfalls": shortfalls,
+        "all_available": not shortfalls
+    }), 200
+
+
 @app.route('/inventory/<int:product_id>', methods=['PUT', 'PATCH'])
 def update_product(product_id):
     
@@ -175,6 +399,13 @@ def update_product(product_id):
             logger.warning(f"⚠ Product {product_id} not found")
             return jsonify({"error": "Product not found"}), 404
         
+        read_router.note_write(product_id)
+        if CATALOG_CACHE_ENABLED:
+            try:
+                catalog.refresh_products([product_id])
+            except Error as e:
+                # The next version check picks the change up instead
+                logger.warning(f"⚠️ Catalog cache not refreshed for product {product_id}: {e}")
         logger.info(f"✓ Product {product_id} updated successfully")
         return jsonify({"message": "Product updated", "product_id": product_id}), 200
         
@@ -183,6 +414,492 @@ def update_product(product_id):
         return jsonify({"error": str(e)}), 500
 
 
+# ============================================================
+# Stock Reservations
+# ============================================================
+
+reservation_index = ReservationIndex()
+
+
+def parse_reservation_items(items):
+    """Validate [{"product_id", "quantity"}] and sum quantities per product.
+
+    Returns (requested, error).
+    """
+    if not isinstance(items, list) or not items:
+        return None, "items must be a non-empty list"
+
+    requested = {}
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("product_id"), int):
+            return None, f"Invalid product_id at index {idx}"
+        quantity = item.get("quantity")
+        if not isinstance(quantity, int) or quantity <= 0:
+            return None, f"Invalid quantity at index {idx}"
+        requested[item["product_id"]] = requested.get(item["product_id"], 0) + quantity
+
+    if len(requested) > MAX_BATCH_SIZE:
+        return None, f"At most {MAX_BATCH_SIZE} products per reservation"
+    return requested, None
+
+
+def fetch_products(cursor, product_ids):
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"""
+        SELECT {PRODUCT_COLUMNS}
+        FROM inventory
+        WHERE product_id IN ({placeholders})
+    """, tuple(product_ids))
+    return {row[0]: row_to_item(row) for row in cursor.fetchall()}
+
+
+def reservation_items_with_products(requested, products):
+    return [
+        {
+            "product_id": product_id,
+            "product_name": products[product_id]["product_name"],
+            "quantity": quantity,
+            "unit_price": products[product_id]["unit_price"]
+        }
+        for product_id, quantity in requested.items()
+        if product_id in products
+    ]
+
+
+def release_reservations(cursor, reservation_ids, status, restock=False):
+    """Give back the stock of several reservations with two bulk UPDATEs.
+
+    The caller must already hold row locks on the reservations. With
+    ``restock`` the reservations were committed, so the units go back to
+    ``quantity_available`` instead of leaving ``quantity_reserved``.
+    """
+    placeholders = ", ".join(["%s"] * len(reservation_ids))
+    if restock:
+        set_clause = "i.quantity_available = i.quantity_available + r.quantity"
+    else:
+        set_clause = "i.quantity_reserved = GREATEST(i.quantity_reserved - r.quantity, 0)"
+
+    cursor.execute(f"""
+        UPDATE inventory i
+        JOIN (
+            SELECT product_id, SUM(quantity) AS quantity
+            FROM reservation_items
+            WHERE reservation_id IN ({placeholders})
+            GROUP BY product_id
+        ) r ON i.product_id = r.product_id
+        SET {set_clause}
+    """, tuple(reservation_ids))
+
+    cursor.execute(f"""
+        UPDATE reservations
+        SET status = %s, closed_at = NOW()
+        WHERE reservation_id IN ({placeholders})
+    """, (status,) + tuple(reservation_ids))
+
+
+def release_expired_reservations():
+    """Release one batch of expired holds; return the released ids."""
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        conn.start_transaction()
+        cursor.execute("""
+            SELECT reservation_id
+            FROM reservations
+            WHERE status = 'active' AND expires_at <= NOW()
+            ORDER BY expires_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (RESERVATION_SWEEP_BATCH,))
+        expired = [row[0] for row in cursor.fetchall()]
+
+        if expired:
+            release_reservations(cursor, expired, 'expired')
+        orphaned = cancel_orphaned_reservations(cursor)
+        conn.commit()
+        cursor.close()
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if expired:
+        logger.info(f"⏳ Released {len(expired)} expired reservations")
+    if orphaned:
+        logger.warning(f"⚠ Cancelled {len(orphaned)} committed reservations no order used")
+    return expired
+
+
+def cancel_orphaned_reservations(cursor):
+    """Put back the stock of committed reservations whose order never
+    got written; return their ids.
+
+    The order write locks the reservation and records its order_id, so
+    a row without one that is locked here has no order in flight. Orders
+    are still looked for with a locking read, for orders written before
+    reservations.order_id was filled in.
+    """
+    cursor.execute("""
+        SELECT reservation_id
+        FROM reservations
+        WHERE status = 'committed' AND order_id IS NULL
+          AND closed_at <= NOW() - INTERVAL %s SECOND
+        ORDER BY closed_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (RESERVATION_ORPHAN_GRACE, RESERVATION_SWEEP_BATCH))
+    candidates = [row[0] for row in cursor.fetchall()]
+    if not candidates:
+        return []
+
+    placeholders = ", ".join(["%s"] * len(candidates))
+    cursor.execute(f"""
+        SELECT reservation_id, order_id FROM orders
+        WHERE reservation_id IN ({placeholders})
+        LOCK IN SHARE MODE
+    """, tuple(candidates))
+    used = dict(cursor.fetchall())
+    if used:
+        cursor.executemany("""
+            UPDATE reservations SET order_id = %s WHERE reservation_id = %s
+        """, [(order_id, reservation_id) for reservation_id, order_id in used.items()])
+
+    orphaned = [reservation_id for reservation_id in candidates if reservation_id not in used]
+    if orphaned:
+        release_reservations(cursor, orphaned, 'cancelled', restock=True)
+    return orphaned
+
+
+reservation_sweeper = ReservationSweeper(
+    release_expired_reservations,
+    reservation_index,
+    interval=RESERVATION_SWEEP_INTERVAL
+)
+
+
+@after_fork
+def start_reservation_sweeper():
+    reservation_sweeper.start()
+
+
+@on_shutdown
+def stop_reservation_sweeper():
+    reservation_sweeper.stop(timeout=5)
+
+
+def lock_reservation(cursor, reservation_id):
+    """Lock a reservation row; return (status, expired) or None."""
+    cursor.execute("""
+        SELECT status, expires_at <= NOW()
+        FROM reservations
+        WHERE reservation_id = %s
+        FOR UPDATE
+    """, (reservation_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return row[0], bool(row[1])
+
+
+def find_reservation_order(cursor, reservation_id):
+    """order_id of the order paid from a reservation, or None.
+
+    A locking read, so it sees an order committed after this transaction
+    started instead of the transaction's snapshot.
+    """
+    cursor.execute("""
+        SELECT order_id FROM orders
+        WHERE reservation_id = %s
+        LOCK IN SHARE MODE
+    """, (reservation_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def load_reservation_items(cursor, reservation_id):
+    cursor.execute("""
+        SELECT product_id, quantity
+        FROM reservation_items
+        WHERE reservation_id = %s
+    """, (reservation_id,))
+    return dict(cursor.fetchall())
+
+
+@app.route('/inventory/reservations', methods=['POST'])
+def create_reservation():
+    """Hold stock for a checkout session.
+
+    Body: {"items": [{"product_id": 1, "quantity": 2}], "ttl_seconds": 900}
+
+    All-or-nothing: if any product cannot be held, nothing is held and
+    every shortfall is returned with 409.
+    """
+    data = request.get_json(force=True, silent=True)
+    if not data:
+        return jsonify({"error": "JSON body required"}), 400
+
+    requested, error = parse_reservation_items(data.get("items"))
+    if error:
+        return jsonify({"error": error}), 400
+
+    ttl = data.get("ttl_seconds", RESERVATION_TTL)
+    if not isinstance(ttl, int) or ttl <= 0 or ttl > RESERVATION_MAX_TTL:
+        return jsonify({"error": f"ttl_seconds must be between 1 and {RESERVATION_MAX_TTL}"}), 400
+
+    logger.info(f"🔒 POST /inventory/reservations - Holding {len(requested)} products for {ttl}s")
+
+    reservation_id = uuid.uuid4().hex
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        conn.start_transaction()
+
+        # Ordered by id so concurrent holds lock rows in the same order
+        failed = []
+        for product_id in sorted(requested):
+            cursor.execute("""
+                UPDATE inventory
+                SET quantity_reserved = quantity_reserved + %s
+                WHERE product_id = %s
+                  AND quantity_available - quantity_reserved >= %s
+            """, (requested[product_id], product_id, requested[product_id]))
+            if cursor.rowcount == 0:
+                failed.append(product_id)
+
+        products = fetch_products(cursor, list(requested))
+
+        if failed:
+            conn.rollback()
+            cursor.close()
+            shortfalls = [
+                {
+                    "product_id": product_id,
+                    "requested": requested[product_id],
+                    "available": products[product_id]["available_to_promise"] if product_id in products else 0,
+                    "reason": "insufficient_stock" if product_id in products else "not_found"
+                }
+                for product_id in failed
+            ]
+            logger.warning(f"⚠ Cannot hold {len(failed)} products")
+            return jsonify({"error": "Insufficient stock", "shortfalls": shortfalls}), 409
+
+        cursor.execute("""
+            INSERT INTO reservations (reservation_id, status, expires_at)
+            VALUES (%s, 'active', NOW() + INTERVAL %s SECOND)
+        """, (reservation_id, ttl))
+        cursor.executemany("""
+            INSERT INTO reservation_items (reservation_id, product_id, quantity)
+            VALUES (%s, %s, %s)
+        """, [(reservation_id, pid, qty) for pid, qty in requested.items()])
+
+        conn.commit()
+        cursor.close()
+    except Error as e:
+        conn.rollback()
+        logger.error(f"✗ Database error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+    items = reservation_items_with_products(requested, products)
+    reservation_index.add(reservation_id, ttl, items)
+    reservation_sweeper.start()
+
+    logger.info(f"✓ Reservation {reservation_id} created")
+    return jsonify({
+        "reservation_id": reservation_id,
+        "status": "active",
+        "ttl_seconds": ttl,
+        "items": items
+    }), 201
+
+
+@app.route('/inventory/reservations/<reservation_id>', methods=['GET'])
+def get_reservation(reservation_id):
+    """Show a reservation; active holds made by this process skip the DB."""
+    cached = reservation_index.get(reservation_id)
+    if cached:
+        return jsonify({
+            "reservation_id": reservation_id,
+            "status": "active",
+            "items": cached["items"]
+        }), 200
+
+    try:
+        conn = get_conn()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT status, expires_at, order_id
+            FROM reservations
+            WHERE reservation_id = %s
+        """, (reservation_id,))
+        row = cursor.fetchone()
+        if not row:
+            cursor.close()
+            conn.close()
+            return jsonify({"error": "Reservation not found"}), 404
+
+        requested = load_reservation_items(cursor, reservation_id)
+        products = fetch_products(cursor, list(requested)) if requested else {}
+        cursor.close()
+        conn.close()
+    except Error as e:
+        logger.error(f"✗ Database error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    status, expires_at, order_id = row
+    return jsonify({
+        "reservation_id": reservation_id,
+        "status": status,
+        "expires_at": expires_at.isoformat() if expires_at else None,
+        "order_id": order_id,
+        "items": reservation_items_with_products(requested, products)
+    }), 200
+
+
+@app.route('/inventory/reservations/<reservation_id>/commit', methods=['POST'])
+def commit_reservation(reservation_id):
+    """Turn an active hold into a stock decrement.
+
+    Body (optional): {"order_id": 12, "items": [...]}. When ``items`` is
+    given it must match the held quantities exactly. The response carries
+    current names and prices so the caller needs no separate stock check.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    expected = None
+    if "items" in data:
+        expected, error = parse_reservation_items(data["items"])
+        if error:
+            return jsonify({"error": error}), 400
+
+    logger.info(f"✅ POST /inventory/reservations/{reservation_id}/commit")
+
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        conn.start_transaction()
+
+        locked = lock_reservation(cursor, reservation_id)
+        if locked is None:
+            conn.rollback()
+            return jsonify({"error": "Reservation not found"}), 404
+
+        status, expired = locked
+        if status != 'active' or expired:
+            conn.rollback()
+            reason = 'expired' if status == 'active' else status
+            return jsonify({"error": f"Reservation is {reason}", "status": reason}), 409
+
+        requested = load_reservation_items(cursor, reservation_id)
+        if expected is not None and expected != requested:
+            conn.rollback()
+            return jsonify({"error": "Items do not match the reservation"}), 409
+
+        cursor.execute("""
+            UPDATE inventory i
+            JOIN reservation_items r
+              ON i.product_id = r.product_id AND r.reservation_id = %s
+            SET i.quantity_available = i.quantity_available - r.quantity,
+                i.quantity_reserved = GREATEST(i.quantity_reserved - r.quantity, 0)
+        """, (reservation_id,))
+        cursor.execute("""
+            UPDATE reservations
+            SET status = 'committed', order_id = %s, closed_at = NOW()
+            WHERE reservation_id = %s
+        """, (data.get("order_id"), reservation_id))
+
+        products = fetch_products(cursor, list(requested))
+        conn.commit()
+        cursor.close()
+    except Error as e:
+        conn.rollback()
+        logger.error(f"✗ Database error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+    reservation_index.remove(reservation_id)
+    logger.info(f"✓ Reservation {reservation_id} committed")
+    return jsonify({
+        "reservation_id": reservation_id,
+        "status": "committed",
+        "items": reservation_items_with_products(requested, products)
+    }), 200
+
+
+@app.route('/inventory/reservations/<reservation_id>/release', methods=['POST'])
+def release_reservation(reservation_id):
+    """Drop a hold, or put back the stock of a committed reservation whose
+    order could not be saved.
+
+    Body (optional): {"order_failed": true}. A committed reservation is
+    only cancelled with that flag, and only while no order records it;
+    otherwise the answer is 409 and the stock stays taken. The order write
+    locks the reservation row first too, so the two cannot interleave.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    logger.info(f"🔓 POST /inventory/reservations/{reservation_id}/release")
+
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        conn.start_transaction()
+
+        locked = lock_reservation(cursor, reservation_id)
+        if locked is None:
+            conn.rollback()
+            return jsonify({"error": "Reservation not found"}), 404
+
+        status, _ = locked
+        if status == 'active':
+            release_reservations(cursor, [reservation_id], 'released')
+        elif status == 'committed':
+            if data.get("order_failed") is not True:
+                conn.rollback()
+                return jsonify({
+                    "error": "Reservation is committed; only a failed order can cancel it",
+                    "status": status
+                }), 409
+            order_id = find_reservation_order(cursor, reservation_id)
+            if order_id is not None:
+                conn.rollback()
+                logger.warning(f"⚠ Reservation {reservation_id} belongs to order {order_id}, not cancelled")
+                return jsonify({
+                    "error": "An order was placed with this reservation",
+                    "status": status,
+                    "order_id": order_id
+                }), 409
+            release_reservations(cursor, [reservation_id], 'cancelled', restock=True)
+        else:
+            conn.rollback()
+            return jsonify({"reservation_id": reservation_id, "status": status}), 200
+
+        conn.commit()
+        cursor.close()
+    except Error as e:
+        conn.rollback()
+        logger.error(f"✗ Database error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+    reservation_index.remove(reservation_id)
+    new_status = 'released' if status == 'active' else 'cancelled'
+    logger.info(f"✓ Reservation {reservation_id} {new_status}")
+    return jsonify({"reservation_id": reservation_id, "status": new_status}), 200
+
+
+@app.route('/stats/read-routing', methods=['GET'])
+def read_routing_stats():
+    return jsonify(read_router.stats()), 200
+
+
+@app.route('/stats/catalog-cache', methods=['GET'])
+def catalog_cache_stats():
+    return jsonify(catalog.stats()), 200
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -204,8 +921,4 @@ if __name__ == "__main__":
     logger.info("Database: ecommerce_system")
     logger.info("=" * 60)
     
-    app.run(
-        host='0.0.0.0',
-        port=5002,
-        debug=True
-    )
\ No newline at end of file
+    run_service(app, 'inventory', 5002)
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""Process-local cache of the inventory catalog.
+
+Every product row is kept in memory by product_id. Every write to
+``inventory`` bumps ``last_updated`` (explicitly or through
+``ON UPDATE CURRENT_TIMESTAMP``), including the stock decrement the Order
+Service makes in its own save transaction, so a refresh only re-reads
+the rows updated since the previous one. ``last_updated`` is the
+statement time, not the commit time: a row may become visible up to
+``max_transaction_seconds`` after the timestamp it carries, and older
+than rows already seen. Each refresh therefore re-reads from the
+database clock at the previous refresh minus that margin, whatever
+``MAX(last_updated)`` says. The whole catalog is read when the row count
+changes (a product was deleted) and every ``full_reload_interval``
+seconds.
+
+Readers pass the staleness they accept. A snapshot whose last version
+check is older than that is refreshed before it is used. Refreshes are
+single-flight, so a burst of readers after expiry costs one version
+query rather than one per reader. Writes made by this service are
+written through with ``refresh_products`` after they commit.
+
+Snapshots are replaced, never modified, so readers can iterate one
+without holding the lock. Each snapshot keeps its product ids sorted, so
+listing a page after a cursor is a bisect, not a sort of the catalog,
+and a digest of its content (the XOR of one hash per item, updated with
+the items that change), so ``version`` names it without reading it.
+Processes holding the same rows report the same version.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def item_digest(item):
+    """Stable 64-bit hash of one cached item"""
+    data = repr(sorted(item.items())).encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def digest_of(items):
+    digest = 0
+    for item in items.values():
+        digest ^= item_digest(item)
+    return digest
+
+
+class CatalogCache:
+    """All inventory rows, refreshed from ``last_updated``."""
+
+    def __init__(self, get_connection, columns, row_to_item, max_transaction_seconds=60,
+                 full_reload_interval=300):
+        self.get_connection = get_connection
+        self.columns = columns
+        self.row_to_item = row_to_item
+        self.max_transaction_seconds = max_transaction_seconds
+        self.full_reload_interval = full_reload_interval
+        self._snapshot = None
+        self._version = None
+        self._polled_at = None
+        self._checked_at = 0.0
+        self._full_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.version_checks = 0
+        self.full_reloads = 0
+        self.rows_reloaded = 0
+
+    def _current(self, max_staleness):
+        """(items, sorted ids, digest), at most ``max_staleness`` seconds old"""
+        if self._fresh(max_staleness):
+            self.hits += 1
+            return self._snapshot
+        with self._lock:
+            if not self._fresh(max_staleness):
+                self._refresh()
+        return self._snapshot
+
+    def items(self, max_staleness):
+        """{product_id: item}, at most ``max_staleness`` seconds old"""
+        return self._current(max_staleness)[0]
+
+    def get(self, product_id, max_staleness):
+        return self.items(max_staleness).get(product_id)
+
+    def version(self, max_staleness):
+        """Name of the current content, at most ``max_staleness`` seconds
+        old; changes whenever any item does"""
+        items, _, digest = self._current(max_staleness)
+        return f"{len(items)}-{digest:016x}"
+
+    def scan(self, max_staleness, after=None, count=100, predicate=None):
+        """Up to ``count`` (None: all) items with a product_id above
+        ``after``, in product_id order, skipping those ``predicate`` rejects"""
+        items, ids, _ = self._current(max_staleness)
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        found = []
+        for index in range(start, len(ids)):
+            item = items[ids[index]]
+            if predicate is None or predicate(item):
+                found.append(item)
+                if count is not None and len(found) >= count:
+                    break
+        return found
+
+    def _fresh(self, max_staleness):
+        return self._snapshot is not None and time.monotonic() - self._checked_at <= max_staleness
+
+    def _replace(self, items, digest):
+        ids = self._snapshot[1] if self._snapshot is not None else None
+        if ids is None or len(ids) != len(items) or any(pid not in items for pid in ids):
+            ids = sorted(items)
+        self._snapshot = (items, ids, digest)
+
+    def _refresh(self):
+        started = time.monotonic()
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(last_updated), COUNT(*), NOW() FROM inventory")
+            max_updated, row_count, polled_at = cursor.fetchone()
+            version = (max_updated, row_count)
+            self.version_checks += 1
+
+            full = (
+                self._snapshot is None
+                or row_count != self._version[1]
+                or started - self._full_at >= self.full_reload_interval
+            )
+            if full:
+                cursor.execute(f"SELECT {self.columns} FROM inventory")
+                items = {}
+                for row in cursor.fetchall():
+                    item = self.row_to_item(row)
+                    items[item['product_id']] = item
+                self._full_at = started
+                self.full_reloads += 1
+                self.rows_reloaded += len(items)
+                self._snapshot = (items, sorted(items), digest_of(items))
+                logger.info(f"✓ Catalog cache loaded: {len(items)} products")
+            else:
+                cursor.execute(f"""
+                    SELECT {self.columns}
+                    FROM inventory
+                    WHERE last_updated >= %s
+                """, (self._polled_at - timedelta(seconds=self.max_transaction_seconds),))
+                current, _, digest = self._snapshot
+                changed = {}
+                for row in cursor.fetchall():
+                    item = self.row_to_item(row)
+                    old = current.get(item['product_id'])
+                    if old != item:
+                        changed[item['product_id']] = item
+                        if old is not None:
+                            digest ^= item_digest(old)
+                        digest ^= item_digest(item)
+                if changed:
+                    items = dict(current)
+                    items.update(changed)
+                    self.rows_reloaded += len(changed)
+                    self._replace(items, digest)
+            cursor.close()
+        finally:
+            conn.close()
+        self._version = version
+        self._polled_at = polled_at
+        self._checked_at = started
+
+    def refresh_products(self, product_ids):
+        """Re-read some products after this service changed them"""
+        if self._snapshot is None or not product_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        # Under the lock, so a refresh that started before the write
+        # cannot put the old rows back afterwards
+        with self._lock:
+            conn = self.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT {self.columns}
+                    FROM inventory
+                    WHERE product_id IN ({placeholders})
+                """, tuple(product_ids))
+                rows = cursor.fetchall()
+                cursor.close()
+            finally:
+                conn.close()
+            items = dict(self._snapshot[0])
+            digest = self._snapshot[2]
+            for product_id in product_ids:
+                old = items.pop(product_id, None)
+                if old is not None:
+                    digest ^= item_digest(old)
+            for row in rows:
+                item = self.row_to_item(row)
+                items[item['product_id']] = item
+                digest ^= item_digest(item)
+            self._replace(items, digest)
+
+    def stats(self):
+        return {
+            'products': len(self._snapshot[0]) if self._snapshot is not None else 0,
+            'version': str(self._version[0]) if self._version else None,
+            'age_seconds': round(time.monotonic() - self._checked_at, 3) if self._snapshot is not None else None,
+            'max_transaction_seconds': self.max_transaction_seconds,
+            'hits': self.hits,
+            'version_checks': self.version_checks,
+            'full_reloads': self.full_reloads,
+            'rows_reloaded': self.rows_reloaded
+        }
@@ -0,0 +1,116 @@
+"""Filters, projection and keyset pages for ``GET /inventory``.
+
+Products are listed in product_id order and a page continues after the
+last product_id of the previous one, so every page is a range read of the
+primary key (or a bisect into the cached catalog) however deep it is.
+The filters are checked on the rows as they are read.
+"""
+from decimal import Decimal, InvalidOperation
+
+PRODUCT_FIELDS = (
+    'product_id', 'product_name', 'quantity_available', 'quantity_reserved',
+    'available_to_promise', 'unit_price', 'last_updated'
+)
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def parse_price(value, name):
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+    if not price.is_finite() or price < 0:
+        raise ValueError(f"{name} must be a number of at least 0")
+    return price
+
+
+def parse_listing_filters(args):
+    """Validate the query-string filters; raises ValueError"""
+    filters = {}
+
+    if args.get('in_stock'):
+        value = args['in_stock'].strip().lower()
+        if value in TRUE_VALUES:
+            filters['in_stock'] = True
+        elif value in FALSE_VALUES:
+            filters['in_stock'] = False
+        else:
+            raise ValueError('in_stock must be true or false')
+
+    if args.get('min_price'):
+        filters['min_price'] = parse_price(args['min_price'], 'min_price')
+    if args.get('max_price'):
+        filters['max_price'] = parse_price(args['max_price'], 'max_price')
+    if 'min_price' in filters and 'max_price' in filters and filters['min_price'] > filters['max_price']:
+        raise ValueError('min_price cannot be above max_price')
+
+    return filters
+
+
+def parse_after(token_values):
+    """product_id from a decoded cursor; raises ValueError"""
+    after = token_values.get('product_id')
+    if not isinstance(after, int) or isinstance(after, bool):
+        raise ValueError('Invalid cursor')
+    return after
+
+
+def matches(filters):
+    """Build the predicate for cached items, or None without filters"""
+    if not filters:
+        return None
+    in_stock = filters.get('in_stock')
+    min_price = float(filters['min_price']) if 'min_price' in filters else None
+    max_price = float(filters['max_price']) if 'max_price' in filters else None
+
+    def match(item):
+        if in_stock is not None and (item['available_to_promise'] > 0) != in_stock:
+            return False
+        if min_price is not None and item['unit_price'] < min_price:
+            return False
+        if max_price is not None and item['unit_price'] > max_price:
+            return False
+        return True
+    return match
+
+
+def build_listing_query(columns, filters, after, limit):
+    """Return (sql, params) for one page of ``limit + 1`` rows, or for
+    every matching row when ``limit`` is None"""
+    conditions = []
+    params = []
+
+    if after is not None:
+        conditions.append("product_id > %s")
+        params.append(after)
+    if filters.get('in_stock') is True:
+        conditions.append("quantity_available - quantity_reserved > 0")
+    elif filters.get('in_stock') is False:
+        conditions.append("quantity_available - quantity_reserved <= 0")
+    if 'min_price' in filters:
+        conditions.append("unit_price >= %s")
+        params.append(filters['min_price'])
+    if 'max_price' in filters:
+        conditions.append("unit_price <= %s")
+        params.append(filters['max_price'])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"""
+        SELECT {columns}
+        FROM inventory
+        {where}
+        ORDER BY product_id
+        {"LIMIT %s" if limit is not None else ""}
+    """
+    if limit is not None:
+        params.append(limit + 1)
+    return sql, params
+
+
+def project(item, fields):
+    """Only the requested fields of an item (all of them for None)"""
+    if fields is None:
+        return item
+    return {field: item[field] for field in fields}
@@ -0,0 +1,122 @@
+"""Process-local index of stock reservations and the expiry sweeper.
+
+The database is the source of truth: ``inventory.quantity_reserved`` holds
+the total of active holds per product, so available-to-promise is
+``quantity_available - quantity_reserved`` on a single row. The index here
+only remembers the holds this process created so lookups skip the
+database and the sweeper knows when the next hold is due to expire.
+"""
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationIndex:
+    """Active holds keyed by reservation id, ordered by expiry."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._expiry_heap = []
+        self._held = {}
+
+    def add(self, reservation_id, ttl_seconds, items):
+        expires_at = time.time() + ttl_seconds
+        with self._lock:
+            self._by_id[reservation_id] = {'expires_at': expires_at, 'items': items}
+            heapq.heappush(self._expiry_heap, (expires_at, reservation_id))
+            for item in items:
+                self._held[item['product_id']] = self._held.get(item['product_id'], 0) + item['quantity']
+
+    def remove(self, reservation_id):
+        with self._lock:
+            reservation = self._by_id.pop(reservation_id, None)
+            if reservation is None:
+                return
+            for item in reservation['items']:
+                remaining = self._held.get(item['product_id'], 0) - item['quantity']
+                if remaining > 0:
+                    self._held[item['product_id']] = remaining
+                else:
+                    self._held.pop(item['product_id'], None)
+
+    def get(self, reservation_id):
+        with self._lock:
+            reservation = self._by_id.get(reservation_id)
+            if reservation is None or reservation['expires_at'] <= time.time():
+                return None
+            return dict(reservation)
+
+    def held(self, product_id):
+        """Units this process is currently holding for a product."""
+        with self._lock:
+            return self._held.get(product_id, 0)
+
+    def seconds_until_next_expiry(self):
+        with self._lock:
+            # Drop heap entries for holds that were already removed
+            while self._expiry_heap and self._expiry_heap[0][1] not in self._by_id:
+                heapq.heappop(self._expiry_heap)
+            if not self._expiry_heap:
+                return None
+            return max(0.0, self._expiry_heap[0][0] - time.time())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+
+class ReservationSweeper:
+    """Background thread that releases expired holds in bulk.
+
+    ``sweep`` is called at least every ``interval`` seconds, and sooner
+    when the index knows a hold is about to expire. It must return the
+    ids it released so they can be dropped from the index.
+    """
+
+    def __init__(self, sweep, index, interval=30.0):
+        self.sweep = sweep
+        self.index = index
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.sweeps = 0
+        self.released = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='reservation-sweeper', daemon=True)
+            self._thread.start()
+            logger.info("⏳ Reservation sweeper started")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                released = self.sweep()
+                for reservation_id in released:
+                    self.index.remove(reservation_id)
+                self.sweeps += 1
+                self.released += len(released)
+            except Exception as e:
+                logger.error(f"✗ Reservation sweep failed: {e}")
+
+            wait = self.interval
+            next_expiry = self.index.seconds_until_next_expiry()
+            if next_expiry is not None:
+                # Small margin so the database clock has passed the expiry
+                wait = min(wait, next_expiry + 0.5)
+            self._stop.wait(wait)
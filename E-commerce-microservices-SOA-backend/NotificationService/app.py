@@ -1,10 +1,23 @@
 from flask import Flask, request, jsonify
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
 from datetime import datetime
 import logging
+import os
+import sys
 import requests
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.config import env_float, service_url
+from common.deadlines import install_deadline
+from common.fanout import fan_out
+from common.http_client import breaker_stats, get_client, client_stats
+from common.logs import configure_logging, sampled_logger, log_stats
+from common.metrics import install_metrics, instrument_connection
+from common.serve import run_service
+from common.tracing import install_tracing
+
 # ============================================================
 # Configuration
 # ============================================================
@@ -16,24 +29,39 @@ DB_CONFIG = {
     "database": "ecommerce_system"
 }
 
-CUSTOMER_SERVICE_URL = "http://localhost:5004"
-INVENTORY_SERVICE_URL = "http://localhost:5002"
-ORDER_SERVICE_URL = "http://localhost:5001"
+CUSTOMER_SERVICE_URL = service_url('customer')
+INVENTORY_SERVICE_URL = service_url('inventory')
+ORDER_SERVICE_URL = service_url('order')
+
+customer_client = get_client('customer')
+inventory_client = get_client('inventory')
+order_client = get_client('order')
+
+LOW_STOCK_THRESHOLD = 10
+INVENTORY_PARALLELISM = 8
+INVENTORY_DEADLINE = 10
+
+# Per-call latency budgets in seconds, cut to the caller's deadline
+ORDER_TIMEOUT = env_float('ORDER_TIMEOUT', 10)
+CUSTOMER_TIMEOUT = env_float('CUSTOMER_TIMEOUT', 10)
+INVENTORY_TIMEOUT = env_float('INVENTORY_TIMEOUT', 10)
 
 app = Flask(__name__)
+install_metrics(app)
+install_tracing(app, 'notification')
+install_deadline(app)
 
 # Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+configure_logging('notification')
 logger = logging.getLogger(__name__)
+# Full email/SMS bodies; only a sample is kept
+message_logger = sampled_logger('notification.messages', env_float('NOTIFICATION_BODY_LOG_RATE', 0.01))
 
 
 def get_db_connection():
     """Create database connection"""
     try:
-        return mysql.connector.connect(**DB_CONFIG)
+        return instrument_connection(mysql.connector.connect(**DB_CONFIG))
     except Error as e:
         logger.error(f"Database connection error: {e}")
         raise
@@ -43,6 +71,33 @@ def get_db_connection():
 # API Endpoints
 # ============================================================
 
+def find_sent_notification(order_id, notification_type):
+    """notification_id already logged for this order and type, or None"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT notification_id FROM notification_log
+            WHERE order_id = %s AND notification_type = %s
+        """, (order_id, notification_type))
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def already_sent(notification_id, order_id, notification_type):
+    return jsonify({
+        'success': True,
+        'already_sent': True,
+        'notification_id': notification_id,
+        'order_id': order_id,
+        'notification_type': notification_type,
+        'message': 'Notification already sent'
+    }), 200
+
+
 @app.route('/api/notifications/send', methods=['POST'])
 def send_notification():
     """Send order notification (aggregates data from multiple services)"""
@@ -61,12 +116,22 @@ def send_notification():
         
         logger.info(f"📦 Processing notification for Order #{order_id}")
         
+        # The outbox delivers at least once: a redelivery gets the first answer
+        try:
+            sent = find_sent_notification(order_id, notification_type)
+        except Error as e:
+            logger.error(f"❌ Database error: {e}")
+            return jsonify({'error': f'Failed to check notification log: {str(e)}'}), 500
+        if sent is not None:
+            logger.info(f"ℹ️ Order #{order_id} already notified ({notification_type})")
+            return already_sent(sent, order_id, notification_type)
+        
         # Step 1: Get order details from Order Service
         logger.info("Step 1: Fetching order details...")
         try:
-            order_response = requests.get(
-                f"{ORDER_SERVICE_URL}/api/orders/{order_id}",
-                timeout=10
+            order_response = order_client.get(
+                f"/api/orders/{order_id}",
+                timeout=ORDER_TIMEOUT
             )
             
             if order_response.status_code != 200:
@@ -87,9 +152,9 @@ def send_notification():
         # Step 2: Get customer contact info from Customer Service
         logger.info("Step 2: Fetching customer details...")
         try:
-            customer_response = requests.get(
-                f"{CUSTOMER_SERVICE_URL}/api/customers/{customer_id}",
-                timeout=10
+            customer_response = customer_client.get(
+                f"/api/customers/{customer_id}",
+                timeout=CUSTOMER_TIMEOUT
             )
             
             if customer_response.status_code != 200:
@@ -114,27 +179,39 @@ def send_notification():
         delivery_estimate = "2-3 business days"
         all_in_stock = True
         
-        for item in items:
+        def fetch_stock(item):
             product_id = item.get('product_id')
-            try:
-                inventory_response = requests.get(
-                    f"{INVENTORY_SERVICE_URL}/inventory/{product_id}",
-                    timeout=10
-                )
-                
-                if inventory_response.status_code == 200:
-                    inventory_data = inventory_response.json()
-                    quantity_available = inventory_data.get('quantity_available', 0)
-                    
-                    if quantity_available < 10:
-                        all_in_stock = False
-                        delivery_estimate = "5-7 business days"
-                        logger.info(f"  ⚠️ Product {product_id} has low stock")
-                else:
-                    logger.warning(f"  ⚠️ Could not check inventory for product {product_id}")
-                    
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"  ⚠️ Error checking inventory: {e}")
+            inventory_response = inventory_client.get(
+                f"/inventory/{product_id}",
+                timeout=INVENTORY_TIMEOUT
+            )
+            if inventory_response.status_code != 200:
+                logger.warning(f"  ⚠️ Could not check inventory for product {product_id}")
+                return None
+            return inventory_response.json()
+        
+        # One low-stock item is enough to extend delivery, so stop there
+        outcome = fan_out(
+            fetch_stock,
+            items,
+            parallelism=INVENTORY_PARALLELISM,
+            deadline=INVENTORY_DEADLINE,
+            stop_when=lambda data: bool(data) and data.get('quantity_available', 0) < LOW_STOCK_THRESHOLD,
+            stop_on_error=False
+        )
+        
+        for inventory_data in outcome.results:
+            if inventory_data and inventory_data.get('quantity_available', 0) < LOW_STOCK_THRESHOLD:
+                all_in_stock = False
+                delivery_estimate = "5-7 business days"
+                logger.info(f"  ⚠️ Product {inventory_data.get('product_id')} has low stock")
+        
+        for error in outcome.errors:
+            if error is not None:
+                logger.warning(f"  ⚠️ Error checking inventory: {error}")
+        
+        if outcome.timed_out:
+            logger.warning("  ⚠️ Inventory check timed out, using standard estimate")
         
         if all_in_stock:
             logger.info("✓ All items in stock - Standard delivery")
@@ -166,40 +243,44 @@ Best regards,
 E-Commerce Team
         """
         
-        # Step 5: Simulate sending email/SMS
-        logger.info("")
-        logger.info("=" * 60)
-        logger.info("📧 EMAIL SENT TO: " + customer_email)
-        logger.info("=" * 60)
-        logger.info(f"Subject: Order #{order_id} Confirmed")
-        logger.info("")
-        logger.info(notification_message)
-        logger.info("=" * 60)
-        
-        logger.info("")
-        logger.info("=" * 60)
-        logger.info("📱 SMS SENT TO: " + customer_phone)
-        logger.info("=" * 60)
-        logger.info(f"Your order #{order_id} is confirmed! Total: {total_amount} EGP. Estimated delivery: {delivery_estimate}")
-        logger.info("=" * 60)
-        
-        # Step 6: Log notification to database
-        logger.info("Step 6: Logging notification to database...")
+        # Step 5: Log the notification, then send it. The log row is
+        # claimed first (one per order and type), so a concurrent
+        # redelivery waits on it and then sends nothing; the claim is only
+        # committed once the message went out.
+        logger.info("Step 5: Logging notification to database...")
         try:
             conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO notification_log
-                (order_id, customer_id, notification_type, message, sent_at)
-                VALUES (%s, %s, %s, %s, NOW())
-            """, (order_id, customer_id, notification_type, notification_message))
-            
-            conn.commit()
-            notification_id = cursor.lastrowid
-            
-            cursor.close()
-            conn.close()
+            try:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("""
+                        INSERT INTO notification_log
+                        (order_id, customer_id, notification_type, message, sent_at)
+                        VALUES (%s, %s, %s, %s, NOW())
+                    """, (order_id, customer_id, notification_type, notification_message))
+                except Error as e:
+                    if e.errno != errorcode.ER_DUP_ENTRY:
+                        raise
+                    conn.rollback()
+                    logger.info(f"ℹ️ Order #{order_id} already notified ({notification_type})")
+                    return already_sent(find_sent_notification(order_id, notification_type),
+                                        order_id, notification_type)
+                notification_id = cursor.lastrowid
+                
+                # Step 6: Simulate sending email/SMS
+                logger.info("📧 EMAIL SENT TO: %s (Order #%s Confirmed)", customer_email, order_id)
+                message_logger.info("Subject: Order #%s Confirmed\n%s", order_id, notification_message)
+                
+                logger.info("📱 SMS SENT TO: %s", customer_phone)
+                message_logger.info(
+                    "Your order #%s is confirmed! Total: %s EGP. Estimated delivery: %s",
+                    order_id, total_amount, delivery_estimate
+                )
+                
+                conn.commit()
+                cursor.close()
+            finally:
+                conn.close()
             
             logger.info(f"✓ Notification logged with ID: {notification_id}")
             
@@ -238,6 +319,24 @@ E-Commerce Team
 
 
 
+@app.route('/stats/http', methods=['GET'])
+def http_stats():
+    """Connection-reuse and latency counters per downstream service"""
+    return jsonify(client_stats()), 200
+
+
+@app.route('/stats/logging', methods=['GET'])
+def logging_stats():
+    """Async log queue depth, dropped records and sampling rates"""
+    return jsonify(log_stats()), 200
+
+
+@app.route('/stats/breakers', methods=['GET'])
+def breakers_stats():
+    """Circuit breaker state and trip counts per downstream service"""
+    return jsonify(breaker_stats()), 200
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -278,8 +377,4 @@ if __name__ == '__main__':
         logger.error("Service may not work properly!")
         logger.info("=" * 60)
     
-    app.run(
-        host='0.0.0.0',
-        port=5005,
-        debug=True
-    )
\ No newline at end of file
+    run_service(app, 'notification', 5005)
\ No newline at end of file
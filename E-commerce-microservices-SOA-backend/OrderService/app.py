@@ -1,16 +1,50 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import requests
+from werkzeug.http import unquote_etag
 import mysql.connector
 from mysql.connector import Error
 from datetime import datetime
+from decimal import Decimal
+import contextvars
+import json
 import logging
+import os
+import sys
+import time
 
-app = Flask(__name__)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from common.breaker import CircuitOpenError
+from common.cache import LRUCache
+from common.config import env_bool, env_int, env_float, service_url
+from common.db import ReadRouter, install_read_routing
+from common.deadlines import deadline_expired, deadline_scope, install_deadline
+from common.etags import conditional
+from common.fanout import fan_out, get_executor
+from common.http_client import breaker_stats, get_client, client_stats
+from common.logs import configure_logging, log_stats
+from common.metrics import install_metrics, instrument_connection, stage
+from common.pagination import decode_cursor, page, parse_fields, parse_page_size
+from common.prices import item_prices, price_version
+from common.serve import after_fork, on_shutdown, run_service
+from common.tracing import install_tracing
+from order_search import (
+    ORDER_FIELDS, build_search_query, cursor_for, parse_search_filters, row_to_order
+)
+from order_store import (
+    InsufficientStock, ReservationNotCommitted, find_shortfalls, validate_pricing_data, write_order
 )
+from group_commit import GroupCommitTimeout, GroupCommitWriter, run_jobs
+from idempotency import IdempotencyStore, allow_retry, current_claim
+from outbox import OutboxRelay
+
+app = Flask(__name__)
+install_metrics(app)
+install_tracing(app, 'order')
+install_deadline(app)
+install_read_routing(app)
+
+configure_logging('order')
 logger = logging.getLogger(__name__)
 
 # ============================================================
@@ -18,10 +52,80 @@ logger = logging.getLogger(__name__)
 # ============================================================
 
 # Service URLs
-INVENTORY_SERVICE_URL = 'http://localhost:5002'
-PRICING_SERVICE_URL = 'http://localhost:5003'
-CUSTOMER_SERVICE_URL = 'http://localhost:5004'
-NOTIFICATION_SERVICE_URL = 'http://localhost:5005'
+INVENTORY_SERVICE_URL = service_url('inventory')
+PRICING_SERVICE_URL = service_url('pricing')
+CUSTOMER_SERVICE_URL = service_url('customer')
+NOTIFICATION_SERVICE_URL = service_url('notification')
+
+inventory_client = get_client('inventory')
+pricing_client = get_client('pricing')
+customer_client = get_client('customer')
+notification_client = get_client('notification')
+
+# Every create_order gets this deadline (or the caller's, if sooner); it is
+# sent on to the other services, which stop working on it once it passes
+ORDER_DEADLINE = env_float('ORDER_DEADLINE', 45)
+
+# Per-stage latency budgets in seconds; each call is also cut to whatever
+# is left of the request deadline
+INVENTORY_TIMEOUT = env_float('INVENTORY_TIMEOUT', 30)
+RESERVATION_TIMEOUT = env_float('RESERVATION_TIMEOUT', 30)
+RESERVATION_RELEASE_TIMEOUT = env_float('RESERVATION_RELEASE_TIMEOUT', 10)
+PRICING_TIMEOUT = env_float('PRICING_TIMEOUT', 30)
+LOYALTY_TIMEOUT = env_float('LOYALTY_TIMEOUT', 10)
+NOTIFICATION_TIMEOUT = env_float('NOTIFICATION_TIMEOUT', 10)
+REGIONS_TIMEOUT = env_float('REGIONS_TIMEOUT', 10)
+
+# Large carts are split into batches of distinct products that are checked
+# concurrently
+INVENTORY_BATCH_SIZE = 200
+INVENTORY_PARALLELISM = 4
+INVENTORY_DEADLINE = env_float('INVENTORY_DEADLINE', 30)
+
+# Loyalty points and notifications are written to order_outbox with the
+# order and delivered by the relay after create_order responds
+OUTBOX_BATCH_SIZE = env_int('OUTBOX_BATCH_SIZE', 50)
+OUTBOX_POLL_INTERVAL = env_float('OUTBOX_POLL_INTERVAL', 1.0)
+OUTBOX_PARALLELISM = env_int('OUTBOX_PARALLELISM', 8)
+OUTBOX_MAX_ATTEMPTS = env_int('OUTBOX_MAX_ATTEMPTS', 8)
+
+# Stock is always enforced by the guarded decrement in the save transaction.
+# With the pre-check off, prices are read from the database and the
+# Inventory Service round trip is skipped.
+INVENTORY_PRECHECK = env_bool('INVENTORY_PRECHECK', True)
+
+# Ask Pricing for a quote by product id while stock is being checked,
+# instead of after it; the quote is rejected unless both saw the same
+# prices (price_version)
+PARALLEL_PRICING = env_bool('PARALLEL_PRICING', True)
+
+# Optional group commit: concurrent order saves share one transaction per
+# window (seconds) or batch, so the database does one commit for many orders
+GROUP_COMMIT = env_bool('GROUP_COMMIT', False)
+GROUP_COMMIT_WINDOW = env_float('GROUP_COMMIT_WINDOW', 0.005)
+GROUP_COMMIT_MAX_BATCH = env_int('GROUP_COMMIT_MAX_BATCH', 32)
+GROUP_COMMIT_TIMEOUT = env_float('GROUP_COMMIT_TIMEOUT', 30)
+
+# Read-through cache of serialized order documents for GET /api/orders/<id>
+ORDER_CACHE_ENABLED = env_bool('ORDER_CACHE_ENABLED', True)
+ORDER_CACHE_MAX_ENTRIES = env_int('ORDER_CACHE_MAX_ENTRIES', 100000)
+ORDER_CACHE_MAX_BYTES = env_int('ORDER_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+ORDER_CACHE_TTL = env_float('ORDER_CACHE_TTL', 600)
+
+# Order search (GET /api/orders)
+ORDER_SEARCH_DEFAULT_LIMIT = env_int('ORDER_SEARCH_DEFAULT_LIMIT', 50)
+ORDER_SEARCH_MAX_LIMIT = env_int('ORDER_SEARCH_MAX_LIMIT', 500)
+
+# Bulk order import
+MAX_IMPORT_ORDERS = env_int('MAX_IMPORT_ORDERS', 10000)
+IMPORT_CHUNK_SIZE = env_int('IMPORT_CHUNK_SIZE', 200)
+IMPORT_LOOKUP_BATCH_SIZE = 1000
+IMPORT_PRICING_TIMEOUT = 120
+
+# Idempotency-Key support for order creation
+MAX_IDEMPOTENCY_KEY_LENGTH = 100
+IDEMPOTENCY_CACHE_SIZE = env_int('IDEMPOTENCY_CACHE_SIZE', 10000)
+IDEMPOTENCY_WAIT_TIMEOUT = env_float('IDEMPOTENCY_WAIT_TIMEOUT', 30)
 
 # Database Configuration
 DB_CONFIG = {
@@ -34,13 +138,33 @@ DB_CONFIG = {
 
 def get_db_connection():
     """Create database connection"""
-    return mysql.connector.connect(**DB_CONFIG)
+    return instrument_connection(mysql.connector.connect(**DB_CONFIG))
+
+
+# Read-only endpoints use a replica when DB_READ_REPLICAS is set
+read_router = ReadRouter(get_db_connection, DB_CONFIG)
+
+
+idempotency_store = IdempotencyStore(
+    get_db_connection,
+    cache_size=IDEMPOTENCY_CACHE_SIZE,
+    wait_timeout=IDEMPOTENCY_WAIT_TIMEOUT
+)
+
+group_commit_writer = GroupCommitWriter(
+    get_db_connection,
+    window=GROUP_COMMIT_WINDOW,
+    max_batch=GROUP_COMMIT_MAX_BATCH
+)
 
 # ============================================================
 # Input Validation
 # ============================================================
 
 def validate_order_input(data):
+    if not isinstance(data, dict):
+        return False, "Request body must be a JSON object"
+    
     if 'customer_id' not in data:
         return False, "Missing required field: customer_id"
     
@@ -66,66 +190,223 @@ def validate_order_input(data):
         if not isinstance(product['quantity'], int) or product['quantity'] <= 0:
             return False, f"Invalid quantity at index {idx}: must be positive"
     
+    if 'reservation_id' in data:
+        if not isinstance(data['reservation_id'], str) or not data['reservation_id']:
+            return False, "Invalid reservation_id: must be a non-empty string"
+    
     return True, None
 
+# ============================================================
+# Downstream Failures
+# ============================================================
+
+class ServiceFailure(str):
+    """Error message of a step that failed for lack of another service,
+    not because of the order. ``status`` (503, 504 or 502) is what the
+    order request answers with, so the client retries and the
+    Idempotency-Key does not keep the failure."""
+
+    def __new__(cls, message, status=503):
+        failure = super().__new__(cls, message)
+        failure.status = status
+        return failure
+
+
+def failure_status(error, default=400):
+    """HTTP status for a pipeline step that failed with ``error``"""
+    return getattr(error, 'status', default)
+
 # ============================================================
 # Check Inventory (with price fetching)
 # ============================================================
 
-def check_inventory(products):
-    inventory_items = []
+def fetch_inventory_batch(lines):
+    """Ask Inventory Service about one batch of distinct products."""
+    response = inventory_client.post(
+        "/inventory/batch",
+        json={'items': lines},
+        timeout=INVENTORY_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def inventory_batches(products):
+    """Split a cart into batches of distinct products with their total quantity"""
+    # The same product may appear on several lines
+    requested = {}
+    for product in products:
+        requested[product['product_id']] = requested.get(product['product_id'], 0) + product['quantity']
     
+    lines = [{'product_id': pid, 'quantity': qty} for pid, qty in requested.items()]
+    return [
+        lines[i:i + INVENTORY_BATCH_SIZE]
+        for i in range(0, len(lines), INVENTORY_BATCH_SIZE)
+    ]
+
+
+def check_inventory(products):
+    """Check stock and fetch prices for the whole cart.
+
+    The cart is checked in batches of distinct products that run
+    concurrently; the check stops as soon as one batch reports a shortfall.
+
+    Returns (success, inventory_items_or_error, shortfalls).
+    """
     logger.info(f"🔍 Checking inventory for {len(products)} products...")
     
+    outcome = fan_out(
+        fetch_inventory_batch,
+        inventory_batches(products),
+        parallelism=INVENTORY_PARALLELISM,
+        deadline=INVENTORY_DEADLINE,
+        stop_when=lambda result: bool(result.get('shortfalls'))
+    )
+    return inventory_outcome(products, outcome.results, outcome.first_error(), outcome.timed_out)
+
+
+def inventory_outcome(products, results, error, timed_out):
+    """Turn the batch responses of an inventory check into
+    (success, inventory_items_or_error, shortfalls)"""
+    shortfalls = []
+    stock = {}
+    for result in results:
+        if result:
+            shortfalls.extend(result.get('shortfalls', []))
+            for row in result.get('products', []):
+                stock[row['product_id']] = row
+    
+    if shortfalls:
+        details = ", ".join(
+            f"product {s['product_id']} (Available: {s['available']}, Requested: {s['requested']})"
+            for s in shortfalls
+        )
+        logger.warning(f"⚠️ Insufficient stock for {len(shortfalls)} products")
+        return False, f"Insufficient stock for {details}", shortfalls
+    
+    if isinstance(error, CircuitOpenError):
+        logger.error(f"🔴 Inventory service circuit is open")
+        return False, ServiceFailure("Inventory service unavailable, try again shortly"), []
+    
+    if timed_out or isinstance(error, requests.exceptions.Timeout):
+        logger.error(f"⏱️ Timeout checking inventory")
+        return False, ServiceFailure("Inventory service timeout", 504), []
+    
+    if isinstance(error, requests.exceptions.ConnectionError):
+        logger.error(f"🔌 Cannot connect to Inventory service")
+        return False, ServiceFailure("Cannot connect to Inventory service. Ensure it's running on port 5002"), []
+    
+    if isinstance(error, requests.exceptions.HTTPError):
+        logger.error(f"❌ Inventory service error: {error.response.status_code}")
+        return False, ServiceFailure("Failed to check inventory", 502), []
+    
+    if error is not None:
+        logger.error(f"❌ Error checking inventory: {str(error)}")
+        return False, ServiceFailure(f"Error checking inventory: {str(error)}", 502), []
+    
+    inventory_items = []
+    
     for product in products:
         product_id = product['product_id']
-        requested_qty = product['quantity']
-        
-        try:
-            response = requests.get(
-                f"{INVENTORY_SERVICE_URL}/inventory/{product_id}",
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"❌ Inventory service error for product {product_id}: {response.status_code}")
-                return False, f"Failed to check inventory for product {product_id}"
-            
-            inventory_data = response.json()
-            available_qty = inventory_data.get('quantity_available', 0)
-            unit_price = inventory_data.get('unit_price', 0.0)
-            product_name = inventory_data.get('product_name', 'Unknown')
-            
-            logger.info(f"  ✓ Product {product_id}: {product_name}")
-            logger.info(f"    Price: {unit_price}, Available: {available_qty}, Requested: {requested_qty}")
-            
-            # Check quantity availability
-            if available_qty < requested_qty:
-                logger.warning(f"⚠️ Insufficient stock for product {product_id}")
-                return False, f"Insufficient stock for product {product_id}. Available: {available_qty}, Requested: {requested_qty}"
-            
-            # Save all data including unit_price
-            inventory_items.append({
-                'product_id': product_id,
-                'product_name': product_name,
-                'quantity': requested_qty,
-                'unit_price': unit_price
-            })
-            
-        except requests.exceptions.Timeout:
-            logger.error(f"⏱️ Timeout checking inventory for product {product_id}")
-            return False, f"Inventory service timeout for product {product_id}"
+        inventory_row = stock.get(product_id)
         
-        except requests.exceptions.ConnectionError:
-            logger.error(f"🔌 Cannot connect to Inventory service")
-            return False, "Cannot connect to Inventory service. Ensure it's running on port 5002"
+        if inventory_row is None:
+            logger.error(f"❌ Product {product_id} missing from inventory response")
+            return False, ServiceFailure(f"Failed to check inventory for product {product_id}", 502), []
         
-        except Exception as e:
-            logger.error(f"❌ Error checking inventory: {str(e)}")
-            return False, f"Error checking inventory: {str(e)}"
+        # Save all data including unit_price
+        inventory_items.append({
+            'product_id': product_id,
+            'product_name': inventory_row.get('product_name', 'Unknown'),
+            'quantity': product['quantity'],
+            'unit_price': inventory_row.get('unit_price', 0.0)
+        })
     
     logger.info(f"✅ All products available and prices fetched")
-    return True, inventory_items
+    return True, inventory_items, []
+
+# ============================================================
+# Stock Reservations
+# ============================================================
+
+def commit_reservation(reservation_id, products):
+    """Convert a checkout hold into a stock decrement.
+
+    Replaces the stock check when the buyer holds a reservation: the
+    Inventory Service takes the stock and returns current names and prices.
+
+    Returns (success, inventory_items_or_error, shortfalls).
+    """
+    logger.info(f"🔒 Committing reservation {reservation_id}...")
+    
+    try:
+        response = inventory_client.post(
+            f"/inventory/reservations/{reservation_id}/commit",
+            json={
+                'items': [
+                    {'product_id': p['product_id'], 'quantity': p['quantity']}
+                    for p in products
+                ]
+            },
+            timeout=RESERVATION_TIMEOUT
+        )
+    except CircuitOpenError:
+        logger.error(f"🔴 Inventory service circuit is open")
+        return False, ServiceFailure("Inventory service unavailable, try again shortly"), []
+    except requests.exceptions.Timeout:
+        logger.error(f"⏱️ Timeout committing reservation")
+        return False, ServiceFailure("Inventory service timeout", 504), []
+    except requests.exceptions.RequestException as e:
+        logger.error(f"🔌 Cannot connect to Inventory service: {e}")
+        return False, ServiceFailure("Cannot connect to Inventory service. Ensure it's running on port 5002"), []
+    
+    return reservation_outcome(reservation_id, products, response)
+
+
+def reservation_outcome(reservation_id, products, response):
+    """Turn a reservation commit response into
+    (success, inventory_items_or_error, shortfalls)"""
+    if response.status_code != 200:
+        try:
+            error = response.json().get('error', 'Failed to commit reservation')
+        except ValueError:
+            error = 'Failed to commit reservation'
+        logger.warning(f"❌ Reservation {reservation_id} not committed: {error}")
+        if response.status_code >= 500:
+            error = ServiceFailure(error, 502)
+        return False, error, []
+    
+    reserved = {item['product_id']: item for item in response.json().get('items', [])}
+    inventory_items = [
+        {
+            'product_id': p['product_id'],
+            'product_name': reserved[p['product_id']]['product_name'],
+            'quantity': p['quantity'],
+            'unit_price': reserved[p['product_id']]['unit_price']
+        }
+        for p in products
+    ]
+    
+    logger.info(f"✅ Reservation {reservation_id} committed")
+    return True, inventory_items, []
+
+
+def release_reservation(reservation_id):
+    """Give back the stock of a committed reservation whose order failed"""
+    try:
+        response = inventory_client.post(
+            f"/inventory/reservations/{reservation_id}/release",
+            json={'order_failed': True},
+            timeout=RESERVATION_RELEASE_TIMEOUT,
+            enforce_deadline=False
+        )
+        if response.status_code == 200:
+            logger.info(f"↩️ Reservation {reservation_id} released")
+            return True
+        logger.error(f"❌ Failed to release reservation {reservation_id}: {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"❌ Failed to release reservation {reservation_id}: {e}")
+    return False
 
 # ============================================================
 # Calculate Pricing
@@ -139,51 +420,223 @@ def calculate_pricing(inventory_items, region='Cairo'):
     
     logger.info(f"💰 Calculating pricing...")
     logger.info(f"🌍 Region: {region}")
-    logger.info(f"📤 Payload: {payload}")
+    logger.debug("📤 Payload: %s", payload)
     
     try:
-        response = requests.post(
-            f"{PRICING_SERVICE_URL}/api/pricing/calculate",
+        response = pricing_client.post(
+            "/api/pricing/calculate",
             json=payload,
-            timeout=30,
+            timeout=PRICING_TIMEOUT,
             headers={'Content-Type': 'application/json'}
         )
         
-        logger.info(f"📥 Pricing service response code: {response.status_code}")
-        
-        if response.status_code != 200:
-            logger.error(f"❌ Pricing service error: {response.status_code}")
-            logger.error(f"Response: {response.text}")
-            return False, f"Pricing service error: {response.text}"
-        
-        pricing_data = response.json()
-        
-        logger.info(f"✅ Pricing calculated successfully")
-        logger.info(f"  Region: {pricing_data.get('region', 'Unknown')}")
-        logger.info(f"  Subtotal: {pricing_data.get('subtotal', 0)}")
-        logger.info(f"  Discount: {pricing_data.get('discount', 0)}")
-        logger.info(f"  Tax ({pricing_data.get('tax_rate', 0)}%): {pricing_data.get('tax', 0)}")
-        logger.info(f"  Total: {pricing_data.get('total_amount', 0)}")
-        
-        return True, pricing_data
+        return pricing_outcome(response)
         
+    except CircuitOpenError:
+        logger.error("🔴 Pricing service circuit is open")
+        return False, ServiceFailure("Pricing service unavailable, try again shortly")
+    
     except requests.exceptions.Timeout:
         logger.error("⏱️ Timeout calculating pricing")
-        return False, "Pricing service timeout"
+        return False, ServiceFailure("Pricing service timeout", 504)
     
     except requests.exceptions.ConnectionError:
         logger.error("🔌 Cannot connect to Pricing service")
-        return False, "Cannot connect to Pricing service. Ensure it's running on port 5003"
+        return False, ServiceFailure("Cannot connect to Pricing service. Ensure it's running on port 5003")
     
     except Exception as e:
         logger.error(f"❌ Error calculating pricing: {str(e)}")
-        return False, f"Error calculating pricing: {str(e)}"
+        return False, ServiceFailure(f"Error calculating pricing: {str(e)}", 502)
+
+
+def start_quote(products, region):
+    """Start pricing the cart from Pricing's own price table, in the
+    background; returns a future of (success, pricing_data_or_error)"""
+    lines = [{'product_id': p['product_id'], 'quantity': p['quantity']} for p in products]
+    context = contextvars.copy_context()
+    return get_executor().submit(context.run, calculate_pricing, lines, region)
+
+
+def price_version_mismatch(inventory_items, pricing_data):
+    """Error message if a quote used other prices than the stock check"""
+    quoted = pricing_data.get('price_version')
+    if quoted is None:
+        return "Pricing service did not return a price version"
+    checked = price_version(item_prices(inventory_items))
+    if quoted != checked:
+        logger.warning(f"⚠️ Price version mismatch: quote {quoted}, inventory {checked}")
+        return "Prices changed during checkout, please retry"
+    return None
+
+
+def pricing_outcome(response):
+    """Turn a Pricing Service response into (success, pricing_data_or_error)"""
+    logger.info(f"📥 Pricing service response code: {response.status_code}")
+    
+    if response.status_code != 200:
+        logger.error(f"❌ Pricing service error: {response.status_code}")
+        logger.error(f"Response: {response.text}")
+        error = f"Pricing service error: {response.text}"
+        if response.status_code >= 500:
+            error = ServiceFailure(error, 502)
+        return False, error
+    
+    pricing_data = response.json()
+    
+    logger.info(f"✅ Pricing calculated successfully")
+    logger.info(f"  Region: {pricing_data.get('region', 'Unknown')}")
+    logger.info(f"  Subtotal: {pricing_data.get('subtotal', 0)}")
+    logger.info(f"  Discount: {pricing_data.get('discount', 0)}")
+    logger.info(f"  Tax ({pricing_data.get('tax_rate', 0)}%): {pricing_data.get('tax', 0)}")
+    logger.info(f"  Total: {pricing_data.get('total_amount', 0)}")
+    
+    return True, pricing_data
+
+# ============================================================
+# Direct Product Lookup
+# ============================================================
+
+def load_inventory_items(products):
+    """Read names and prices straight from the inventory table.
+
+    Used instead of the Inventory Service pre-check when INVENTORY_PRECHECK
+    is off; stock is then only enforced by the guarded decrement at save
+    time.
+
+    Returns (success, inventory_items_or_error, shortfalls).
+    """
+    product_ids = list({p['product_id'] for p in products})
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT product_id, product_name, unit_price
+            FROM inventory
+            WHERE product_id IN ({placeholders})
+        """, tuple(product_ids))
+        rows = {row['product_id']: row for row in cursor.fetchall()}
+        cursor.close()
+    except Error as e:
+        logger.error(f"❌ Database error loading products: {e}")
+        return False, f"Database error: {str(e)}", []
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    
+    missing = [pid for pid in product_ids if pid not in rows]
+    if missing:
+        shortfalls = [
+            {'product_id': pid, 'requested': sum(p['quantity'] for p in products if p['product_id'] == pid),
+             'available': 0, 'reason': 'not_found'}
+            for pid in missing
+        ]
+        return False, f"Products not found: {', '.join(str(pid) for pid in missing)}", shortfalls
+    
+    inventory_items = [
+        {
+            'product_id': p['product_id'],
+            'product_name': rows[p['product_id']]['product_name'],
+            'quantity': p['quantity'],
+            'unit_price': float(rows[p['product_id']]['unit_price'])
+        }
+        for p in products
+    ]
+    return True, inventory_items, []
 
 # ============================================================
 # Save Order to Database
 # ============================================================
 
-def save_order_to_database(customer_id, pricing_data, inventory_items):
+def load_shortfalls(requested, cursor=None):
+    """Read which products are short, on ``cursor`` or a fresh connection.
+
+    The order already failed for lack of stock, so a failed read still
+    answers with the requested quantities rather than a database error.
+    """
+    conn = None
+    try:
+        if cursor is None:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+        return find_shortfalls(cursor, requested)
+    except Error as e:
+        logger.warning(f"⚠️ Could not read shortfalls: {e}")
+        return [
+            {'product_id': product_id, 'requested': quantity, 'available': None, 'reason': 'insufficient_stock'}
+            for product_id, quantity in sorted(requested.items())
+        ]
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def save_order_to_database(customer_id, pricing_data, inventory_items, reservation_id=None, respond=None):
+    """Write the order, its items, the stock decrement and outbox rows in
+    one transaction. With ``reservation_id`` the stock was already taken
+    by committing that reservation and is not decremented again. With
+    GROUP_COMMIT on, the write shares a transaction with concurrent orders.
+
+    When the request holds an Idempotency-Key, ``respond(order_id)`` builds
+    the success body and the key is completed with it in the same
+    transaction.
+
+    Returns (success, order_id_or_error, shortfalls).
+    """
+    error = validate_pricing_data(pricing_data)
+    if error:
+        logger.error(f"❌ {error}")
+        return False, error, []
+    
+    total_amount = pricing_data.get('total_amount', 0.0)
+    logger.info(
+        f"💾 Saving order: {len(pricing_data['items'])} items, "
+        f"subtotal {pricing_data.get('subtotal', 0.0)}, discount {pricing_data.get('discount', 0.0)}, "
+        f"tax {pricing_data.get('tax', 0.0)}, total {total_amount}"
+    )
+    
+    # Read here: the group-commit writer thread has no request context
+    claim = current_claim() if respond is not None else None
+    
+    def job(cursor):
+        document = write_order(
+            cursor,
+            customer_id,
+            pricing_data,
+            inventory_items,
+            lambda new_order_id: post_order_events(customer_id, new_order_id, total_amount),
+            reservation_id=reservation_id
+        )
+        if claim is not None:
+            claim.complete(cursor, respond(document['order_id']), 201)
+        return document
+    
+    if GROUP_COMMIT:
+        try:
+            document = group_commit_writer.write(job, timeout=GROUP_COMMIT_TIMEOUT)
+            order_id = document['order_id']
+            cache_order(document)
+            logger.info(f"✅ Order {order_id} saved in group commit")
+            return True, order_id, []
+        except InsufficientStock as e:
+            shortfalls = load_shortfalls(e.requested)
+            logger.warning(f"⚠️ Insufficient stock for {len(shortfalls)} products, order rolled back")
+            return False, "Insufficient stock", shortfalls
+        except ReservationNotCommitted as e:
+            logger.warning(f"⚠️ {e}, order rolled back")
+            return False, str(e), []
+        except GroupCommitTimeout as e:
+            logger.error(f"⏱️ {e}")
+            return False, str(e), []
+        except Error as e:
+            logger.error(f"❌ Database error in group commit: {e}")
+            return False, f"Database error: {str(e)}", []
+        except Exception as e:
+            logger.error(f"❌ Unexpected error in group commit: {e}")
+            return False, f"Unexpected error: {str(e)}", []
+    
     conn = None
     try:
         conn = get_db_connection()
@@ -191,105 +644,33 @@ def save_order_to_database(customer_id, pricing_data, inventory_items):
         
         conn.start_transaction()
         
-        logger.info(f"💾 Saving order to database...")
-        
-        # Extract data
-        subtotal = pricing_data.get('subtotal', 0.0)
-        discount = pricing_data.get('discount', 0.0)
-        tax = pricing_data.get('tax', 0.0)
-        total_amount = pricing_data.get('total_amount', 0.0)
-        
-        logger.info(f"📊 Order financials:")
-        logger.info(f"  Subtotal: {subtotal}")
-        logger.info(f"  Discount: {discount}")
-        logger.info(f"  Tax: {tax}")
-        logger.info(f"  Total: {total_amount}")
-        
-        # Validate data
-        if total_amount == 0:
-            logger.error("❌ Total amount is 0! Pricing data invalid!")
-            logger.error(f"Pricing data: {pricing_data}")
-            return False, "Invalid pricing data: total amount is 0"
-        
-        # 1. Save Order
-        cursor.execute("""
-            INSERT INTO orders 
-            (customer_id, total_amount, subtotal, discount, tax, status)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (
-            customer_id,
-            total_amount,
-            subtotal,
-            discount,
-            tax,
-            'confirmed'
-        ))
-        
-        order_id = cursor.lastrowid
-        logger.info(f"✓ Order {order_id} record created")
-        
-        # 2. Save Order Items
-        items = pricing_data.get('items', [])
-        
-        if not items:
-            logger.error("❌ No items in pricing data!")
-            return False, "No items in pricing response"
-        
-        logger.info(f"📦 Saving {len(items)} order items...")
-        
-        for item in items:
-            product_id = item.get('product_id')
-            quantity = item.get('quantity')
-            unit_price = item.get('unit_price')
-            discounted_price = item.get('discounted_price')
-            discount_pct = item.get('discount_percentage', 0.0)
-            line_total = item.get('line_total')
-            
-            logger.info(f"  Item: Product {product_id}, Qty {quantity}, Price {unit_price}, Discount {discount_pct}%, Total {line_total}")
-            
-            cursor.execute("""
-                INSERT INTO order_items
-                (order_id, product_id, quantity, unit_price, discounted_price, 
-                 discount_percentage, line_total)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                order_id,
-                product_id,
-                quantity,
-                unit_price,
-                discounted_price,
-                discount_pct,
-                line_total
-            ))
-        
-        logger.info(f"✓ {len(items)} items saved")
-        
-        # 3. Update Inventory
-        logger.info(f"📉 Updating inventory...")
-        for item in inventory_items:
-            cursor.execute("""
-                UPDATE inventory
-                SET quantity_available = quantity_available - %s,
-                    last_updated = CURRENT_TIMESTAMP
-                WHERE product_id = %s
-            """, (item['quantity'], item['product_id']))
-            
-            logger.info(f"  ✓ Product {item['product_id']}: -{item['quantity']} units")
+        try:
+            document = job(cursor)
+            order_id = document['order_id']
+        except InsufficientStock as e:
+            conn.rollback()
+            shortfalls = load_shortfalls(e.requested, cursor)
+            logger.warning(f"⚠️ Insufficient stock for {len(shortfalls)} products, order rolled back")
+            return False, "Insufficient stock", shortfalls
+        except ReservationNotCommitted as e:
+            conn.rollback()
+            logger.warning(f"⚠️ {e}, order rolled back")
+            return False, str(e), []
         
-        # 4. Commit
         conn.commit()
+        cache_order(document)
         logger.info(f"✅ Order {order_id} saved and committed successfully!")
         
         cursor.close()
         conn.close()
         
-        return True, order_id
+        return True, order_id, []
         
     except Error as e:
         if conn:
             conn.rollback()
             logger.error(f"❌ Database error, rolled back: {e}")
-        return False, f"Database error: {str(e)}"
+        return False, f"Database error: {str(e)}", []
         
     except Exception as e:
         if conn:
@@ -297,136 +678,562 @@ def save_order_to_database(customer_id, pricing_data, inventory_items):
             logger.error(f"❌ Unexpected error: {e}")
         import traceback
         traceback.print_exc()
-        return False, f"Unexpected error: {str(e)}"
+        return False, f"Unexpected error: {str(e)}", []
     
     finally:
         if conn and conn.is_connected():
             conn.close()
 
 # ============================================================
-# Main Endpoint - Create Order
+# Post-Order Side Effects
 # ============================================================
 
-@app.route('/api/orders/create', methods=['POST'])
-def create_order():
-    logger.info("=" * 60)
-    logger.info("🛒 NEW ORDER REQUEST RECEIVED")
-    logger.info("=" * 60)
+def award_loyalty_points(customer_id, total_amount, order_id=None):
+    """Add loyalty points for an order (1 point per 10 EGP)
+
+    The outbox may deliver an event more than once; the order_id lets the
+    Customer Service apply each order's points only once. Events written
+    before it was added carry no order_id.
+    """
+    points_to_add = int(total_amount / 10)
+    if points_to_add <= 0:
+        return True
     
     try:
-        # 1. Get data
-        data = request.get_json()
-        logger.info(f"📥 Received data: {data}")
+        with stage('loyalty'):
+            loyalty_response = customer_client.put(
+                f"/api/customers/{customer_id}/loyalty",
+                json={'points_to_add': points_to_add, 'order_id': order_id},
+                timeout=LOYALTY_TIMEOUT
+            )
         
+        if loyalty_response.status_code == 200:
+            logger.info(f"✅ Added {points_to_add} loyalty points")
+            return True
+        logger.warning(f"⚠️ Failed to update loyalty points")
+    except Exception as e:
+        logger.warning(f"⚠️ Loyalty points update failed: {e}")
+    return False
+
+
+def send_order_notification(order_id):
+    """Ask Notification Service to confirm the order to the customer"""
+    try:
+        with stage('notification'):
+            notification_response = notification_client.post(
+                "/api/notifications/send",
+                json={
+                    'order_id': order_id,
+                    'notification_type': 'order_confirmation'
+                },
+                timeout=NOTIFICATION_TIMEOUT
+            )
+        
+        # 200: already sent for this order (a redelivered event)
+        if notification_response.status_code in (200, 201):
+            logger.info(f"✅ Notification sent successfully")
+            return True
+        logger.warning(f"⚠️ Failed to send notification")
+    except Exception as e:
+        logger.warning(f"⚠️ Notification sending failed: {e}")
+    return False
+
+
+def post_order_events(customer_id, order_id, total_amount):
+    """Outbox events written in the same transaction as the order"""
+    return [
+        ('loyalty_points', {'customer_id': customer_id, 'total_amount': total_amount, 'order_id': order_id}),
+        ('order_notification', {'order_id': order_id})
+    ]
+
+
+outbox_relay = OutboxRelay(
+    get_db_connection,
+    handlers={
+        'loyalty_points': award_loyalty_points,
+        'order_notification': send_order_notification
+    },
+    batch_size=OUTBOX_BATCH_SIZE,
+    poll_interval=OUTBOX_POLL_INTERVAL,
+    parallelism=OUTBOX_PARALLELISM,
+    max_attempts=OUTBOX_MAX_ATTEMPTS
+)
+
+
+# Claims use SKIP LOCKED, so every worker process can run its own relay
+@after_fork
+def start_outbox_relay():
+    outbox_relay.start()
+
+
+@on_shutdown
+def stop_outbox_relay():
+    outbox_relay.stop(timeout=10)
+
+# ============================================================
+# Main Endpoint - Create Order
+# ============================================================
+
+def process_order(data):
+    """Run the order pipeline for one request body.
+
+    Returns (response_body, status_code).
+    """
+    # A committed reservation no order has used yet; released if the
+    # pipeline fails unexpectedly
+    held = None
+    try:
         # 2. Validate input
-        is_valid, error_msg = validate_order_input(data)
+        with stage('validate'):
+            is_valid, error_msg = validate_order_input(data)
         if not is_valid:
             logger.warning(f"❌ Invalid input: {error_msg}")
-            return jsonify({'success': False, 'error': error_msg}), 400
+            return {'success': False, 'error': error_msg}, 400
         
         # 3. Get region (default to Cairo)
         region = data.get('region', 'Cairo')
         logger.info(f"🌍 Order region: {region}")
         
-        # 4. Check inventory (and fetch prices)
-        inventory_success, inventory_result = check_inventory(data['products'])
+        # 4. Check inventory (and fetch prices); the quote runs meanwhile
+        reservation_id = data.get('reservation_id')
+        quote = start_quote(data['products'], region) if PARALLEL_PRICING else None
+        with stage('inventory_check'):
+            if reservation_id:
+                inventory_success, inventory_result, shortfalls = commit_reservation(reservation_id, data['products'])
+            elif INVENTORY_PRECHECK:
+                inventory_success, inventory_result, shortfalls = check_inventory(data['products'])
+            else:
+                inventory_success, inventory_result, shortfalls = load_inventory_items(data['products'])
         if not inventory_success:
+            if quote is not None:
+                quote.cancel()
             logger.warning(f"❌ Inventory check failed: {inventory_result}")
-            return jsonify({
+            return {
                 'success': False,
                 'error': inventory_result,
+                'shortfalls': shortfalls,
                 'stage': 'inventory_check'
-            }), 400
+            }, failure_status(inventory_result)
+        
+        held = reservation_id
         
         # 5. Calculate pricing with region
-        pricing_success, pricing_result = calculate_pricing(
-            inventory_result,
-            region=region
-        )
+        with stage('pricing'):
+            if quote is not None:
+                pricing_success, pricing_result = quote.result()
+            else:
+                pricing_success, pricing_result = calculate_pricing(
+                    inventory_result,
+                    region=region
+                )
+        
+        if pricing_success and quote is not None:
+            mismatch = price_version_mismatch(inventory_result, pricing_result)
+            if mismatch:
+                if reservation_id:
+                    release_reservation(reservation_id)
+                # Nothing final happened: a retry with the same key may succeed
+                allow_retry()
+                return {
+                    'success': False,
+                    'error': mismatch,
+                    'stage': 'pricing_calculation'
+                }, 409
         
         if not pricing_success:
             logger.warning(f"❌ Pricing failed: {pricing_result}")
-            return jsonify({
+            if reservation_id:
+                release_reservation(reservation_id)
+            return {
                 'success': False,
                 'error': pricing_result,
                 'stage': 'pricing_calculation'
-            }), 400
+            }, failure_status(pricing_result)
+        
+        # The caller has given up; don't place an order nobody will see
+        if deadline_expired():
+            logger.warning("⏱️ Request deadline passed before save")
+            if reservation_id:
+                release_reservation(reservation_id)
+            return {
+                'success': False,
+                'error': 'Request deadline exceeded',
+                'stage': 'database_save'
+            }, 504
         
         # 6. Save to Database
-        save_success, order_id_or_error = save_order_to_database(
-            data['customer_id'], 
-            pricing_result, 
-            inventory_result
-        )
+        respond = order_response(data, region, inventory_result, pricing_result)
+        with stage('database_save'):
+            save_success, order_id_or_error, shortfalls = save_order_to_database(
+                data['customer_id'], 
+                pricing_result, 
+                inventory_result,
+                reservation_id=reservation_id,
+                respond=respond
+            )
+        
+        held = None
+        if not save_success and reservation_id:
+            release_reservation(reservation_id)
+        
+        if shortfalls:
+            logger.warning(f"❌ Stock ran out before save: {shortfalls}")
+            return {
+                'success': False,
+                'error': 'Insufficient stock',
+                'shortfalls': shortfalls,
+                'stage': 'inventory_check'
+            }, 409
         
         if not save_success:
             logger.error(f"❌ Failed to save: {order_id_or_error}")
-            return jsonify({
+            return {
                 'success': False,
                 'error': f"Failed to save order: {order_id_or_error}",
                 'stage': 'database_save'
-            }), 500
-        
-        # 7. Update loyalty points
-        try:
-            total_amount = pricing_result.get('total_amount', 0)
-            points_to_add = int(total_amount / 10)  # 1 point per 10 EGP
-            
-            if points_to_add > 0:
-                loyalty_response = requests.put(
-                    f"{CUSTOMER_SERVICE_URL}/api/customers/{data['customer_id']}/loyalty",
-                    json={'points_to_add': points_to_add},
-                    timeout=10
-                )
-                
-                if loyalty_response.status_code == 200:
-                    logger.info(f"✅ Added {points_to_add} loyalty points")
-                else:
-                    logger.warning(f"⚠️ Failed to update loyalty points")
-        except Exception as e:
-            logger.warning(f"⚠️ Loyalty points update failed: {e}")
+            }, 500
         
-        # 8. Send notification
-        try:
-            notification_response = requests.post(
-                f"{NOTIFICATION_SERVICE_URL}/api/notifications/send",
-                json={
-                    'order_id': order_id_or_error,
-                    'notification_type': 'order_confirmation'
-                },
-                timeout=10
-            )
-            
-            if notification_response.status_code == 201:
-                logger.info(f"✅ Notification sent successfully")
-            else:
-                logger.warning(f"⚠️ Failed to send notification")
-        except Exception as e:
-            logger.warning(f"⚠️ Notification sending failed: {e}")
+        # 7-8. Loyalty points and notification are delivered by the
+        # outbox relay after the response
+        outbox_relay.wake()
+        read_router.note_write(data['customer_id'], marked=True)
         
         # 9. Prepare final response
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        response_data = {
-            'success': True,
-            'order_id': order_id_or_error,
-            'customer_id': data['customer_id'],
-            'region': region,
-            'products': inventory_result,
-            'pricing': pricing_result,
-            'timestamp': timestamp,
-            'status': 'confirmed',
-            'message': 'Order created successfully'
-        }
+        return respond(order_id_or_error), 201
         
-        logger.info("=" * 60)
-        logger.info(f"✅ ORDER {order_id_or_error} COMPLETED SUCCESSFULLY!")
-        logger.info("=" * 60)
+    except Exception as e:
+        logger.error(f"❌ Unexpected error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        if held:
+            release_reservation(held)
+        return {
+            'success': False,
+            'error': 'Internal server error',
+            'details': str(e)
+        }, 500
+
+
+def confirmed_order(data, region, order_id, inventory_items, pricing_data):
+    """Response body of a placed order"""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    response_data = {
+        'success': True,
+        'order_id': order_id,
+        'customer_id': data['customer_id'],
+        'region': region,
+        'products': inventory_items,
+        'pricing': pricing_data,
+        'timestamp': timestamp,
+        'status': 'confirmed',
+        'message': 'Order created successfully'
+    }
+    
+    logger.info("=" * 60)
+    logger.info(f"✅ ORDER {order_id} COMPLETED SUCCESSFULLY!")
+    logger.info("=" * 60)
+    
+    return response_data
+
+
+def order_response(data, region, inventory_items, pricing_data):
+    """``respond(order_id)`` building the success body once, so the body
+    stored with the Idempotency-Key is the one returned"""
+    placed = {}
+    
+    def respond(order_id):
+        if order_id not in placed:
+            placed[order_id] = confirmed_order(data, region, order_id, inventory_items, pricing_data)
+        return placed[order_id]
+    return respond
+
+@app.route('/api/orders/create', methods=['POST'])
+def create_order():
+    """Create an order.
+
+    With an ``Idempotency-Key`` header, a repeated request gets the stored
+    response instead of placing the order again, and concurrent duplicates
+    wait for the first one.
+    """
+    logger.info("=" * 60)
+    logger.info("🛒 NEW ORDER REQUEST RECEIVED")
+    logger.info("=" * 60)
+    
+    # 1. Get data
+    data = request.get_json(silent=True)
+    logger.debug("📥 Received data: %s", data)
+    
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key and len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return jsonify({
+            'success': False,
+            'error': f"Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+        }), 400
+    
+    with deadline_scope(ORDER_DEADLINE):
+        if not idempotency_key:
+            body, status = process_order(data)
+            return jsonify(body), status
         
-        return jsonify(response_data), 201
+        body, status, replayed = idempotency_store.run(idempotency_key, data, process_order)
+    
+    response = jsonify(body)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response, status
+
+# ============================================================
+# Bulk Order Import
+# ============================================================
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+def parse_order_batch():
+    """Read orders from a JSON list, {"orders": [...]} or an NDJSON stream.
+
+    Returns (orders, error).
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        orders = []
+        for line_no, raw_line in enumerate(request.stream, 1):
+            line = raw_line.strip()
+            if not line:
+                continue
+            try:
+                orders.append(json.loads(line))
+            except ValueError:
+                return None, f"Invalid JSON on line {line_no}"
+            if len(orders) > MAX_IMPORT_ORDERS:
+                break
+        return orders, None
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('orders')
+    if not isinstance(data, list):
+        return None, 'Body must be a JSON list of orders, {"orders": [...]} or NDJSON'
+    return data, None
+
+
+def resolve_products(product_ids):
+    """Look up every distinct product of an import at once.
+
+    Returns (products_by_id, error).
+    """
+    lines = [{'product_id': pid, 'quantity': 0} for pid in product_ids]
+    batches = [
+        lines[i:i + IMPORT_LOOKUP_BATCH_SIZE]
+        for i in range(0, len(lines), IMPORT_LOOKUP_BATCH_SIZE)
+    ]
+    outcome = fan_out(
+        fetch_inventory_batch,
+        batches,
+        parallelism=INVENTORY_PARALLELISM,
+        deadline=INVENTORY_DEADLINE
+    )
+    
+    if outcome.timed_out:
+        return None, "Inventory service timeout"
+    error = outcome.first_error()
+    if error is not None:
+        return None, f"Error checking inventory: {str(error)}"
+    
+    products = {}
+    for result in outcome.results:
+        for row in result.get('products', []):
+            products[row['product_id']] = row
+    return products, None
+
+
+def price_carts(carts):
+    """Price many carts with one Pricing Service call.
+
+    Returns (results, error); ``results`` is aligned with ``carts``.
+    """
+    try:
+        response = pricing_client.post(
+            "/api/pricing/calculate-batch",
+            json={'orders': carts},
+            timeout=IMPORT_PRICING_TIMEOUT
+        )
+    except requests.exceptions.RequestException as e:
+        logger.error(f"❌ Batch pricing failed: {e}")
+        return None, f"Pricing service error: {str(e)}"
+    
+    if response.status_code != 200:
+        logger.error(f"❌ Batch pricing error: {response.status_code}")
+        return None, f"Pricing service error: {response.text}"
+    
+    return response.json().get('results', []), None
+
+
+def write_order_chunk(entries):
+    """Save a chunk of priced orders in one transaction.
+
+    Each order runs under its own savepoint, so a shortfall or a rejected
+    statement (an unknown customer_id, a value out of range) only drops
+    that order. Only errors that end the transaction (deadlock, lock wait
+    timeout, lost connection) roll back the whole chunk. Returns
+    [(order_id, error, shortfalls)] aligned with ``entries``.
+    """
+    def make_job(entry):
+        def job(cursor):
+            return write_order(
+                cursor,
+                entry['customer_id'],
+                entry['pricing'],
+                entry['inventory_items'],
+                lambda order_id: post_order_events(entry['customer_id'], order_id, entry['pricing']['total_amount'])
+            )
+        return job
+    
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        conn.start_transaction()
+        outcomes = run_jobs(cursor, [make_job(entry) for entry in entries])
         
+        results = []
+        for document, error in outcomes:
+            if isinstance(error, InsufficientStock):
+                # Still inside the chunk's transaction, so earlier orders of
+                # the chunk are counted
+                results.append((None, "Insufficient stock", find_shortfalls(cursor, error.requested)))
+            elif isinstance(error, Error):
+                results.append((None, f"Database error: {str(error)}", []))
+            elif error is not None:
+                results.append((None, str(error), []))
+            else:
+                results.append((document['order_id'], None, []))
+        
+        conn.commit()
+        cursor.close()
+        return results
+    except Error as e:
+        conn.rollback()
+        logger.error(f"❌ Import chunk of {len(entries)} orders rolled back: {e}")
+        return [(None, f"Database error: {str(e)}", [])] * len(entries)
+    finally:
+        conn.close()
+
+
+def import_orders(orders):
+    """Validate, resolve, price and save a list of orders.
+
+    Returns a per-order result list aligned with ``orders``.
+    """
+    results = [None] * len(orders)
+    
+    def fail(idx, stage, error, shortfalls=None):
+        results[idx] = {'index': idx, 'success': False, 'stage': stage, 'error': error}
+        if shortfalls:
+            results[idx]['shortfalls'] = shortfalls
+    
+    # 1. Validate every order
+    valid = []
+    for idx, order in enumerate(orders):
+        is_valid, error_msg = validate_order_input(order)
+        if not is_valid:
+            fail(idx, 'validation', error_msg)
+        elif 'reservation_id' in order:
+            fail(idx, 'validation', "reservation_id is not supported in bulk imports")
+        else:
+            valid.append(idx)
+    
+    # 2. Resolve all distinct products at once
+    product_ids = sorted({p['product_id'] for idx in valid for p in orders[idx]['products']})
+    products, error = resolve_products(product_ids) if product_ids else ({}, None)
+    if error:
+        for idx in valid:
+            fail(idx, 'inventory_check', error)
+        return results
+    
+    carts = []
+    for idx in valid:
+        missing = sorted({p['product_id'] for p in orders[idx]['products'] if p['product_id'] not in products})
+        if missing:
+            fail(idx, 'inventory_check', f"Products not found: {', '.join(str(pid) for pid in missing)}")
+            continue
+        inventory_items = [
+            {
+                'product_id': p['product_id'],
+                'product_name': products[p['product_id']].get('product_name', 'Unknown'),
+                'quantity': p['quantity'],
+                'unit_price': products[p['product_id']].get('unit_price', 0.0)
+            }
+            for p in orders[idx]['products']
+        ]
+        carts.append((idx, inventory_items))
+    
+    if not carts:
+        return results
+    
+    # 3. Price all carts in one call
+    pricing_results, error = price_carts([
+        {'products': inventory_items, 'region': orders[idx].get('region', 'Cairo')}
+        for idx, inventory_items in carts
+    ])
+    if error:
+        for idx, _ in carts:
+            fail(idx, 'pricing_calculation', error)
+        return results
+    
+    ready = []
+    for (idx, inventory_items), pricing in zip(carts, pricing_results):
+        error = pricing.get('error') or validate_pricing_data(pricing)
+        if error:
+            fail(idx, 'pricing_calculation', error)
+            continue
+        ready.append({
+            'index': idx,
+            'customer_id': orders[idx]['customer_id'],
+            'inventory_items': inventory_items,
+            'pricing': pricing
+        })
+    
+    # 4. Save in chunked transactions
+    for start in range(0, len(ready), IMPORT_CHUNK_SIZE):
+        chunk = ready[start:start + IMPORT_CHUNK_SIZE]
+        for entry, (order_id, error, shortfalls) in zip(chunk, write_order_chunk(chunk)):
+            idx = entry['index']
+            if error:
+                fail(idx, 'database_save', error, shortfalls)
+            else:
+                results[idx] = {
+                    'index': idx,
+                    'success': True,
+                    'order_id': order_id,
+                    'total_amount': entry['pricing']['total_amount']
+                }
+    
+    return results
+
+
+@app.route('/api/orders/batch', methods=['POST'])
+def create_orders_batch():
+    """Import many orders at once (JSON list or NDJSON).
+
+    Products are resolved with one inventory lookup, all carts are priced
+    with one pricing call, and orders are written in chunked transactions.
+    Each order gets its own result; one bad order does not fail the rest.
+    """
+    started = time.perf_counter()
+    logger.info("📥 POST /api/orders/batch")
+    
+    orders, error = parse_order_batch()
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    if not orders:
+        return jsonify({'success': False, 'error': 'No orders provided'}), 400
+    if len(orders) > MAX_IMPORT_ORDERS:
+        return jsonify({'success': False, 'error': f"At most {MAX_IMPORT_ORDERS} orders per import"}), 400
+    
+    try:
+        results = import_orders(orders)
     except Exception as e:
-        logger.error(f"❌ Unexpected error: {str(e)}")
+        logger.error(f"❌ Import failed: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({
@@ -434,25 +1241,58 @@ def create_order():
             'error': 'Internal server error',
             'details': str(e)
         }), 500
+    
+    created = sum(1 for r in results if r['success'])
+    if created:
+        outbox_relay.wake()
+        read_router.note_write()
+    
+    elapsed = time.perf_counter() - started
+    logger.info(f"✅ Imported {created}/{len(orders)} orders in {elapsed:.2f}s")
+    
+    return jsonify({
+        'success': created == len(orders),
+        'total_orders': len(orders),
+        'created': created,
+        'failed': len(orders) - created,
+        'elapsed_seconds': round(elapsed, 3),
+        'orders_per_second': round(len(orders) / elapsed, 1) if elapsed else None,
+        'results': results
+    }), 200
 
 # ============================================================
 # Retrieve Order from Database
 # ============================================================
 
-@app.route('/api/orders/<int:order_id>', methods=['GET'])
-def get_order(order_id):
-    """Retrieve Order from Database"""
-    logger.info(f"🔍 Retrieving order {order_id}")
-    
+order_cache = LRUCache(
+    max_entries=ORDER_CACHE_MAX_ENTRIES,
+    ttl=ORDER_CACHE_TTL,
+    max_bytes=ORDER_CACHE_MAX_BYTES
+)
+
+
+def cache_order(document):
+    """Store a serialized order document; orders are immutable once confirmed"""
+    if ORDER_CACHE_ENABLED:
+        order_cache.set(document['order_id'], json.dumps(document).encode('utf-8'))
+
+
+def invalidate_order(order_id):
+    """Drop a cached order; call whenever an order's status changes"""
+    order_cache.delete(order_id)
+
+
+def load_order_document(order_id, connect=get_db_connection):
+    """Read an order and its items from the database, or None"""
+    conn = connect()
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("SELECT * FROM orders WHERE order_id = %s", (order_id,))
+        cursor.execute(f"SELECT {', '.join(ORDER_FIELDS)} FROM orders WHERE order_id = %s", (order_id,))
         order = cursor.fetchone()
         
         if not order:
-            return jsonify({'error': 'Order not found'}), 404
+            return None
         
         cursor.execute("""
             SELECT oi.*, i.product_name
@@ -463,30 +1303,101 @@ def get_order(order_id):
         items = cursor.fetchall()
         
         cursor.close()
+    finally:
         conn.close()
-        
-        # Convert datetime to string
-        if order.get('created_at'):
-            order['created_at'] = order['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Convert Decimal to float
-        from decimal import Decimal
-        for key in list(order.keys()):
-            if isinstance(order[key], Decimal):
-                order[key] = float(order[key])
-        
-        for item in items:
-            for key in list(item.keys()):
-                if isinstance(item[key], Decimal):
-                    item[key] = float(item[key])
-        
-        order['items'] = items
-        
-        return jsonify(order), 200
-        
+    
+    # Convert datetime to string
+    if order.get('created_at'):
+        order['created_at'] = order['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+    
+    # Convert Decimal to float
+    for key in list(order.keys()):
+        if isinstance(order[key], Decimal):
+            order[key] = float(order[key])
+    
+    for item in items:
+        for key in list(item.keys()):
+            if isinstance(item[key], Decimal):
+                item[key] = float(item[key])
+    
+    order['items'] = items
+    return order
+
+
+@app.route('/api/orders', methods=['GET'])
+def search_orders():
+    """Search orders, newest first, one keyset page at a time
+
+    Query: status, customer_id, created_from (inclusive), created_to
+    (exclusive), min_total, limit, after (the previous page's
+    next_cursor) and fields (comma-separated projection).
+    """
+    try:
+        filters = parse_search_filters(request.args)
+        limit = parse_page_size(
+            request.args.get('limit'), ORDER_SEARCH_DEFAULT_LIMIT, ORDER_SEARCH_MAX_LIMIT
+        )
+        fields = parse_fields(request.args.get('fields'), ORDER_FIELDS)
+        after = decode_cursor(request.args['after']) if request.args.get('after') else None
+        sql, params, sort = build_search_query(filters, fields, after, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        conn = read_router.connection(filters.get('customer_id'))
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql, params)
+            rows = [row_to_order(row) for row in cursor.fetchall()]
+            cursor.close()
+        finally:
+            conn.close()
     except Error as e:
         logger.error(f"Database error: {e}")
         return jsonify({'error': str(e)}), 500
+    
+    orders, next_cursor = page(rows, limit, cursor_for(sort))
+    return jsonify({
+        'orders': orders,
+        'count': len(orders),
+        'limit': limit,
+        'next_cursor': next_cursor
+    }), 200
+
+
+@app.route('/api/orders/<int:order_id>', methods=['GET'])
+def get_order(order_id):
+    """Retrieve Order (read-through cache in front of the database)"""
+    logger.info(f"🔍 Retrieving order {order_id}")
+    
+    cached = order_cache.get(order_id) if ORDER_CACHE_ENABLED else None
+    if cached is not None:
+        return Response(cached, status=200, mimetype='application/json')
+    
+    try:
+        order = load_order_document(order_id, read_router.connection)
+        if not order and read_router.replicas:
+            # Order ids come from the primary; a replica may not have it yet
+            order = load_order_document(order_id)
+    except Error as e:
+        logger.error(f"Database error: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    if not order:
+        return jsonify({'error': 'Order not found'}), 404
+    
+    body = json.dumps(order).encode('utf-8')
+    if ORDER_CACHE_ENABLED:
+        order_cache.set(order_id, body)
+    return Response(body, status=200, mimetype='application/json')
+
+
+@app.route('/stats/order-cache', methods=['GET'])
+def order_cache_stats():
+    """Hit/miss/eviction counters of the order cache"""
+    stats = order_cache.stats()
+    stats['enabled'] = ORDER_CACHE_ENABLED
+    return jsonify(stats), 200
 
 # ============================================================
 # Health Check
@@ -500,26 +1411,82 @@ def health_check():
         'port': 5001
     }), 200
 
+@app.route('/stats/http', methods=['GET'])
+def http_stats():
+    """Connection-reuse and latency counters per downstream service"""
+    return jsonify(client_stats()), 200
+
+
+@app.route('/stats/group-commit', methods=['GET'])
+def group_commit_stats():
+    """Batch fill and wait time of the group-commit writer"""
+    stats = group_commit_writer.stats()
+    stats['enabled'] = GROUP_COMMIT
+    return jsonify(stats), 200
+
+
+@app.route('/stats/logging', methods=['GET'])
+def logging_stats():
+    """Async log queue depth, dropped records and sampling rates"""
+    return jsonify(log_stats()), 200
+
+
+@app.route('/stats/breakers', methods=['GET'])
+def breakers_stats():
+    """Circuit breaker state and trip counts per downstream service"""
+    return jsonify(breaker_stats()), 200
+
+
+@app.route('/stats/read-routing', methods=['GET'])
+def read_routing_stats():
+    return jsonify(read_router.stats()), 200
+
+@app.route('/stats/outbox', methods=['GET'])
+def outbox_stats():
+    """Outbox queue depth, lag and relay batch throughput"""
+    return jsonify(outbox_relay.stats()), 200
+
 # ============================================================
 # Get Regions Endpoint (for dropdown)
 # ============================================================
 
+# Last regions response from the Pricing Service: (etag, cache_control, body)
+regions_copy = LRUCache(1)
+
+
 @app.route('/api/regions', methods=['GET'])
 def get_regions():
     """Get all available regions with their tax rates"""
     logger.info("🌍 GET /api/regions - Fetching regions from DB")
     
     try:
-        # Forward request to Pricing Service
-        response = requests.get(
-            f"{PRICING_SERVICE_URL}/api/pricing/regions",
-            timeout=10
+        # Forward request to Pricing Service, revalidating the copy we
+        # already have rather than fetching it again
+        copy = regions_copy.get('regions')
+        headers = {'If-None-Match': copy[0]} if copy else {}
+        response = pricing_client.get(
+            "/api/pricing/regions",
+            headers=headers,
+            timeout=REGIONS_TIMEOUT
         )
         
-        if response.status_code == 200:
-            regions_data = response.json()
-            logger.info(f"✅ Found {regions_data.get('total_regions', 0)} regions")
-            return jsonify(regions_data), 200
+        if response.status_code == 304 and copy:
+            etag, cache_control, body = copy
+            cache_control = response.headers.get('Cache-Control', cache_control)
+            return conditional(
+                Response(body, mimetype='application/json'), cache_control, unquote_etag(etag)[0]
+            )
+        elif response.status_code == 200:
+            body = response.content
+            cache_control = response.headers.get('Cache-Control', 'no-cache')
+            etag = response.headers.get('ETag')
+            if etag:
+                regions_copy.set('regions', (etag, cache_control, body))
+            logger.info(f"✅ Found {response.json().get('total_regions', 0)} regions")
+            return conditional(
+                Response(body, mimetype='application/json'), cache_control,
+                unquote_etag(etag)[0] if etag else None
+            )
         else:
             logger.error(f"❌ Pricing service error: {response.status_code}")
             return jsonify({
@@ -549,8 +1516,4 @@ if __name__ == '__main__':
     logger.info(f"📧 Notification URL: {NOTIFICATION_SERVICE_URL}")
     logger.info("=" * 60)
     
-    app.run(
-        host='0.0.0.0',
-        port=5001,
-        debug=True
-    )
\ No newline at end of file
+    run_service(app, 'order', 5001)
\ No newline at end of file
@@ -0,0 +1,503 @@
+"""Asyncio order pipeline, served next to the Flask one for A/B tests.
+
+Same steps, rules and responses as ``POST /api/orders/create`` in app.py,
+but each checkout in flight is a coroutine rather than a WSGI thread:
+calls to Inventory and Pricing go through pooled aiohttp clients
+(``common.async_http_client``), and the blocking database work (the save
+transaction, idempotency rows, direct product lookups) runs on a bounded
+thread pool of ``ASYNC_DB_THREADS``. Thousands of checkouts waiting on
+other services then cost one process a coroutine each, while the
+database still sees at most ``ASYNC_DB_THREADS`` connections from it.
+
+    python async_orders.py                   # port 5011 (ASYNC_ORDER_PORT)
+    gunicorn async_orders:make_app --worker-class aiohttp.GunicornWebWorker --workers 4
+
+Pricing, stock, the order cache and the outbox are shared with app.py, so
+orders from either path are the same; send a share of checkout traffic to
+this port to compare them. Needs aiohttp.
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as orders
+from common import deadlines, tracing
+from common.async_http_client import async_client_stats, close_async_clients, get_async_client
+from common.breaker import CircuitOpenError
+from common.config import env_int
+from common.http_client import breaker_stats
+from common.metrics import (
+    CONTENT_TYPE, METRICS_ENABLED, REQUEST_SECONDS, REQUESTS_IN_FLIGHT, render, stage
+)
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# Configuration
+# ============================================================
+
+ASYNC_ORDER_PORT = env_int('ASYNC_ORDER_PORT', 5011)
+
+# Threads for blocking database calls; also caps this process's
+# concurrent database connections
+ASYNC_DB_THREADS = env_int('ASYNC_DB_THREADS', 16)
+
+inventory_client = get_async_client('inventory')
+pricing_client = get_async_client('pricing')
+
+_db_executor = None
+
+
+def get_db_executor():
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_THREADS, thread_name_prefix='async-db')
+    return _db_executor
+
+
+async def run_blocking(fn, *args):
+    """Run ``fn(*args)`` on the database pool, keeping the request's
+    deadline and trace span"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_db_executor(), context.run, fn, *args)
+
+# ============================================================
+# Check Inventory
+# ============================================================
+
+async def check_inventory(products):
+    """Check stock and fetch prices for the whole cart.
+
+    Batches run concurrently, at most INVENTORY_PARALLELISM at a time; the
+    check stops as soon as one batch reports a shortfall.
+
+    Returns (success, inventory_items_or_error, shortfalls).
+    """
+    logger.info(f"🔍 Checking inventory for {len(products)} products...")
+
+    batches = orders.inventory_batches(products)
+    results = [None] * len(batches)
+    semaphore = asyncio.Semaphore(orders.INVENTORY_PARALLELISM)
+
+    async def fetch(index, lines):
+        async with semaphore:
+            response = await inventory_client.post(
+                "/inventory/batch",
+                json={'items': lines},
+                timeout=orders.INVENTORY_TIMEOUT
+            )
+        response.raise_for_status()
+        results[index] = response.json()
+        return results[index]
+
+    budget = orders.INVENTORY_DEADLINE
+    left = deadlines.remaining()
+    if left is not None:
+        budget = min(budget, max(0.0, left))
+
+    error = None
+    timed_out = False
+    tasks = [asyncio.ensure_future(fetch(index, lines)) for index, lines in enumerate(batches)]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=budget):
+            try:
+                result = await next_done
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                error = e
+                break
+            if result.get('shortfalls'):
+                break
+    except asyncio.TimeoutError:
+        timed_out = True
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return orders.inventory_outcome(products, results, error, timed_out)
+
+# ============================================================
+# Stock Reservations
+# ============================================================
+
+async def commit_reservation(reservation_id, products):
+    """Convert a checkout hold into a stock decrement.
+
+    Returns (success, inventory_items_or_error, shortfalls).
+    """
+    logger.info(f"🔒 Committing reservation {reservation_id}...")
+
+    try:
+        response = await inventory_client.post(
+            f"/inventory/reservations/{reservation_id}/commit",
+            json={
+                'items': [
+                    {'product_id': p['product_id'], 'quantity': p['quantity']}
+                    for p in products
+                ]
+            },
+            timeout=orders.RESERVATION_TIMEOUT
+        )
+    except CircuitOpenError:
+        logger.error(f"🔴 Inventory service circuit is open")
+        return False, orders.ServiceFailure("Inventory service unavailable, try again shortly"), []
+    except requests.exceptions.Timeout:
+        logger.error(f"⏱️ Timeout committing reservation")
+        return False, orders.ServiceFailure("Inventory service timeout", 504), []
+    except requests.exceptions.RequestException as e:
+        logger.error(f"🔌 Cannot connect to Inventory service: {e}")
+        return False, orders.ServiceFailure("Cannot connect to Inventory service. Ensure it's running on port 5002"), []
+
+    return orders.reservation_outcome(reservation_id, products, response)
+
+
+async def release_reservation(reservation_id):
+    """Give back the stock of a committed reservation whose order failed"""
+    try:
+        response = await inventory_client.post(
+            f"/inventory/reservations/{reservation_id}/release",
+            json={'order_failed': True},
+            timeout=orders.RESERVATION_RELEASE_TIMEOUT,
+            enforce_deadline=False
+        )
+        if response.status_code == 200:
+            logger.info(f"↩️ Reservation {reservation_id} released")
+            return True
+        logger.error(f"❌ Failed to release reservation {reservation_id}: {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"❌ Failed to release reservation {reservation_id}: {e}")
+    return False
+
+# ============================================================
+# Calculate Pricing
+# ============================================================
+
+async def calculate_pricing(inventory_items, region='Cairo'):
+    payload = {
+        "products": inventory_items,
+        "region": region
+    }
+
+    logger.info(f"💰 Calculating pricing...")
+    logger.info(f"🌍 Region: {region}")
+    logger.debug("📤 Payload: %s", payload)
+
+    try:
+        response = await pricing_client.post(
+            "/api/pricing/calculate",
+            json=payload,
+            timeout=orders.PRICING_TIMEOUT
+        )
+        return orders.pricing_outcome(response)
+
+    except CircuitOpenError:
+        logger.error("🔴 Pricing service circuit is open")
+        return False, orders.ServiceFailure("Pricing service unavailable, try again shortly")
+
+    except requests.exceptions.Timeout:
+        logger.error("⏱️ Timeout calculating pricing")
+        return False, orders.ServiceFailure("Pricing service timeout", 504)
+
+    except requests.exceptions.ConnectionError:
+        logger.error("🔌 Cannot connect to Pricing service")
+        return False, orders.ServiceFailure("Cannot connect to Pricing service. Ensure it's running on port 5003")
+
+    except Exception as e:
+        logger.error(f"❌ Error calculating pricing: {str(e)}")
+        return False, orders.ServiceFailure(f"Error calculating pricing: {str(e)}", 502)
+
+# ============================================================
+# Main Endpoint - Create Order
+# ============================================================
+
+async def process_order(data):
+    """Run the order pipeline for one request body.
+
+    Returns (response_body, status_code), as ``app.process_order`` does.
+    """
+    # A committed reservation no order has used yet; released if the
+    # pipeline fails unexpectedly
+    held = None
+    try:
+        with stage('validate'):
+            is_valid, error_msg = orders.validate_order_input(data)
+        if not is_valid:
+            logger.warning(f"❌ Invalid input: {error_msg}")
+            return {'success': False, 'error': error_msg}, 400
+
+        region = data.get('region', 'Cairo')
+        logger.info(f"🌍 Order region: {region}")
+
+        reservation_id = data.get('reservation_id')
+        quote = None
+        if orders.PARALLEL_PRICING:
+            lines = [{'product_id': p['product_id'], 'quantity': p['quantity']} for p in data['products']]
+            quote = asyncio.ensure_future(calculate_pricing(lines, region=region))
+        with stage('inventory_check'):
+            if reservation_id:
+                inventory_success, inventory_result, shortfalls = await commit_reservation(reservation_id, data['products'])
+            elif orders.INVENTORY_PRECHECK:
+                inventory_success, inventory_result, shortfalls = await check_inventory(data['products'])
+            else:
+                inventory_success, inventory_result, shortfalls = await run_blocking(
+                    orders.load_inventory_items, data['products']
+                )
+        if not inventory_success:
+            if quote is not None:
+                quote.cancel()
+            logger.warning(f"❌ Inventory check failed: {inventory_result}")
+            return {
+                'success': False,
+                'error': inventory_result,
+                'shortfalls': shortfalls,
+                'stage': 'inventory_check'
+            }, orders.failure_status(inventory_result)
+
+        held = reservation_id
+
+        with stage('pricing'):
+            if quote is not None:
+                pricing_success, pricing_result = await quote
+            else:
+                pricing_success, pricing_result = await calculate_pricing(inventory_result, region=region)
+
+        if pricing_success and quote is not None:
+            mismatch = orders.price_version_mismatch(inventory_result, pricing_result)
+            if mismatch:
+                if reservation_id:
+                    await release_reservation(reservation_id)
+                # Nothing final happened: a retry with the same key may succeed
+                orders.allow_retry()
+                return {
+                    'success': False,
+                    'error': mismatch,
+                    'stage': 'pricing_calculation'
+                }, 409
+
+        if not pricing_success:
+            logger.warning(f"❌ Pricing failed: {pricing_result}")
+            if reservation_id:
+                await release_reservation(reservation_id)
+            return {
+                'success': False,
+                'error': pricing_result,
+                'stage': 'pricing_calculation'
+            }, orders.failure_status(pricing_result)
+
+        if deadlines.deadline_expired():
+            logger.warning("⏱️ Request deadline passed before save")
+            if reservation_id:
+                await release_reservation(reservation_id)
+            return {
+                'success': False,
+                'error': 'Request deadline exceeded',
+                'stage': 'database_save'
+            }, 504
+
+        respond = orders.order_response(data, region, inventory_result, pricing_result)
+        with stage('database_save'):
+            save_success, order_id_or_error, shortfalls = await run_blocking(
+                orders.save_order_to_database,
+                data['customer_id'],
+                pricing_result,
+                inventory_result,
+                reservation_id,
+                respond
+            )
+
+        held = None
+        if not save_success and reservation_id:
+            await release_reservation(reservation_id)
+
+        if shortfalls:
+            logger.warning(f"❌ Stock ran out before save: {shortfalls}")
+            return {
+                'success': False,
+                'error': 'Insufficient stock',
+                'shortfalls': shortfalls,
+                'stage': 'inventory_check'
+            }, 409
+
+        if not save_success:
+            logger.error(f"❌ Failed to save: {order_id_or_error}")
+            return {
+                'success': False,
+                'error': f"Failed to save order: {order_id_or_error}",
+                'stage': 'database_save'
+            }, 500
+
+        orders.outbox_relay.wake()
+        orders.read_router.note_write(data['customer_id'], marked=True)
+        return respond(order_id_or_error), 201
+
+    except Exception as e:
+        logger.exception(f"❌ Unexpected error: {str(e)}")
+        if held:
+            await release_reservation(held)
+        return {
+            'success': False,
+            'error': 'Internal server error',
+            'details': str(e)
+        }, 500
+
+
+def json_response(body, status):
+    return web.json_response(body, status=status, dumps=lambda value: json.dumps(value, default=str))
+
+
+async def create_order(request):
+    """POST /api/orders/create, with the same Idempotency-Key handling as
+    the Flask endpoint"""
+    logger.info("🛒 NEW ORDER REQUEST RECEIVED (async)")
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    logger.debug("📥 Received data: %s", data)
+
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key and len(idempotency_key) > orders.MAX_IDEMPOTENCY_KEY_LENGTH:
+        return json_response({
+            'success': False,
+            'error': f"Idempotency-Key must be at most {orders.MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+        }, 400)
+
+    with deadlines.deadline_scope(orders.ORDER_DEADLINE):
+        if not idempotency_key:
+            body, status = await process_order(data)
+            return json_response(body, status)
+
+        body, status, replayed = await orders.idempotency_store.run_async(
+            idempotency_key, data, process_order, run_blocking
+        )
+
+    response = json_response(body, status)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+# ============================================================
+# Health & Stats
+# ============================================================
+
+async def health_check(request):
+    return json_response({
+        'status': 'healthy',
+        'service': 'Order Service (async)',
+        'port': ASYNC_ORDER_PORT
+    }, 200)
+
+
+async def http_stats(request):
+    return json_response({
+        'clients': async_client_stats(),
+        'breakers': breaker_stats(),
+        'db_threads': ASYNC_DB_THREADS
+    }, 200)
+
+
+async def metrics_endpoint(request):
+    return web.Response(body=render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+# ============================================================
+# Request Context
+# ============================================================
+
+@web.middleware
+async def request_context(request, handler):
+    """Deadline, server span and timing for every request; the aiohttp
+    version of install_deadline, install_tracing and install_metrics.
+    Requests on one keep-alive connection share a task, so both the
+    deadline and the span are scoped to the handler call."""
+    scope = contextlib.nullcontext()
+    value = request.headers.get(deadlines.DEADLINE_HEADER)
+    if value is not None:
+        try:
+            left_ms = float(value)
+        except ValueError:
+            left_ms = None
+        if left_ms is not None:
+            if left_ms <= 0:
+                return json_response({'error': 'Request deadline exceeded'}, 504)
+            scope = deadlines.deadline_scope(left_ms / 1000.0)
+
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else 'unmatched'
+
+    incoming = request.headers.get(tracing.TRACEPARENT_HEADER)
+    context = tracing.parse_traceparent(incoming) if incoming and tracing.TRACING_ENABLED else None
+    attributes = {'http.method': request.method, 'http.target': request.path_qs}
+    if context is None:
+        span = tracing.start_span(f"{request.method} {route}", 'server', attributes)
+    else:
+        trace_id, parent_id, sampled = context
+        span = tracing.Span(f"{request.method} {route}", 'server', trace_id, parent_id, sampled, attributes)
+
+    if METRICS_ENABLED:
+        REQUESTS_IN_FLIGHT.inc(route)
+    started = time.perf_counter()
+    status = 500
+    try:
+        with scope, span:
+            try:
+                response = await handler(request)
+            except web.HTTPException as e:
+                status = e.status
+                raise
+            status = response.status
+            span.attributes['http.status_code'] = status
+            if status >= 500:
+                span.set_error(f"HTTP {status}")
+            if span.traceparent:
+                response.headers['X-Trace-Id'] = span.trace_id
+            return response
+    finally:
+        if METRICS_ENABLED:
+            REQUESTS_IN_FLIGHT.dec(route)
+            REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route, str(status))
+
+# ============================================================
+# Application
+# ============================================================
+
+async def start_background(app):
+    orders.outbox_relay.start()
+
+
+async def stop_background(app):
+    await close_async_clients()
+    orders.outbox_relay.stop(timeout=10)
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=True)
+
+
+async def make_app():
+    """Application factory; async, as aiohttp's gunicorn worker requires"""
+    app = web.Application(middlewares=[request_context])
+    app.router.add_post('/api/orders/create', create_order)
+    app.router.add_get('/health', health_check)
+    app.router.add_get('/stats/http', http_stats)
+    if METRICS_ENABLED:
+        app.router.add_get('/metrics', metrics_endpoint)
+    app.on_startup.append(start_background)
+    app.on_cleanup.append(stop_background)
+    return app
+
+
+if __name__ == '__main__':
+    logger.info("🚀 Starting async Order Service on port %s", ASYNC_ORDER_PORT)
+    web.run_app(make_app(), host='0.0.0.0', port=ASYNC_ORDER_PORT)
@@ -0,0 +1,134 @@
+"""Micro-benchmark: order write time against number of order lines.
+
+Compares the bulk write path (order_store.write_order) with the old
+one-statement-per-line path. Each run happens inside a transaction on
+throw-away products and is rolled back, so the database is left as it
+was (apart from AUTO_INCREMENT counters).
+
+Usage: python bench_save.py [--lines 1,10,50,100,500] [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from app import get_db_connection, post_order_events
+from order_store import ORDER_INSERT_SQL, ORDER_ITEMS_INSERT_SQL, write_order
+from outbox import OUTBOX_INSERT_SQL, outbox_rows
+
+
+class CountingCursor:
+    """Cursor proxy that counts statements sent to the server."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.statements = 0
+
+    def execute(self, *args, **kwargs):
+        self.statements += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self.statements += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def write_order_per_row(cursor, customer_id, pricing_data, inventory_items, events_for):
+    """The write path as it was before bulk writes, for comparison."""
+    cursor.execute(ORDER_INSERT_SQL, (
+        customer_id, pricing_data['total_amount'], pricing_data['subtotal'],
+        pricing_data['discount'], pricing_data['tax'], 'confirmed', None
+    ))
+    order_id = cursor.lastrowid
+    for item in pricing_data['items']:
+        cursor.execute(ORDER_ITEMS_INSERT_SQL, (
+            order_id, item['product_id'], item['quantity'], item['unit_price'],
+            item['discounted_price'], item['discount_percentage'], item['line_total']
+        ))
+    for item in inventory_items:
+        cursor.execute("""
+            UPDATE inventory
+            SET quantity_available = quantity_available - %s,
+                last_updated = CURRENT_TIMESTAMP
+            WHERE product_id = %s
+        """, (item['quantity'], item['product_id']))
+    cursor.executemany(OUTBOX_INSERT_SQL, outbox_rows(order_id, events_for(order_id)))
+    return order_id
+
+
+def build_order(cursor, lines):
+    """Create ``lines`` throw-away products and an order that uses them."""
+    tag = f"bench-{uuid.uuid4().hex[:8]}"
+    cursor.executemany("""
+        INSERT INTO inventory (product_name, quantity_available, unit_price)
+        VALUES (%s, %s, %s)
+    """, [(f"{tag}-{i}", 1000, 10.0) for i in range(lines)])
+    cursor.execute("SELECT product_id FROM inventory WHERE product_name LIKE %s", (f"{tag}-%",))
+    product_ids = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute("SELECT MIN(customer_id) FROM customers")
+    customer_id = cursor.fetchone()[0]
+
+    inventory_items = [
+        {'product_id': pid, 'product_name': tag, 'quantity': 2, 'unit_price': 10.0}
+        for pid in product_ids
+    ]
+    items = [
+        {'product_id': pid, 'quantity': 2, 'unit_price': 10.0, 'discounted_price': 10.0,
+         'discount_percentage': 0.0, 'line_total': 20.0}
+        for pid in product_ids
+    ]
+    subtotal = 20.0 * lines
+    pricing_data = {
+        'subtotal': subtotal, 'discount': 0.0, 'tax': round(subtotal * 0.14, 2),
+        'total_amount': round(subtotal * 1.14, 2), 'items': items
+    }
+    return customer_id, pricing_data, inventory_items
+
+
+def time_write(write, lines):
+    conn = get_db_connection()
+    try:
+        raw_cursor = conn.cursor()
+        conn.start_transaction()
+        customer_id, pricing_data, inventory_items = build_order(raw_cursor, lines)
+
+        cursor = CountingCursor(raw_cursor)
+        total = pricing_data['total_amount']
+        started = time.perf_counter()
+        write(
+            cursor, customer_id, pricing_data, inventory_items,
+            lambda order_id: post_order_events(customer_id, order_id, total)
+        )
+        elapsed = time.perf_counter() - started
+        return elapsed, cursor.statements
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', default='1,10,50,100,500')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sizes = [int(n) for n in args.lines.split(',')]
+    print(f"{'lines':>6} | {'bulk ms':>9} {'stmts':>6} | {'per-row ms':>10} {'stmts':>6} | {'speedup':>7}")
+    print("-" * 60)
+    for lines in sizes:
+        bulk = [time_write(write_order, lines) for _ in range(args.repeat)]
+        per_row = [time_write(write_order_per_row, lines) for _ in range(args.repeat)]
+        bulk_ms = statistics.median(t for t, _ in bulk) * 1000
+        per_row_ms = statistics.median(t for t, _ in per_row) * 1000
+        print(
+            f"{lines:>6} | {bulk_ms:>9.2f} {bulk[0][1]:>6} | "
+            f"{per_row_ms:>10.2f} {per_row[0][1]:>6} | {per_row_ms / bulk_ms:>6.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
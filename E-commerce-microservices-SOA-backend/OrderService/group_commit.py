@@ -0,0 +1,216 @@
+"""Group commit: coalesce concurrent order writes into one transaction.
+
+Request threads hand a job (a function of a cursor) to the writer and
+wait on a Future. The writer thread collects jobs for up to ``window``
+seconds or ``max_batch`` jobs, runs each one under its own SAVEPOINT, and
+commits once for the whole batch. A job that raises, including a statement
+the server rejected (a foreign-key violation, a value out of range), is
+rolled back to its savepoint and only its caller sees the error; the
+others still commit. If the transaction itself fails (commit error,
+deadlock, lock wait timeout, lost connection), every job in the batch
+gets the error.
+
+A caller that stops waiting cancels its job only while it is still
+queued; once the writer has taken it, the caller waits for the real
+outcome, so nobody reports a failure for an order that commits later.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from mysql.connector import Error, InterfaceError, OperationalError, errorcode
+
+logger = logging.getLogger(__name__)
+
+
+# Errors after which the transaction (or the connection) is gone, so
+# rolling back to a savepoint means nothing. A lock wait timeout only
+# undoes the statement, but it is treated the same way: the batch is
+# stuck behind another transaction and is failed as a whole.
+TRANSACTION_ERRORS = (
+    errorcode.ER_LOCK_DEADLOCK,
+    errorcode.ER_LOCK_WAIT_TIMEOUT,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_SERVER_GONE_ERROR,
+)
+
+
+def aborts_transaction(error):
+    """True when a database error ended (or may have ended) the whole
+    transaction rather than one statement"""
+    if isinstance(error, (InterfaceError, OperationalError)):
+        return True
+    return error.errno in TRANSACTION_ERRORS
+
+
+class GroupCommitTimeout(Exception):
+    """The job was still queued when the caller gave up; it was cancelled
+    and will never run."""
+
+
+def run_jobs(cursor, jobs):
+    """Run each ``job(cursor)`` under its own SAVEPOINT in the current
+    transaction and return [(result, error)] in order.
+
+    A job that raises is rolled back to its savepoint. Database errors
+    that end the transaction are re-raised instead (see
+    ``aborts_transaction``).
+    """
+    outcomes = []
+    for index, job in enumerate(jobs):
+        savepoint = f"job_{index}"
+        cursor.execute(f"SAVEPOINT {savepoint}")
+        try:
+            outcomes.append((job(cursor), None))
+        except Error as e:
+            if aborts_transaction(e):
+                raise
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            outcomes.append((None, e))
+        except Exception as e:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            outcomes.append((None, e))
+    return outcomes
+
+
+class GroupCommitWriter:
+    """Single writer thread that batches jobs into shared transactions."""
+
+    def __init__(self, get_connection, window=0.005, max_batch=32):
+        self.get_connection = get_connection
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.jobs = 0
+        self.failed_jobs = 0
+        self.failed_batches = 0
+        self.cancelled_jobs = 0
+        self.max_fill = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def start(self):
+        # Started on first use so a pre-forking server gets one writer per
+        # worker process
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+            self._thread.start()
+
+    def submit(self, job):
+        """Queue ``job(cursor)``; the Future resolves after the commit."""
+        self.start()
+        future = Future()
+        self._queue.put((time.monotonic(), job, future))
+        return future
+
+    def write(self, job, timeout=None):
+        """Submit ``job`` and return its result once committed.
+
+        If it is still queued after ``timeout`` seconds it is cancelled and
+        ``GroupCommitTimeout`` is raised. A job the writer has already
+        started is waited for to the end.
+        """
+        future = self.submit(job)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            if future.cancel():
+                with self._stats_lock:
+                    self.cancelled_jobs += 1
+                raise GroupCommitTimeout(f"Order still queued after {timeout}s, not saved")
+            logger.warning(f"⚠️ Group commit slower than {timeout}s, waiting for its outcome")
+            return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        closes_at = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = closes_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Skip jobs whose callers gave up; the others can no longer be
+            # cancelled from here on
+            batch = [
+                entry for entry in self._collect()
+                if entry[2].set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"❌ Group commit failed for {len(batch)} orders: {e}")
+                with self._stats_lock:
+                    self.failed_batches += 1
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _write_batch(self, batch):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            conn.start_transaction()
+            outcomes = run_jobs(cursor, [job for _, job, _ in batch])
+            conn.commit()
+            cursor.close()
+        except Exception:
+            try:
+                conn.rollback()
+            except Error:
+                pass
+            raise
+        finally:
+            conn.close()
+
+        finished = time.monotonic()
+        waits = [finished - enqueued_at for enqueued_at, _, _ in batch]
+        with self._stats_lock:
+            self.batches += 1
+            self.jobs += len(batch)
+            self.failed_jobs += sum(1 for _, error in outcomes if error is not None)
+            self.max_fill = max(self.max_fill, len(batch))
+            self.total_wait += sum(waits)
+            self.max_wait = max(self.max_wait, max(waits))
+
+        for (_, _, future), (result, error) in zip(batch, outcomes):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'queue_depth': self._queue.qsize(),
+                'batches': self.batches,
+                'jobs': self.jobs,
+                'failed_jobs': self.failed_jobs,
+                'failed_batches': self.failed_batches,
+                'cancelled_jobs': self.cancelled_jobs,
+                'avg_fill': round(self.jobs / self.batches, 2) if self.batches else 0.0,
+                'avg_fill_ratio': round(self.jobs / (self.batches * self.max_batch), 3) if self.batches else 0.0,
+                'max_fill': self.max_fill,
+                'avg_wait_ms': round(self.total_wait / self.jobs * 1000, 2) if self.jobs else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 2)
+            }
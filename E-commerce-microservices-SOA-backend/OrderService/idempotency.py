@@ -0,0 +1,343 @@
+"""Idempotency-Key support for order creation.
+
+The first request with a key claims it by inserting an ``order_requests``
+row; its final response is stored in that row and in an in-process LRU.
+Repeats get the stored response without re-running the pipeline.
+
+Concurrent duplicates are collapsed twice: within a process, followers
+wait on the leader's event; across processes, the primary key on
+``order_requests`` lets only one claim succeed and the others poll the
+row until it completes. Server errors (5xx) are not stored, so the claim
+is dropped and the client may retry; so are answers the handler marks
+with ``allow_retry()`` (e.g. prices changed during checkout).
+
+A successful order completes its claim inside the order's own
+transaction (``current_claim().complete(cursor, ...)``), so no crash
+between two commits can leave the claim ``in_progress`` for a retry to
+take over and place the order a second time.
+
+``run_async`` is the same protocol for the asyncio order path: the
+handler is a coroutine and the database calls go through the caller's
+executor, so waiting for a key never holds a thread.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from mysql.connector import Error, errorcode
+
+from common.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+COMPLETE_SQL = """
+    UPDATE order_requests
+    SET status = 'completed', response_code = %s, response_body = %s,
+        order_id = %s
+    WHERE idempotency_key = %s
+"""
+
+_current_claim = contextvars.ContextVar('idempotency_claim', default=None)
+
+
+class Claim:
+    """The idempotency key the running handler holds."""
+
+    def __init__(self, key):
+        self.key = key
+        self.completed = False
+        self.retryable = False
+
+    def complete(self, cursor, body, status):
+        """Store the response inside the caller's transaction"""
+        cursor.execute(COMPLETE_SQL, (status, json.dumps(body, default=str), body.get('order_id'), self.key))
+        self.completed = True
+
+
+def current_claim():
+    """Claim of the request being handled, or None without a key"""
+    return _current_claim.get()
+
+
+def allow_retry():
+    """Don't keep the answer being built: the same request may succeed
+    when it is sent again"""
+    claim = _current_claim.get()
+    if claim is not None:
+        claim.retryable = True
+
+
+def request_fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Runs a request handler at most once per idempotency key."""
+
+    def __init__(self, get_connection, cache_size=10000, wait_timeout=30.0,
+                 poll_interval=0.1, stale_after=300):
+        self.get_connection = get_connection
+        self.cache = LRUCache(cache_size)
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Only touched from the event loop
+        self._async_inflight = {}
+
+    def run(self, key, data, handler):
+        """Return (body, status, replayed) for the request."""
+        fingerprint = request_fingerprint(data)
+
+        stored = self._replay(key, fingerprint)
+        if stored:
+            return stored
+
+        # In-process single flight: only the leader goes to the database
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[key] = event
+
+        if not leader:
+            finished = event.wait(self.wait_timeout)
+            stored = self._replay(key, fingerprint)
+            if stored:
+                return stored
+            if finished:
+                # The leader failed and dropped its claim; try again
+                return self.run(key, data, handler)
+            return self._in_progress()
+
+        try:
+            return self._run_as_leader(key, fingerprint, data, handler)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _replay(self, key, fingerprint):
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        stored_fingerprint, body, status = cached
+        if stored_fingerprint != fingerprint:
+            return self._mismatch()
+        return body, status, True
+
+    def _run_as_leader(self, key, fingerprint, data, handler):
+        try:
+            claimed = self._claim(key, fingerprint)
+        except Error as e:
+            logger.error(f"❌ Idempotency claim failed: {e}")
+            return {'success': False, 'error': f"Database error: {str(e)}"}, 500, False
+
+        if not claimed:
+            return self._wait_for_other_process(key, fingerprint)
+
+        claim = Claim(key)
+        token = _current_claim.set(claim)
+        try:
+            body, status = handler(data)
+        finally:
+            _current_claim.reset(token)
+        self._store(key, fingerprint, body, status, claim)
+        return body, status, False
+
+    def _store(self, key, fingerprint, body, status, claim=None):
+        try:
+            if status < 500 and not (claim is not None and claim.retryable):
+                if claim is None or not claim.completed:
+                    self._complete(key, body, status)
+                self.cache.set(key, (fingerprint, body, status))
+            else:
+                self._release(key)
+        except Error as e:
+            logger.error(f"❌ Failed to store idempotent response for key {key}: {e}")
+
+    # --------------------------------------------------------
+    # asyncio
+    # --------------------------------------------------------
+
+    async def run_async(self, key, data, handler, run_blocking):
+        """Coroutine version of ``run``: ``handler(data)`` is awaited and
+        blocking calls go through ``await run_blocking(fn, *args)``."""
+        fingerprint = request_fingerprint(data)
+
+        stored = self._replay(key, fingerprint)
+        if stored:
+            return stored
+
+        event = self._async_inflight.get(key)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), self.wait_timeout)
+                finished = True
+            except asyncio.TimeoutError:
+                finished = False
+            stored = self._replay(key, fingerprint)
+            if stored:
+                return stored
+            if finished:
+                return await self.run_async(key, data, handler, run_blocking)
+            return self._in_progress()
+
+        event = asyncio.Event()
+        self._async_inflight[key] = event
+        try:
+            try:
+                claimed = await run_blocking(self._claim, key, fingerprint)
+            except Error as e:
+                logger.error(f"❌ Idempotency claim failed: {e}")
+                return {'success': False, 'error': f"Database error: {str(e)}"}, 500, False
+
+            if not claimed:
+                return await self._wait_for_other_process_async(key, fingerprint, run_blocking)
+
+            claim = Claim(key)
+            token = _current_claim.set(claim)
+            try:
+                body, status = await handler(data)
+            finally:
+                _current_claim.reset(token)
+            await run_blocking(self._store, key, fingerprint, body, status, claim)
+            return body, status, False
+        finally:
+            self._async_inflight.pop(key, None)
+            event.set()
+
+    # --------------------------------------------------------
+    # order_requests table
+    # --------------------------------------------------------
+
+    def _claim(self, key, fingerprint):
+        """Insert the claim row; take over claims abandoned by a dead process."""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    INSERT INTO order_requests (idempotency_key, request_hash, status)
+                    VALUES (%s, %s, 'in_progress')
+                """, (key, fingerprint))
+                conn.commit()
+                return True
+            except Error as e:
+                if e.errno != errorcode.ER_DUP_ENTRY:
+                    raise
+                conn.rollback()
+
+            cursor.execute("""
+                UPDATE order_requests
+                SET updated_at = NOW(), request_hash = %s
+                WHERE idempotency_key = %s
+                  AND status = 'in_progress'
+                  AND updated_at < NOW() - INTERVAL %s SECOND
+            """, (fingerprint, key, self.stale_after))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def _complete(self, key, body, status):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(COMPLETE_SQL, (status, json.dumps(body, default=str), body.get('order_id'), key))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _release(self, key):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM order_requests
+                WHERE idempotency_key = %s AND status = 'in_progress'
+            """, (key,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _load(self, key):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT request_hash, status, response_code, response_body
+                FROM order_requests
+                WHERE idempotency_key = %s
+            """, (key,))
+            row = cursor.fetchone()
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    def _wait_for_other_process(self, key, fingerprint):
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            try:
+                outcome = self._settled(key, fingerprint, self._load(key))
+            except Error as e:
+                logger.error(f"❌ Idempotency lookup failed: {e}")
+                return {'success': False, 'error': f"Database error: {str(e)}"}, 500, False
+            if outcome is not None:
+                return outcome
+            if time.monotonic() >= deadline:
+                return self._in_progress()
+            time.sleep(self.poll_interval)
+
+    async def _wait_for_other_process_async(self, key, fingerprint, run_blocking):
+        # Sleeps on the event loop; only each lookup takes an executor thread
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            try:
+                outcome = self._settled(key, fingerprint, await run_blocking(self._load, key))
+            except Error as e:
+                logger.error(f"❌ Idempotency lookup failed: {e}")
+                return {'success': False, 'error': f"Database error: {str(e)}"}, 500, False
+            if outcome is not None:
+                return outcome
+            if time.monotonic() >= deadline:
+                return self._in_progress()
+            await asyncio.sleep(self.poll_interval)
+
+    def _settled(self, key, fingerprint, row):
+        """Response for a claim row held by another process, or None while
+        it is still in progress"""
+        if row is None:
+            # The other attempt failed and dropped its claim
+            return {
+                'success': False,
+                'error': 'A previous request with this Idempotency-Key failed, please retry'
+            }, 409, False
+        if row['request_hash'] != fingerprint:
+            return self._mismatch()
+        if row['status'] == 'completed':
+            body = json.loads(row['response_body'])
+            self.cache.set(key, (fingerprint, body, row['response_code']))
+            return body, row['response_code'], True
+        return None
+
+    @staticmethod
+    def _mismatch():
+        return {
+            'success': False,
+            'error': 'Idempotency-Key was already used with a different request body'
+        }, 422, False
+
+    @staticmethod
+    def _in_progress():
+        return {
+            'success': False,
+            'error': 'A request with this Idempotency-Key is still in progress'
+        }, 409, False
@@ -0,0 +1,162 @@
+"""SQL for searching orders with keyset pagination.
+
+Each filter combination is pinned to the index that serves it:
+
+* customer_id         -> idx_customer_id, newest order_id first
+* status              -> idx_status, newest order_id first
+* created_at range    -> idx_created_at, newest created_at first
+* nothing             -> PRIMARY, newest order_id first
+
+InnoDB secondary indexes carry the primary key, so idx_customer_id and
+idx_status are effectively (customer_id, order_id) and (status, order_id)
+and idx_created_at is (created_at, order_id). The cursor condition is
+therefore a range on the same index the rows are read from, and a page
+never sorts or skips more than ``limit`` rows of that index. The other
+filters (min_total, and created_at when another index is chosen) are
+checked on the rows as they are read.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+ORDER_FIELDS = (
+    'order_id', 'customer_id', 'total_amount', 'subtotal',
+    'discount', 'tax', 'status', 'created_at'
+)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_timestamp(value, name):
+    """Accept 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' (or ISO 'T')"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date or 'YYYY-MM-DD HH:MM:SS'")
+
+
+def parse_search_filters(args):
+    """Validate the query-string filters; raises ValueError"""
+    filters = {}
+
+    if args.get('status'):
+        filters['status'] = args['status']
+
+    if args.get('customer_id'):
+        try:
+            filters['customer_id'] = int(args['customer_id'])
+        except ValueError:
+            raise ValueError('customer_id must be an integer')
+
+    if args.get('created_from'):
+        filters['created_from'] = parse_timestamp(args['created_from'], 'created_from')
+    if args.get('created_to'):
+        filters['created_to'] = parse_timestamp(args['created_to'], 'created_to')
+
+    if args.get('min_total'):
+        try:
+            filters['min_total'] = Decimal(args['min_total'])
+        except ArithmeticError:
+            raise ValueError('min_total must be a number')
+
+    return filters
+
+
+def search_plan(filters):
+    """Return (index, sort) for a set of filters"""
+    if 'customer_id' in filters:
+        return 'idx_customer_id', 'id'
+    if 'status' in filters:
+        return 'idx_status', 'id'
+    if 'created_from' in filters or 'created_to' in filters:
+        return 'idx_created_at', 'created'
+    return 'PRIMARY', 'id'
+
+
+def sort_fields(sort):
+    return ('created_at', 'order_id') if sort == 'created' else ('order_id',)
+
+
+def cursor_for(sort):
+    """Build the function that turns a page's last row into its cursor"""
+    def make(row):
+        values = {'sort': sort, 'order_id': row['order_id']}
+        if sort == 'created':
+            values['created_at'] = row['created_at']
+        return values
+    return make
+
+
+def build_search_query(filters, fields, after, limit):
+    """Return (sql, params, sort) for one page of ``limit + 1`` rows.
+
+    ``after`` is a decoded cursor or None. A cursor is only valid for the
+    filters it was issued for; changing the filters mid-way raises
+    ValueError instead of silently skipping rows.
+    """
+    index, sort = search_plan(filters)
+
+    conditions = []
+    params = []
+
+    if 'customer_id' in filters:
+        conditions.append("customer_id = %s")
+        params.append(filters['customer_id'])
+    if 'status' in filters:
+        conditions.append("status = %s")
+        params.append(filters['status'])
+    if 'created_from' in filters:
+        conditions.append("created_at >= %s")
+        params.append(filters['created_from'])
+    if 'created_to' in filters:
+        conditions.append("created_at < %s")
+        params.append(filters['created_to'])
+    if 'min_total' in filters:
+        conditions.append("total_amount >= %s")
+        params.append(filters['min_total'])
+
+    if after is not None:
+        if after.get('sort') != sort:
+            raise ValueError('Cursor does not match these filters')
+        try:
+            last_id = int(after['order_id'])
+            if sort == 'created':
+                last_created = datetime.strptime(after['created_at'], TIMESTAMP_FORMAT)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Invalid cursor')
+        if sort == 'created':
+            conditions.append("(created_at, order_id) < (%s, %s)")
+            params.extend([last_created, last_id])
+        else:
+            conditions.append("order_id < %s")
+            params.append(last_id)
+
+    if sort == 'created':
+        order_by = "created_at DESC, order_id DESC"
+    else:
+        order_by = "order_id DESC"
+
+    columns = list(fields or ORDER_FIELDS)
+    for field in sort_fields(sort):
+        if field not in columns:
+            columns.append(field)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"""
+        SELECT {', '.join(columns)}
+        FROM orders FORCE INDEX ({index})
+        {where}
+        ORDER BY {order_by}
+        LIMIT %s
+    """
+    params.append(limit + 1)
+    return sql, params, sort
+
+
+def row_to_order(row):
+    """Make a fetched row JSON-friendly"""
+    for key, value in row.items():
+        if isinstance(value, Decimal):
+            row[key] = float(value)
+        elif isinstance(value, datetime):
+            row[key] = value.strftime(TIMESTAMP_FORMAT)
+    return row
@@ -0,0 +1,253 @@
+"""SQL for writing orders.
+
+Every function here takes a cursor and runs inside the caller's
+transaction, so the same statements serve single orders, group commits
+and bulk imports. Writing one order costs the same number of round trips
+whatever the number of lines: one INSERT for the order, one multi-row
+INSERT for its items, one UPDATE for all stock rows, one multi-row
+INSERT for its outbox events, one upsert of the customer's read-your-writes
+marker (with replicas, unless the customer was marked moments ago) and
+one SELECT reading back what the database assigned (item ids and
+created_at).
+"""
+import logging
+
+from common.db import mark_sticky
+from outbox import OUTBOX_INSERT_SQL, outbox_rows
+
+logger = logging.getLogger(__name__)
+
+ORDER_INSERT_SQL = """
+    INSERT INTO orders
+    (customer_id, total_amount, subtotal, discount, tax, status, reservation_id)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+# mysql-connector rewrites executemany() of a plain INSERT ... VALUES into
+# one multi-row INSERT, so this is a single round trip per order
+ORDER_ITEMS_INSERT_SQL = """
+    INSERT INTO order_items
+    (order_id, product_id, quantity, unit_price, discounted_price,
+     discount_percentage, line_total)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+class InsufficientStock(Exception):
+    """Raised when the guarded stock UPDATE could not take every product.
+
+    The caller must roll back (the whole transaction or to its savepoint)
+    before calling ``find_shortfalls`` with ``requested``.
+    """
+
+    def __init__(self, requested):
+        super().__init__("Insufficient stock")
+        self.requested = requested
+
+
+class ReservationNotCommitted(Exception):
+    """Raised when the reservation an order was paid from has been
+    cancelled (or was never committed); the caller must roll back."""
+
+    def __init__(self, reservation_id, status):
+        super().__init__(f"Reservation {reservation_id} is {status or 'missing'}")
+        self.reservation_id = reservation_id
+        self.status = status
+
+
+def lock_committed_reservation(cursor, reservation_id):
+    """Lock the reservation the stock came from and check it still holds.
+
+    The Inventory Service locks the same row before it cancels a committed
+    reservation and then looks for the order that used it, so either the
+    order commits first and the cancel is refused, or the cancel commits
+    first and the order is not written.
+    """
+    cursor.execute("""
+        SELECT status FROM reservations
+        WHERE reservation_id = %s
+        FOR UPDATE
+    """, (reservation_id,))
+    row = cursor.fetchone()
+    status = row[0] if row else None
+    if status != 'committed':
+        raise ReservationNotCommitted(reservation_id, status)
+
+
+def requested_quantities(inventory_items):
+    """Sum quantities per product; the same product may be on several lines."""
+    requested = {}
+    for item in inventory_items:
+        requested[item['product_id']] = requested.get(item['product_id'], 0) + item['quantity']
+    return requested
+
+
+def validate_pricing_data(pricing_data):
+    """Return an error message if the pricing response cannot be saved."""
+    if pricing_data.get('total_amount', 0.0) == 0:
+        return "Invalid pricing data: total amount is 0"
+    if not pricing_data.get('items'):
+        return "No items in pricing response"
+    return None
+
+
+def decrement_stock(cursor, requested):
+    """Take stock for all products with one guarded UPDATE.
+
+    Only rows with enough stock that is not held by a reservation are
+    changed. The IN list is sorted so concurrent orders lock rows in
+    primary-key order and cannot deadlock. Returns False if any product
+    was not taken; the caller must then roll back.
+    """
+    product_ids = sorted(requested)
+    case_sql = " ".join(["WHEN %s THEN %s"] * len(product_ids))
+    case_params = []
+    for product_id in product_ids:
+        case_params.extend([product_id, requested[product_id]])
+    placeholders = ", ".join(["%s"] * len(product_ids))
+
+    cursor.execute(f"""
+        UPDATE inventory
+        SET quantity_available = quantity_available - (CASE product_id {case_sql} END),
+            last_updated = CURRENT_TIMESTAMP
+        WHERE product_id IN ({placeholders})
+          AND quantity_available - quantity_reserved >= (CASE product_id {case_sql} END)
+    """, tuple(case_params) + tuple(product_ids) + tuple(case_params))
+
+    return cursor.rowcount == len(product_ids)
+
+
+def find_shortfalls(cursor, requested):
+    """Describe which products cannot be served; call after rolling back.
+
+    Never empty: stock may have been replenished between the failed UPDATE
+    and this read, and the order still failed. Every requested product is
+    then reported with reason ``stock_changed``.
+    """
+    product_ids = sorted(requested)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"""
+        SELECT product_id, quantity_available - quantity_reserved
+        FROM inventory
+        WHERE product_id IN ({placeholders})
+    """, tuple(product_ids))
+    available = dict(cursor.fetchall())
+
+    shortfalls = [
+        {
+            'product_id': product_id,
+            'requested': requested[product_id],
+            'available': available.get(product_id, 0),
+            'reason': 'insufficient_stock' if product_id in available else 'not_found'
+        }
+        for product_id in product_ids
+        if available.get(product_id, 0) < requested[product_id]
+    ]
+    if shortfalls:
+        return shortfalls
+    return [
+        {
+            'product_id': product_id,
+            'requested': requested[product_id],
+            'available': available.get(product_id, 0),
+            'reason': 'stock_changed'
+        }
+        for product_id in product_ids
+    ]
+
+
+def write_order(cursor, customer_id, pricing_data, inventory_items, events_for, reservation_id=None):
+    """Insert one order with its items, stock decrement and outbox rows.
+
+    ``events_for(order_id)`` returns the outbox events for the new order.
+    With ``reservation_id`` the stock was already taken by committing that
+    reservation, and the order records it. Raises ``InsufficientStock``
+    and ``ReservationNotCommitted``.
+
+    Returns the order document exactly as GET /api/orders/<id> would read
+    it back, so callers can cache it without another query.
+    """
+    items = pricing_data['items']
+
+    if reservation_id is not None:
+        lock_committed_reservation(cursor, reservation_id)
+
+    cursor.execute(ORDER_INSERT_SQL, (
+        customer_id,
+        pricing_data.get('total_amount', 0.0),
+        pricing_data.get('subtotal', 0.0),
+        pricing_data.get('discount', 0.0),
+        pricing_data.get('tax', 0.0),
+        'confirmed',
+        reservation_id
+    ))
+    order_id = cursor.lastrowid
+
+    if reservation_id is not None:
+        # Tells the Inventory sweeper this committed hold was used
+        cursor.execute("""
+            UPDATE reservations SET order_id = %s WHERE reservation_id = %s
+        """, (order_id, reservation_id))
+
+    cursor.executemany(ORDER_ITEMS_INSERT_SQL, [
+        (
+            order_id,
+            item.get('product_id'),
+            item.get('quantity'),
+            item.get('unit_price'),
+            item.get('discounted_price'),
+            item.get('discount_percentage', 0.0),
+            item.get('line_total')
+        )
+        for item in items
+    ])
+    logger.debug(f"Order {order_id}: {len(items)} items inserted")
+
+    if reservation_id is None:
+        requested = requested_quantities(inventory_items)
+        if not decrement_stock(cursor, requested):
+            raise InsufficientStock(requested)
+
+    cursor.executemany(OUTBOX_INSERT_SQL, outbox_rows(order_id, events_for(order_id)))
+    # The customer's next reads, from any service, go to the primary
+    mark_sticky(cursor, customer_id)
+
+    # Item ids are not consecutive with auto_increment_increment > 1, and
+    # created_at is the database clock: read both back. Ids grow in
+    # insertion order, so they line up with ``items``.
+    cursor.execute("""
+        SELECT o.created_at, oi.item_id
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.order_id
+        WHERE o.order_id = %s
+        ORDER BY oi.item_id
+    """, (order_id,))
+    rows = cursor.fetchall()
+    created_at = rows[0][0]
+    item_ids = [item_id for _, item_id in rows]
+
+    names = {item['product_id']: item.get('product_name') for item in inventory_items}
+    return {
+        'order_id': order_id,
+        'customer_id': customer_id,
+        'total_amount': float(pricing_data.get('total_amount', 0.0)),
+        'subtotal': float(pricing_data.get('subtotal', 0.0)),
+        'discount': float(pricing_data.get('discount', 0.0)),
+        'tax': float(pricing_data.get('tax', 0.0)),
+        'status': 'confirmed',
+        'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'items': [
+            {
+                'item_id': item_id,
+                'order_id': order_id,
+                'product_id': item.get('product_id'),
+                'quantity': item.get('quantity'),
+                'unit_price': float(item.get('unit_price')),
+                'discounted_price': float(item.get('discounted_price')),
+                'discount_percentage': float(item.get('discount_percentage', 0.0)),
+                'line_total': float(item.get('line_total')),
+                'product_name': names.get(item.get('product_id'))
+            }
+            for item_id, item in zip(item_ids, items)
+        ]
+    }
@@ -0,0 +1,268 @@
+"""Transactional outbox relay for order side effects.
+
+``save_order_to_database`` writes one ``order_outbox`` row per side effect
+in the same transaction as the order, so a committed order always has its
+loyalty and notification work recorded. The relay thread claims due rows
+in batches, delivers them concurrently, and marks the whole batch with two
+bulk UPDATEs. Failed rows are retried with exponential backoff until
+``max_attempts`` is reached. Delivery is at-least-once.
+"""
+import json
+import logging
+import threading
+import time
+
+from mysql.connector import Error
+
+from common.fanout import fan_out
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_INSERT_SQL = """
+    INSERT INTO order_outbox (order_id, event_type, payload)
+    VALUES (%s, %s, %s)
+"""
+
+
+def outbox_rows(order_id, events):
+    """Build executemany parameters for ``OUTBOX_INSERT_SQL``.
+
+    ``events`` is a list of (event_type, payload_dict) pairs.
+    """
+    return [
+        (order_id, event_type, json.dumps(payload))
+        for event_type, payload in events
+    ]
+
+
+class OutboxRelay:
+    """Background thread that drains ``order_outbox``."""
+
+    def __init__(self, get_connection, handlers, batch_size=50, poll_interval=1.0,
+                 parallelism=8, max_attempts=8, backoff_base=2, backoff_max=300,
+                 claim_lease=60):
+        self.get_connection = get_connection
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.parallelism = parallelism
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.claim_lease = claim_lease
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.delivered = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+
+    # --------------------------------------------------------
+    # Lifecycle
+    # --------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='outbox-relay', daemon=True)
+            self._thread.start()
+            logger.info("📮 Outbox relay started")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Tell the relay new rows were committed."""
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.relay_once()
+            except Exception as e:
+                logger.error(f"❌ Outbox relay error: {e}")
+                processed = 0
+            # A full batch means more rows are probably waiting
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    # --------------------------------------------------------
+    # One relay pass
+    # --------------------------------------------------------
+
+    def relay_once(self):
+        """Claim, deliver and mark one batch; return how many rows it had."""
+        rows = self._claim_batch()
+        if not rows:
+            return 0
+
+        started = time.perf_counter()
+        outcome = fan_out(
+            self._deliver,
+            rows,
+            parallelism=self.parallelism,
+            deadline=self.claim_lease,
+            stop_on_error=False
+        )
+
+        done_ids = []
+        retry_ids = []
+        for row, delivered, error in zip(rows, outcome.results, outcome.errors):
+            if delivered and error is None:
+                done_ids.append(row['outbox_id'])
+            else:
+                if error is not None:
+                    logger.warning(f"⚠️ Outbox {row['outbox_id']} ({row['event_type']}) failed: {error}")
+                retry_ids.append(row['outbox_id'])
+
+        self._mark(done_ids, retry_ids)
+        elapsed = time.perf_counter() - started
+
+        with self._stats_lock:
+            self.batches += 1
+            self.delivered += len(done_ids)
+            self.failed += len(retry_ids)
+            self.busy_seconds += elapsed
+            self.last_batch_size = len(rows)
+            self.last_batch_ms = elapsed * 1000
+
+        logger.info(f"📮 Outbox batch: {len(done_ids)} delivered, {len(retry_ids)} to retry ({elapsed * 1000:.0f} ms)")
+        return len(rows)
+
+    def _deliver(self, row):
+        handler = self.handlers.get(row['event_type'])
+        if handler is None:
+            raise ValueError(f"No handler for event type {row['event_type']}")
+        payload = row['payload']
+        if isinstance(payload, (str, bytes, bytearray)):
+            payload = json.loads(payload)
+        return bool(handler(**payload))
+
+    def _claim_batch(self):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            conn.start_transaction()
+            # Rows left in 'processing' past the lease belong to a relay
+            # that died mid-batch and are claimed again.
+            cursor.execute("""
+                SELECT outbox_id, order_id, event_type, payload, attempts
+                FROM order_outbox
+                WHERE (status = 'pending' AND next_attempt_at <= NOW())
+                   OR (status = 'processing' AND claimed_at < NOW() - INTERVAL %s SECOND)
+                ORDER BY outbox_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (self.claim_lease, self.batch_size))
+            rows = cursor.fetchall()
+
+            if rows:
+                ids = [row['outbox_id'] for row in rows]
+                placeholders = ", ".join(["%s"] * len(ids))
+                cursor.execute(f"""
+                    UPDATE order_outbox
+                    SET status = 'processing', claimed_at = NOW()
+                    WHERE outbox_id IN ({placeholders})
+                """, tuple(ids))
+
+            conn.commit()
+            cursor.close()
+            return rows
+        except Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _mark(self, done_ids, retry_ids):
+        if not done_ids and not retry_ids:
+            return
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            conn.start_transaction()
+
+            if done_ids:
+                placeholders = ", ".join(["%s"] * len(done_ids))
+                cursor.execute(f"""
+                    UPDATE order_outbox
+                    SET status = 'done', processed_at = NOW(), claimed_at = NULL
+                    WHERE outbox_id IN ({placeholders})
+                """, tuple(done_ids))
+
+            if retry_ids:
+                # MySQL applies SET assignments left to right, so the
+                # expressions after the first one see the new attempt count.
+                placeholders = ", ".join(["%s"] * len(retry_ids))
+                cursor.execute(f"""
+                    UPDATE order_outbox
+                    SET attempts = attempts + 1,
+                        status = IF(attempts >= %s, 'failed', 'pending'),
+                        next_attempt_at = NOW() + INTERVAL
+                            ROUND(LEAST(%s * POW(2, attempts - 1), %s)) SECOND,
+                        claimed_at = NULL
+                    WHERE outbox_id IN ({placeholders})
+                """, (self.max_attempts, self.backoff_base, self.backoff_max) + tuple(retry_ids))
+
+            conn.commit()
+            cursor.close()
+        except Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # --------------------------------------------------------
+    # Monitoring
+    # --------------------------------------------------------
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'batch_size': self.batch_size,
+                'batches': self.batches,
+                'delivered': self.delivered,
+                'failed_attempts': self.failed,
+                'last_batch_size': self.last_batch_size,
+                'last_batch_ms': round(self.last_batch_ms, 2),
+                'rows_per_second': round(self.delivered / self.busy_seconds, 2) if self.busy_seconds else 0.0
+            }
+
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT
+                    SUM(status IN ('pending', 'processing')) AS queue_depth,
+                    SUM(status = 'failed') AS dead,
+                    TIMESTAMPDIFF(SECOND,
+                        MIN(CASE WHEN status IN ('pending', 'processing') THEN created_at END),
+                        NOW()) AS oldest_pending_seconds
+                FROM order_outbox
+                WHERE status <> 'done'
+            """)
+            row = cursor.fetchone() or {}
+            cursor.close()
+            conn.close()
+            stats['queue_depth'] = int(row.get('queue_depth') or 0)
+            stats['dead'] = int(row.get('dead') or 0)
+            stats['lag_seconds'] = int(row.get('oldest_pending_seconds') or 0)
+        except Error as e:
+            stats['error'] = str(e)
+
+        return stats
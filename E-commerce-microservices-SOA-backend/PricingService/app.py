@@ -1,8 +1,24 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import mysql.connector
 from mysql.connector import Error
 from decimal import Decimal
 import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.cache import LRUCache
+from common.config import env_float, env_int
+from common.db import ReadRouter, install_read_routing
+from common.deadlines import install_deadline
+from common.etags import body_etag, conditional
+from common.logs import configure_logging, sampled_logger
+from common.metrics import install_metrics, instrument_connection
+from common.prices import item_prices, price_version
+from common.serve import run_service
+from common.tracing import install_tracing
+from price_table import PriceTable
 
 # ============================================================
 # Configuration
@@ -15,25 +31,54 @@ DB_CONFIG = {
     "database": "ecommerce_system"
 }
 
+MAX_BATCH_ORDERS = 10000
+DEFAULT_TAX_RATE = 0.14
+
+# Lines sent without a unit_price are priced from a cached copy of the
+# inventory price table, reloaded after this many seconds
+PRICE_TABLE_TTL = env_float('PRICE_TABLE_TTL', 5)
+# Longest an inventory write may stay uncommitted; each reload re-reads
+# rows updated this long before the previous one
+PRICE_TABLE_MAX_TRANSACTION = env_int('PRICE_TABLE_MAX_TRANSACTION', 60)
+
+# Tax rates change rarely: the regions response is kept this many seconds
+# and clients may reuse it as long before revalidating
+REGIONS_MAX_AGE = env_int('REGIONS_MAX_AGE', 60)
+REGIONS_CACHE_CONTROL = f"public, max-age={REGIONS_MAX_AGE}"
+
 app = Flask(__name__)
+install_metrics(app)
+install_tracing(app, 'pricing')
+install_deadline(app)
+install_read_routing(app)
 
 # Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+configure_logging('pricing')
 logger = logging.getLogger(__name__)
+# Per-line messages of a cart; only a sample is kept
+line_logger = sampled_logger('pricing.lines', env_float('PRICING_LINE_LOG_RATE', 0.01))
 
 
 def get_db_connection():
     """Create database connection"""
     try:
-        return mysql.connector.connect(**DB_CONFIG)
+        return instrument_connection(mysql.connector.connect(**DB_CONFIG))
     except Error as e:
         logger.error(f"Database connection error: {e}")
         raise
 
 
+# Read-only endpoints use a replica when DB_READ_REPLICAS is set. The
+# price table stays on the primary: quotes are compared with the prices
+# the Inventory Service reads from it.
+read_router = ReadRouter(get_db_connection, DB_CONFIG)
+price_table = PriceTable(
+    get_db_connection,
+    ttl=PRICE_TABLE_TTL,
+    max_transaction_seconds=PRICE_TABLE_MAX_TRANSACTION
+)
+
+
 def decimal_to_float(value):
     """Convert Decimal to float"""
     if isinstance(value, Decimal):
@@ -87,20 +132,54 @@ def get_tax_rate(region='Cairo'):
             return tax_rate
         
         logger.warning(f"⚠️ No tax rate found for region '{region}' in DB, using default 14%")
-        return 0.14
+        return DEFAULT_TAX_RATE
         
     except Error as e:
         logger.error(f"Error fetching tax rate: {e}")
         logger.warning("Using default tax rate 14%")
-        return 0.14
+        return DEFAULT_TAX_RATE
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def tax_rate_for(tax_rates, region):
+    """Rate of ``region`` in a ``get_tax_rates`` table, matched like
+    ``get_tax_rate`` does"""
+    key = region.lower() if isinstance(region, str) else region
+    return tax_rates.get(key, DEFAULT_TAX_RATE)
+
+
+def get_tax_rates():
+    """Get all tax rates as {region.lower(): rate}, one query.
+
+    Keys are lower-cased because ``get_tax_rate`` matches regions with
+    ``WHERE region = %s``, which MySQL compares case-insensitively; look
+    them up with ``tax_rate_for``.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT region, tax_rate FROM tax_rates")
+        rates = {row['region'].lower(): decimal_to_float(row['tax_rate']) / 100 for row in cursor.fetchall()}
+        cursor.close()
+        return rates
+    except Error as e:
+        logger.error(f"Error fetching tax rates: {e}")
+        return {}
     finally:
         if conn and conn.is_connected():
             conn.close()
 
 
-def apply_discount(product_id, quantity, unit_price):
-    """Apply discount based on quantity"""
-    pricing_rules = get_pricing_rules()
+def apply_discount(product_id, quantity, unit_price, pricing_rules=None):
+    """Apply discount based on quantity.
+
+    ``pricing_rules`` lets callers pricing many lines load the rules once.
+    """
+    if pricing_rules is None:
+        pricing_rules = get_pricing_rules()
     
     # Find applicable discounts
     applicable_discounts = []
@@ -131,22 +210,137 @@ def apply_discount(product_id, quantity, unit_price):
     discount_amount = unit_price * (discount_pct / 100)
     discounted_price = unit_price - discount_amount
     
-    logger.info(f"  💰 Discount {discount_pct}% applied to product {product_id} (qty: {quantity})")
+    line_logger.info("  💰 Discount %s%% applied to product %s (qty: %s)", discount_pct, product_id, quantity)
     
     return discounted_price, discount_pct
 
 
+def resolve_unit_prices(products):
+    """Fill in unit_price from the price table for lines that have none.
+
+    Returns (products, error); the caller's dicts are not modified.
+    """
+    unpriced = [
+        p.get('product_id') for p in products
+        if isinstance(p, dict) and 'unit_price' not in p
+    ]
+    if not unpriced:
+        return products, None
+    
+    prices = price_table.prices([pid for pid in unpriced if isinstance(pid, int)])
+    resolved = []
+    for idx, product in enumerate(products):
+        if not isinstance(product, dict) or 'unit_price' in product:
+            resolved.append(product)
+            continue
+        product_id = product.get('product_id')
+        if product_id not in prices:
+            return None, f'Unknown product {product_id} at index {idx}'
+        resolved.append(dict(product, unit_price=prices[product_id]))
+    return resolved, None
+
+
+def group_rules_by_product(pricing_rules):
+    rules_by_product = {}
+    for rule in pricing_rules:
+        rules_by_product.setdefault(rule['product_id'], []).append(rule)
+    return rules_by_product
+
+
+def price_cart(products, region, tax_rate, rules_by_product, log_lines=True):
+    """Price one cart with already loaded rules and tax rate.
+
+    Returns (pricing, error).
+    """
+    items_breakdown = []
+    subtotal = 0.0
+    total_discount = 0.0
+    
+    # Process each product
+    for idx, product in enumerate(products):
+        # Validate product data
+        if not isinstance(product, dict):
+            return None, f'Product at index {idx} is not a valid object'
+        
+        product_id = product.get('product_id')
+        quantity = product.get('quantity', 1)
+        unit_price = product.get('unit_price', 0.0)
+        
+        # Validation
+        if not product_id:
+            return None, f'Missing product_id at index {idx}'
+        
+        if not isinstance(quantity, (int, float)) or quantity <= 0:
+            return None, f'Invalid quantity for product {product_id}'
+        
+        if not isinstance(unit_price, (int, float)) or unit_price < 0:
+            return None, f'Invalid unit_price for product {product_id}'
+        
+        if log_lines:
+            line_logger.info("  🔸 Product ID: %s, Qty: %s, Price: %s", product_id, quantity, unit_price)
+        
+        # Apply discount (from pricing_rules table)
+        discounted_price, discount_pct = apply_discount(
+            product_id, quantity, unit_price, rules_by_product.get(product_id, [])
+        )
+        
+        # Calculate line total
+        line_total = discounted_price * quantity
+        item_discount = (unit_price - discounted_price) * quantity
+        
+        subtotal += line_total
+        total_discount += item_discount
+        
+        items_breakdown.append({
+            'product_id': product_id,
+            'quantity': quantity,
+            'unit_price': round(unit_price, 2),
+            'discounted_price': round(discounted_price, 2),
+            'discount_percentage': discount_pct,
+            'line_total': round(line_total, 2)
+        })
+        
+        if log_lines:
+            line_logger.info("  ✓ Line total: %.2f EGP", line_total)
+    
+    tax = subtotal * tax_rate
+    
+    # Calculate final total
+    total_amount = subtotal + tax
+    
+    return {
+        'subtotal': round(subtotal, 2),
+        'discount': round(total_discount, 2),
+        'tax': round(tax, 2),
+        'tax_rate': round(tax_rate * 100, 2),
+        'total_amount': round(total_amount, 2),
+        'region': region,
+        'items': items_breakdown,
+        'price_version': price_version(item_prices(items_breakdown))
+    }, None
+
+
 # ============================================================
 # API Endpoints
 # ============================================================
 
+# Rendered regions body and its ETag, so a revalidation is answered
+# without a query
+regions_cache = LRUCache(1, ttl=REGIONS_MAX_AGE)
+
+
 @app.route('/api/pricing/regions', methods=['GET'])
 def get_regions():
     """Get all regions with their tax rates from database"""
+    cached = regions_cache.get('regions')
+    if cached is not None:
+        etag, body = cached
+        return conditional(Response(body, mimetype='application/json'), REGIONS_CACHE_CONTROL, etag)
+    
     logger.info("🌍 GET /api/pricing/regions - Fetching from database")
     
     try:
-        conn = get_db_connection()
+        conn = read_router.connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -173,11 +367,14 @@ def get_regions():
         
         logger.info(f"✅ Found {len(regions)} regions in database")
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'total_regions': len(regions),
             'regions': regions
-        }), 200
+        })
+        etag = body_etag(response.get_data())
+        regions_cache.set('regions', (etag, response.get_data()))
+        return conditional(response, REGIONS_CACHE_CONTROL, etag)
         
     except Error as e:
         logger.error(f"❌ Database error: {e}")
@@ -212,69 +409,21 @@ def calculate_pricing():
         logger.info(f"📦 Processing {len(products)} products")
         logger.info(f"🌍 Region: {region}")
         
-        items_breakdown = []
-        subtotal = 0.0
-        total_discount = 0.0
-        
-        # Process each product
-        for idx, product in enumerate(products):
-            # Validate product data
-            if not isinstance(product, dict):
-                return jsonify({'error': f'Product at index {idx} is not a valid object'}), 400
-            
-            product_id = product.get('product_id')
-            quantity = product.get('quantity', 1)
-            unit_price = product.get('unit_price', 0.0)
-            
-            # Validation
-            if not product_id:
-                return jsonify({'error': f'Missing product_id at index {idx}'}), 400
-            
-            if not isinstance(quantity, (int, float)) or quantity <= 0:
-                return jsonify({'error': f'Invalid quantity for product {product_id}'}), 400
-            
-            if not isinstance(unit_price, (int, float)) or unit_price < 0:
-                return jsonify({'error': f'Invalid unit_price for product {product_id}'}), 400
-            
-            logger.info(f"\n  🔸 Product ID: {product_id}, Qty: {quantity}, Price: {unit_price}")
-            
-            # Apply discount (from pricing_rules table)
-            discounted_price, discount_pct = apply_discount(product_id, quantity, unit_price)
-            
-            # Calculate line total
-            line_total = discounted_price * quantity
-            item_discount = (unit_price - discounted_price) * quantity
-            
-            subtotal += line_total
-            total_discount += item_discount
-            
-            items_breakdown.append({
-                'product_id': product_id,
-                'quantity': quantity,
-                'unit_price': round(unit_price, 2),
-                'discounted_price': round(discounted_price, 2),
-                'discount_percentage': discount_pct,
-                'line_total': round(line_total, 2)
-            })
-            
-            logger.info(f"  ✓ Line total: {line_total:.2f} EGP")
+        products, error = resolve_unit_prices(products)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Get tax rate (from tax_rates table)
+        rules_by_product = group_rules_by_product(get_pricing_rules())
         tax_rate = get_tax_rate(region)
-        tax = subtotal * tax_rate
         
-        # Calculate final total
-        total_amount = subtotal + tax
+        response, error = price_cart(products, region, tax_rate, rules_by_product)
+        if error:
+            return jsonify({'error': error}), 400
         
-        response = {
-            'subtotal': round(subtotal, 2),
-            'discount': round(total_discount, 2),
-            'tax': round(tax, 2),
-            'tax_rate': round(tax_rate * 100, 2),
-            'total_amount': round(total_amount, 2),
-            'region': region,
-            'items': items_breakdown
-        }
+        subtotal = response['subtotal']
+        total_discount = response['discount']
+        tax = response['tax']
+        total_amount = response['total_amount']
         
         logger.info("\n" + "=" * 60)
         logger.info(f"📊 PRICING SUMMARY:")
@@ -295,6 +444,56 @@ def calculate_pricing():
         }), 500
 
 
+@app.route('/api/pricing/calculate-batch', methods=['POST'])
+def calculate_pricing_batch():
+    """Price many carts in one call.
+
+    Body: {"orders": [{"products": [...], "region": "Cairo"}, ...]}
+    Rules and tax rates are loaded once for the whole batch. Each cart gets
+    its own entry in ``results``, either pricing or an error.
+    """
+    logger.info("💰 POST /api/pricing/calculate-batch")
+    
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('orders'), list):
+            return jsonify({'error': 'orders must be a list'}), 400
+        
+        orders = data['orders']
+        if len(orders) > MAX_BATCH_ORDERS:
+            return jsonify({'error': f'At most {MAX_BATCH_ORDERS} orders per batch'}), 400
+        
+        rules_by_product = group_rules_by_product(get_pricing_rules())
+        tax_rates = get_tax_rates()
+        
+        results = []
+        for idx, order in enumerate(orders):
+            products = order.get('products') if isinstance(order, dict) else None
+            if not products or not isinstance(products, list):
+                results.append({'error': f'Order at index {idx} has no products'})
+                continue
+            
+            region = order.get('region', 'Cairo')
+            tax_rate = tax_rate_for(tax_rates, region)
+            products, error = resolve_unit_prices(products)
+            if error:
+                results.append({'error': error})
+                continue
+            pricing, error = price_cart(products, region, tax_rate, rules_by_product, log_lines=False)
+            results.append({'error': error} if error else pricing)
+        
+        logger.info(f"✅ Priced {len(orders)} carts")
+        return jsonify({'results': results}), 200
+        
+    except Exception as e:
+        logger.error(f"✗ Error in batch pricing: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Internal server error',
+            'details': str(e)
+        }), 500
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -305,6 +504,16 @@ def health_check():
     }), 200
 
 
+@app.route('/stats/read-routing', methods=['GET'])
+def read_routing_stats():
+    return jsonify(read_router.stats()), 200
+
+
+@app.route('/stats/price-table', methods=['GET'])
+def price_table_stats():
+    return jsonify(price_table.stats()), 200
+
+
 @app.route('/api/pricing/test', methods=['GET'])
 def test_endpoint():
     """Test endpoint to verify service is working"""
@@ -364,8 +573,4 @@ if __name__ == '__main__':
         logger.error("Service may not work properly!")
         logger.info("=" * 60)
     
-    app.run(
-        host='0.0.0.0',
-        port=5003,
-        debug=True
-    )
\ No newline at end of file
+    run_service(app, 'pricing', 5003)
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""Cached copy of the inventory price table.
+
+Lets the Pricing Service quote a cart from product ids alone, without the
+caller first asking the Inventory Service for prices. Once the copy is
+older than ``ttl`` seconds, one thread refreshes it while the others keep
+quoting from the previous copy.
+
+A refresh re-reads the rows whose ``last_updated`` is at most
+``max_transaction_seconds`` older than the database clock at the previous
+refresh. ``last_updated`` is the statement time, not the commit time, so
+a slow transaction can make a row visible long after the timestamp it
+carries, without moving ``MAX(last_updated)``; the window covers it. The
+whole table is read when the row count changes (a product was deleted),
+and every ``full_reload_interval`` seconds. Products added since the
+last refresh are read on demand.
+
+The table dict is never modified once published: refreshes and on-demand
+loads build a new one and swap it in.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+
+def to_float(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+class PriceTable:
+    """Unit prices by product id, refreshed every ``ttl`` seconds."""
+
+    def __init__(self, get_connection, ttl=5.0, max_transaction_seconds=60, full_reload_interval=300):
+        self.get_connection = get_connection
+        self.ttl = ttl
+        self.max_transaction_seconds = max_transaction_seconds
+        self.full_reload_interval = full_reload_interval
+        self._prices = None
+        self._row_count = None
+        self._polled_at = None
+        self._loaded_at = 0.0
+        self._full_at = 0.0
+        self._load_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self.loads = 0
+        self.version_checks = 0
+        self.rows_reloaded = 0
+        self.misses = 0
+
+    def prices(self, product_ids):
+        """Return {product_id: unit_price} for the ids that exist"""
+        table = self._current()
+        found = {pid: table[pid] for pid in product_ids if pid in table}
+        missing = [pid for pid in set(product_ids) if pid not in found]
+        if missing:
+            loaded = self._load(missing)
+            with self._swap_lock:
+                self.misses += len(missing)
+                if loaded:
+                    merged = dict(self._prices)
+                    merged.update(loaded)
+                    self._prices = merged
+            found.update(loaded)
+        return found
+
+    def _current(self):
+        if self._prices is None:
+            # Nothing to fall back on: every caller waits for the first load
+            with self._load_lock:
+                if self._prices is None:
+                    self._reload()
+        elif time.monotonic() - self._loaded_at > self.ttl:
+            if self._load_lock.acquire(blocking=False):
+                try:
+                    self._reload()
+                except Exception as e:
+                    # Keep quoting from the previous copy
+                    logger.error(f"❌ Failed to reload price table: {e}")
+                finally:
+                    self._load_lock.release()
+        return self._prices
+
+    def _reload(self):
+        started = time.monotonic()
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*), NOW() FROM inventory")
+            row_count, polled_at = cursor.fetchone()
+            self.version_checks += 1
+
+            full = (
+                self._prices is None
+                or row_count != self._row_count
+                or started - self._full_at >= self.full_reload_interval
+            )
+            if full:
+                cursor.execute("SELECT product_id, unit_price FROM inventory")
+                prices = {product_id: to_float(unit_price) for product_id, unit_price in cursor.fetchall()}
+                self._full_at = started
+                self.loads += 1
+                self.rows_reloaded += len(prices)
+                logger.info(f"✓ Price table loaded: {len(prices)} products")
+            else:
+                cursor.execute("""
+                    SELECT product_id, unit_price
+                    FROM inventory
+                    WHERE last_updated >= %s
+                """, (self._polled_at - timedelta(seconds=self.max_transaction_seconds),))
+                changed = cursor.fetchall()
+                prices = None
+                if changed:
+                    prices = dict(self._prices)
+                    for product_id, unit_price in changed:
+                        prices[product_id] = to_float(unit_price)
+                    self.rows_reloaded += len(changed)
+            cursor.close()
+        finally:
+            conn.close()
+        if prices is not None:
+            with self._swap_lock:
+                self._prices = prices
+        self._row_count = row_count
+        self._polled_at = polled_at
+        self._loaded_at = started
+
+    def _load(self, product_ids):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            if product_ids is None:
+                cursor.execute("SELECT product_id, unit_price FROM inventory")
+            else:
+                placeholders = ", ".join(["%s"] * len(product_ids))
+                cursor.execute(f"""
+                    SELECT product_id, unit_price
+                    FROM inventory
+                    WHERE product_id IN ({placeholders})
+                """, tuple(product_ids))
+            prices = {product_id: to_float(unit_price) for product_id, unit_price in cursor.fetchall()}
+            cursor.close()
+            return prices
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {
+            'products': len(self._prices) if self._prices is not None else 0,
+            'age_seconds': round(time.monotonic() - self._loaded_at, 3) if self._prices is not None else None,
+            'ttl': self.ttl,
+            'max_transaction_seconds': self.max_transaction_seconds,
+            'loads': self.loads,
+            'version_checks': self.version_checks,
+            'rows_reloaded': self.rows_reloaded,
+            'misses': self.misses
+        }
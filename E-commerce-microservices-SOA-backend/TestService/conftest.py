@@ -0,0 +1,10 @@
+# Unit tests import the shared package and the services' helper modules
+# the way the services do: from the backend root and the service folder.
+import os
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (BACKEND, os.path.join(BACKEND, 'OrderService'), os.path.join(BACKEND, 'InventoryService')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,127 @@
+"""Unit tests for common.breaker and the breaker rules of ServiceClient"""
+import time
+
+import pytest
+import requests
+
+from common.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from common.deadlines import deadline_scope
+from common.http_client import ServiceClient
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def tripped(reset_timeout=0.02, threshold=2):
+    breaker = CircuitBreaker('test', failure_threshold=threshold, reset_timeout=reset_timeout)
+    for _ in range(threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker('test', failure_threshold=3)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_half_open_probe_success_closes():
+    breaker = tripped()
+    time.sleep(0.03)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = tripped()
+    time.sleep(0.03)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.stats()['trips'] == 2
+
+
+def test_release_returns_the_probe_slot():
+    breaker = tripped()
+    time.sleep(0.03)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_own_deadline_504_counts_as_neither():
+    breaker = CircuitBreaker('test', failure_threshold=1)
+    assert not breaker.record_response(504, deadline_spent=True)
+    assert breaker.state == CLOSED
+    assert breaker.record_response(504)
+    assert breaker.state == OPEN
+
+
+def client_with(breaker, send):
+    client = ServiceClient('test', 'http://127.0.0.1:9', breaker=breaker)
+    client.session.request = send
+    return client
+
+
+def test_client_rejects_when_open():
+    client = client_with(tripped(reset_timeout=10), lambda *a, **k: Response(200))
+    with pytest.raises(CircuitOpenError):
+        client.get('/x')
+    assert client.stats()['rejected_by_breaker'] == 1
+
+
+def test_client_counts_5xx_and_connection_errors():
+    breaker = CircuitBreaker('test', failure_threshold=2)
+    client = client_with(breaker, lambda *a, **k: Response(503))
+    client.get('/x')
+
+    def refuse(*args, **kwargs):
+        raise requests.exceptions.ConnectionError('refused')
+
+    client.session.request = refuse
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get('/x')
+    assert breaker.state == OPEN
+
+
+def test_client_ignores_504_for_its_own_spent_deadline():
+    breaker = CircuitBreaker('test', failure_threshold=1)
+
+    def slow(*args, **kwargs):
+        time.sleep(0.03)
+        return Response(504)
+
+    client = client_with(breaker, slow)
+    with deadline_scope(0.01):
+        client.get('/x')
+    assert breaker.state == CLOSED
+
+
+def test_probe_raising_unexpectedly_frees_its_slot():
+    breaker = tripped()
+    time.sleep(0.03)
+
+    def broken(*args, **kwargs):
+        raise KeyError('bug')
+
+    client = client_with(breaker, broken)
+    with pytest.raises(KeyError):
+        client.get('/x')
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
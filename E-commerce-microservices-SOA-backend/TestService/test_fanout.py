@@ -0,0 +1,91 @@
+"""Unit tests for common.fanout"""
+import threading
+import time
+
+from common.deadlines import deadline_scope
+from common.fanout import fan_out
+
+
+def test_results_follow_item_order():
+    outcome = fan_out(lambda item: item * 2, [3, 1, 2], parallelism=3)
+    assert outcome.ok
+    assert outcome.results == [6, 2, 4]
+    assert outcome.completed == 3
+
+
+def test_parallelism_is_bounded():
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def work(item):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        return item
+
+    outcome = fan_out(work, range(10), parallelism=3)
+    assert outcome.ok
+    assert peak <= 3
+
+
+def test_stop_when_skips_items_not_started():
+    started = []
+
+    def work(item):
+        started.append(item)
+        return item
+
+    outcome = fan_out(work, range(20), parallelism=1, stop_when=lambda result: result == 2)
+    assert outcome.aborted
+    assert not outcome.ok
+    assert started == [0, 1, 2]
+    assert outcome.results[3:] == [None] * 17
+
+
+def test_first_error_stops_by_default():
+    def work(item):
+        if item == 1:
+            raise ValueError('boom')
+        return item
+
+    outcome = fan_out(work, range(5), parallelism=1)
+    assert outcome.aborted
+    assert isinstance(outcome.first_error(), ValueError)
+    assert outcome.results[:1] == [0]
+
+
+def test_errors_collected_without_stop_on_error():
+    def work(item):
+        if item % 2:
+            raise ValueError(item)
+        return item
+
+    outcome = fan_out(work, range(4), parallelism=2, stop_on_error=False)
+    assert not outcome.aborted
+    assert outcome.results == [0, None, 2, None]
+    assert [str(error) for error in outcome.errors if error] == ['1', '3']
+
+
+def test_deadline_drops_slow_items():
+    outcome = fan_out(lambda item: time.sleep(0.5), range(3), parallelism=3, deadline=0.05)
+    assert outcome.timed_out
+    assert outcome.completed == 0
+    assert outcome.elapsed < 0.4
+
+
+def test_request_deadline_caps_fan_out_deadline():
+    with deadline_scope(0.05):
+        outcome = fan_out(lambda item: time.sleep(0.5), [1], deadline=10)
+    assert outcome.timed_out
+    assert outcome.elapsed < 0.4
+
+
+def test_empty_input():
+    outcome = fan_out(lambda item: item, [])
+    assert outcome.ok
+    assert outcome.results == []
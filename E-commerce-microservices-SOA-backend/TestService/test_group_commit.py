@@ -0,0 +1,135 @@
+"""Unit tests for OrderService/group_commit.py (no database needed)"""
+import threading
+
+import pytest
+from mysql.connector import DatabaseError, IntegrityError, OperationalError, errorcode
+
+from group_commit import GroupCommitTimeout, GroupCommitWriter, aborts_transaction, run_jobs
+
+
+class FakeCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, fail_commit=False):
+        self.cursor_ = FakeCursor()
+        self.fail_commit = fail_commit
+        self.committed = False
+        self.rolled_back = False
+
+    def cursor(self):
+        return self.cursor_
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        if self.fail_commit:
+            raise OperationalError(msg='lost connection', errno=errorcode.CR_SERVER_LOST)
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        pass
+
+
+def test_failed_job_is_rolled_back_to_its_savepoint():
+    def bad(cursor):
+        raise IntegrityError(msg='fk', errno=errorcode.ER_NO_REFERENCED_ROW_2)
+
+    cursor = FakeCursor()
+    outcomes = run_jobs(cursor, [lambda c: 'a', bad, lambda c: 'c'])
+
+    assert [result for result, _ in outcomes] == ['a', None, 'c']
+    assert isinstance(outcomes[1][1], IntegrityError)
+    assert cursor.statements == [
+        'SAVEPOINT job_0', 'SAVEPOINT job_1', 'ROLLBACK TO SAVEPOINT job_1', 'SAVEPOINT job_2'
+    ]
+
+
+def test_non_database_error_fails_only_its_job():
+    def bad(cursor):
+        raise KeyError('total_amount')
+
+    outcomes = run_jobs(FakeCursor(), [bad, lambda c: 1])
+    assert isinstance(outcomes[0][1], KeyError)
+    assert outcomes[1] == (1, None)
+
+
+@pytest.mark.parametrize('error', [
+    DatabaseError(msg='deadlock', errno=errorcode.ER_LOCK_DEADLOCK),
+    DatabaseError(msg='lock wait', errno=errorcode.ER_LOCK_WAIT_TIMEOUT),
+    OperationalError(msg='gone', errno=errorcode.CR_SERVER_GONE_ERROR),
+])
+def test_transaction_errors_abort_the_batch(error):
+    def bad(cursor):
+        raise error
+
+    assert aborts_transaction(error)
+    with pytest.raises(type(error)):
+        run_jobs(FakeCursor(), [lambda c: 1, bad])
+
+
+def test_statement_errors_do_not_abort():
+    assert not aborts_transaction(IntegrityError(msg='dup', errno=errorcode.ER_DUP_ENTRY))
+
+
+def test_writer_commits_a_batch_once():
+    connections = []
+
+    def connect():
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    writer = GroupCommitWriter(connect, window=0.05, max_batch=8)
+    results = []
+    threads = [
+        threading.Thread(target=lambda n=n: results.append(writer.write(lambda c: n, timeout=5)))
+        for n in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert all(connection.committed for connection in connections)
+    assert writer.stats()['jobs'] == 4
+
+
+def test_commit_failure_fails_every_job_in_the_batch():
+    writer = GroupCommitWriter(lambda: FakeConnection(fail_commit=True), window=0.0)
+    with pytest.raises(OperationalError):
+        writer.write(lambda c: 1, timeout=5)
+    assert writer.stats()['failed_batches'] == 1
+
+
+def test_queued_job_is_cancelled_on_timeout():
+    release = threading.Event()
+
+    def slow(cursor):
+        release.wait(5)
+        return 'slow'
+
+    writer = GroupCommitWriter(lambda: FakeConnection(), window=0.0, max_batch=1)
+    first = writer.submit(slow)
+    ran = []
+    with pytest.raises(GroupCommitTimeout):
+        writer.write(lambda c: ran.append(1), timeout=0.05)
+    release.set()
+
+    assert first.result(timeout=5) == 'slow'
+    assert writer.stats()['cancelled_jobs'] == 1
+    # The writer skips the cancelled job instead of running it
+    assert writer.write(lambda c: 'next', timeout=5) == 'next'
+    assert ran == []
@@ -0,0 +1,181 @@
+"""Unit tests for OrderService/idempotency.py and common.cache.LRUCache"""
+import asyncio
+import json
+import threading
+import time
+
+from common.cache import LRUCache
+from idempotency import IdempotencyStore, allow_retry, request_fingerprint
+
+
+class MemoryStore(IdempotencyStore):
+    """IdempotencyStore with the order_requests table kept in a dict"""
+
+    def __init__(self, **kwargs):
+        super().__init__(lambda: None, **kwargs)
+        self.rows = {}
+        self.rows_lock = threading.Lock()
+
+    def _claim(self, key, fingerprint):
+        with self.rows_lock:
+            if key in self.rows:
+                return False
+            self.rows[key] = {'request_hash': fingerprint, 'status': 'in_progress'}
+            return True
+
+    def _complete(self, key, body, status):
+        self.rows[key].update(status='completed', response_code=status, response_body=json.dumps(body))
+
+    def _release(self, key):
+        self.rows.pop(key, None)
+
+    def _load(self, key):
+        row = self.rows.get(key)
+        return dict(row) if row else None
+
+
+def counting_handler(*responses):
+    calls = []
+
+    def handler(data):
+        calls.append(data)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    return handler, calls
+
+
+def test_repeat_is_replayed_without_running_again():
+    store = MemoryStore()
+    handler, calls = counting_handler(({'order_id': 7}, 201))
+
+    assert store.run('k', {'a': 1}, handler) == ({'order_id': 7}, 201, False)
+    assert store.run('k', {'a': 1}, handler) == ({'order_id': 7}, 201, True)
+    assert len(calls) == 1
+    assert store.rows['k']['status'] == 'completed'
+
+
+def test_other_body_with_same_key_is_rejected():
+    store = MemoryStore()
+    handler, calls = counting_handler(({'order_id': 7}, 201))
+    store.run('k', {'a': 1}, handler)
+
+    body, status, replayed = store.run('k', {'a': 2}, handler)
+    assert status == 422
+    assert not replayed
+    assert len(calls) == 1
+
+
+def test_server_errors_drop_the_claim():
+    store = MemoryStore()
+    handler, calls = counting_handler(({'error': 'Pricing service timeout'}, 504), ({'order_id': 1}, 201))
+
+    assert store.run('k', {'a': 1}, handler)[1] == 504
+    assert 'k' not in store.rows
+    assert store.run('k', {'a': 1}, handler)[1] == 201
+    assert len(calls) == 2
+
+
+def test_allow_retry_drops_a_client_error_claim():
+    store = MemoryStore()
+    calls = []
+
+    def handler(data):
+        calls.append(data)
+        if len(calls) == 1:
+            allow_retry()
+            return {'error': 'Prices changed during checkout, please retry'}, 409
+        return {'order_id': 1}, 201
+
+    assert store.run('k', {'a': 1}, handler)[1] == 409
+    assert store.run('k', {'a': 1}, handler) == ({'order_id': 1}, 201, False)
+
+
+def test_concurrent_duplicates_run_once():
+    store = MemoryStore()
+    calls = []
+
+    def handler(data):
+        calls.append(data)
+        time.sleep(0.05)
+        return {'order_id': 3}, 201
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(store.run('k', {'a': 1}, handler)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(replayed for _, _, replayed in results) == [False, True, True, True, True]
+
+
+def test_waits_for_a_claim_held_by_another_process():
+    store = MemoryStore(poll_interval=0.01)
+    fingerprint = request_fingerprint({'a': 1})
+    store.rows['k'] = {'request_hash': fingerprint, 'status': 'in_progress'}
+
+    def finish():
+        time.sleep(0.05)
+        store._complete('k', {'order_id': 9}, 201)
+
+    threading.Thread(target=finish).start()
+    assert store.run('k', {'a': 1}, None) == ({'order_id': 9}, 201, True)
+
+
+def test_async_duplicates_run_once():
+    store = MemoryStore()
+    calls = []
+
+    async def handler(data):
+        calls.append(data)
+        await asyncio.sleep(0.02)
+        return {'order_id': 4}, 201
+
+    async def run_blocking(fn, *args):
+        return fn(*args)
+
+    async def main():
+        return await asyncio.gather(*[
+            store.run_async('k', {'a': 1}, handler, run_blocking) for _ in range(5)
+        ])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(body == {'order_id': 4} for body, _, _ in results)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.evictions == 1
+
+
+def test_lru_entries_expire_after_ttl():
+    cache = LRUCache(ttl=0.02)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.03)
+    assert cache.get('a') is None
+    assert cache.expirations == 1
+
+
+def test_lru_byte_bound():
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.set('a', b'12345')
+    cache.set('b', b'12345')
+    cache.set('c', b'123')
+    assert cache.get('a') is None
+    assert cache.size_bytes == 8
+    # A value larger than the whole budget is not cached at all
+    cache.set('big', b'x' * 11)
+    assert cache.get('big') is None
+    assert cache.get('b') == b'12345'
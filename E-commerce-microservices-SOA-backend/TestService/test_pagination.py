@@ -0,0 +1,98 @@
+"""Unit tests for common.pagination and InventoryService/product_listing.py"""
+from decimal import Decimal
+
+import pytest
+
+from common.pagination import decode_cursor, encode_cursor, page, parse_fields, parse_page_size
+from product_listing import build_listing_query, matches, parse_after, parse_listing_filters
+
+
+def test_cursor_round_trip():
+    values = {'order_id': 42, 'created_at': '2026-01-01 10:00:00'}
+    token = encode_cursor(values)
+    assert '=' not in token
+    assert decode_cursor(token) == values
+
+
+@pytest.mark.parametrize('token', ['not a cursor!', 'eyJh', encode_cursor({'a': 1})[:-2] + '**'])
+def test_tampered_cursor_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def test_cursor_must_hold_an_object():
+    with pytest.raises(ValueError):
+        decode_cursor('WzFd')  # base64 of [1]
+
+
+def test_page_returns_next_cursor_only_when_more_rows():
+    rows = [{'id': n} for n in range(4)]
+    items, cursor = page(rows, 3, lambda row: {'id': row['id']})
+    assert items == rows[:3]
+    assert decode_cursor(cursor) == {'id': 2}
+    assert page(rows, 4, lambda row: row) == (rows, None)
+
+
+def test_page_size():
+    assert parse_page_size(None, 20, 100) == 20
+    assert parse_page_size('500', 20, 100) == 100
+    for value in ('0', '-1', 'ten'):
+        with pytest.raises(ValueError):
+            parse_page_size(value, 20, 100)
+
+
+def test_fields():
+    assert parse_fields('', ('a', 'b')) is None
+    assert parse_fields('b', ('a', 'b'), always=('a',)) == ['b', 'a']
+    with pytest.raises(ValueError):
+        parse_fields('a,c', ('a', 'b'))
+
+
+def test_listing_filters():
+    filters = parse_listing_filters({'in_stock': 'Yes', 'min_price': '1.5', 'max_price': '10'})
+    assert filters == {'in_stock': True, 'min_price': Decimal('1.5'), 'max_price': Decimal('10')}
+    assert parse_listing_filters({}) == {}
+
+
+@pytest.mark.parametrize('args', [
+    {'in_stock': 'maybe'},
+    {'min_price': 'abc'},
+    {'min_price': '-1'},
+    {'max_price': 'NaN'},
+    {'min_price': '5', 'max_price': '1'},
+])
+def test_invalid_listing_filters(args):
+    with pytest.raises(ValueError):
+        parse_listing_filters(args)
+
+
+def test_parse_after():
+    assert parse_after({'product_id': 12}) == 12
+    for values in ({}, {'product_id': '12'}, {'product_id': True}):
+        with pytest.raises(ValueError):
+            parse_after(values)
+
+
+def test_listing_query_page():
+    sql, params = build_listing_query('*', {'in_stock': False, 'max_price': Decimal('3')}, 10, 5)
+    assert 'product_id > %s' in sql
+    assert 'quantity_available - quantity_reserved <= 0' in sql
+    assert 'unit_price <= %s' in sql
+    assert 'LIMIT %s' in sql
+    assert params == [10, Decimal('3'), 6]
+
+
+def test_listing_query_without_limit():
+    sql, params = build_listing_query('*', {}, None, None)
+    assert 'WHERE' not in sql
+    assert 'LIMIT' not in sql
+    assert params == []
+
+
+def test_matches_cached_items():
+    item = {'available_to_promise': 0, 'unit_price': 5.0}
+    assert matches({}) is None
+    assert matches({'in_stock': False})(item)
+    assert not matches({'in_stock': True})(item)
+    assert not matches({'min_price': Decimal('6')})(item)
+    assert matches({'min_price': Decimal('5'), 'max_price': Decimal('5')})(item)
@@ -0,0 +1 @@
+"""Helpers shared by all the microservices."""
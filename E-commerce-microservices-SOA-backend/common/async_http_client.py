@@ -0,0 +1,204 @@
+"""Pooled asyncio HTTP clients for inter-service calls.
+
+The coroutine counterpart of ``common.http_client``: each destination gets
+one aiohttp session per process whose connector keeps up to
+``ASYNC_HTTP_POOL_SIZE`` keep-alive connections, however many coroutines
+are waiting on it. Calls share the destination's circuit breaker with the
+threaded client, are cut to the request deadline, carry trace context and
+are timed into the same metrics.
+
+Failures are raised as the usual ``requests`` exceptions (``Timeout``,
+``ConnectionError``, ``HTTPError`` from ``raise_for_status``), so callers
+classify them exactly as on the threaded path. Response bodies are read
+before the call returns.
+
+aiohttp is only needed by code that imports this module.
+"""
+import asyncio
+import json as jsonlib
+import time
+
+import aiohttp
+import requests
+
+from common.breaker import CircuitOpenError
+from common.config import env_float, env_int, service_url
+from common.deadlines import DeadlineExceeded, call_timeout, deadline_expired, outbound_headers
+from common.http_client import get_client
+from common.metrics import CLIENT_SECONDS, METRICS_ENABLED
+from common.tracing import TRACEPARENT_HEADER, start_span
+
+ASYNC_HTTP_POOL_SIZE = env_int('ASYNC_HTTP_POOL_SIZE', 100)
+ASYNC_HTTP_KEEPALIVE = env_float('ASYNC_HTTP_KEEPALIVE', 30)
+
+_clients = {}
+
+
+class AsyncResponse:
+    """A fully read response, shaped like the parts of
+    ``requests.Response`` the services use."""
+
+    def __init__(self, status_code, headers, content, url):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error for url: {self.url}", response=self
+            )
+
+
+class AsyncServiceClient:
+    """aiohttp client bound to one destination service.
+
+    Counters are only updated from the event loop, so they need no lock.
+    """
+
+    def __init__(self, name, base_url, pool_size=None, breaker=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size or ASYNC_HTTP_POOL_SIZE
+        self.breaker = breaker
+        self._session = None
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.rejected = 0
+        self.deadline_exceeded = 0
+
+    def _get_session(self):
+        # Created inside the running loop, on first use
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=ASYNC_HTTP_KEEPALIVE
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def request(self, method, path, enforce_deadline=True, timeout=None, json=None, headers=None):
+        """Send one request; same deadline and breaker rules as
+        ``ServiceClient.request``."""
+        with start_span(f"{method} {self.name}", 'client', {
+            'peer.service': self.name, 'http.method': method, 'http.target': path
+        }) as span:
+            response = await self._send(method, path, enforce_deadline, span, timeout, json, headers)
+            span.attributes['http.status_code'] = response.status_code
+            if response.status_code >= 500:
+                span.set_error(f"HTTP {response.status_code}")
+            return response
+
+    async def _send(self, method, path, enforce_deadline, span, timeout, json, headers):
+        outgoing = {}
+        if enforce_deadline:
+            try:
+                timeout = call_timeout(timeout)
+            except DeadlineExceeded:
+                self.deadline_exceeded += 1
+                raise
+            outgoing.update(outbound_headers())
+        if span.traceparent:
+            outgoing[TRACEPARENT_HEADER] = span.traceparent
+        outgoing.update(headers or {})
+
+        if self.breaker is not None and not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit for {self.name} service is open")
+
+        started = time.perf_counter()
+        outcome = 'error'
+        settled = False
+        try:
+            async with self._get_session().request(
+                method,
+                f"{self.base_url}{path}",
+                json=json,
+                headers=outgoing,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as raw:
+                content = await raw.read()
+                response = AsyncResponse(raw.status, raw.headers, content, str(raw.url))
+            outcome = f"{response.status_code // 100}xx"
+        except asyncio.TimeoutError as e:
+            self._record_failure()
+            settled = True
+            raise requests.exceptions.Timeout(f"{self.name} service timed out") from e
+        except aiohttp.ClientError as e:
+            self._record_failure()
+            settled = True
+            raise requests.exceptions.ConnectionError(f"{self.name} service: {e}") from e
+        else:
+            if self.breaker is not None:
+                settled = self.breaker.record_response(response.status_code, deadline_expired())
+            return response
+        finally:
+            if self.breaker is not None and not settled:
+                self.breaker.release()
+            elapsed = time.perf_counter() - started
+            if METRICS_ENABLED:
+                CLIENT_SECONDS.observe(elapsed, self.name, method, outcome)
+            self.requests += 1
+            self.total_latency += elapsed
+            self.max_latency = max(self.max_latency, elapsed)
+
+    def _record_failure(self):
+        self.errors += 1
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request('PUT', path, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def stats(self):
+        return {
+            'base_url': self.base_url,
+            'requests': self.requests,
+            'errors': self.errors,
+            'rejected_by_breaker': self.rejected,
+            'deadline_exceeded': self.deadline_exceeded,
+            'pool_size': self.pool_size,
+            'avg_latency_ms': round(self.total_latency / self.requests * 1000, 2) if self.requests else 0.0,
+            'max_latency_ms': round(self.max_latency * 1000, 2),
+            'breaker': self.breaker.stats() if self.breaker is not None else None
+        }
+
+
+def get_async_client(name):
+    """Return the shared async client for a destination service; it trips
+    together with the threaded client for the same destination."""
+    client = _clients.get(name)
+    if client is None:
+        client = AsyncServiceClient(name, service_url(name), breaker=get_client(name).breaker)
+        _clients[name] = client
+    return client
+
+
+async def close_async_clients():
+    for client in list(_clients.values()):
+        await client.close()
+
+
+def async_client_stats():
+    """Per-destination counters of the async clients."""
+    return {name: client.stats() for name, client in list(_clients.items())}
@@ -0,0 +1,113 @@
+"""Circuit breakers for inter-service calls.
+
+After ``failure_threshold`` consecutive failures (connection errors,
+timeouts or 5xx answers) a breaker opens and calls fail at once with
+``CircuitOpenError`` instead of tying up a request thread on a stalled
+service. After ``reset_timeout`` seconds it lets ``half_open_calls``
+probe requests through: a success closes it again, a failure re-opens it
+for another ``reset_timeout``.
+
+A 504 that comes back after the caller's own deadline has run out is the
+destination refusing a spent deadline, not a fault, so it counts as
+neither. A call that ends with neither outcome (that one, or an exception
+other than a ``requests`` error) gives its half-open probe slot back.
+"""
+import logging
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """The destination's breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with half-open probing."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=10.0, half_open_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self):
+        """Whether a call may go out now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self.probes = 0
+                logger.info(f"🟡 Circuit {self.name} half-open, probing")
+            if self.probes < self.half_open_calls:
+                self.probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                logger.info(f"🟢 Circuit {self.name} closed")
+
+    def record_response(self, status_code, deadline_spent=False):
+        """Record an answered call; False if it says nothing about the
+        destination (a 504 for the caller's own spent deadline)"""
+        if status_code == 504 and deadline_spent:
+            return False
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+        return True
+
+    def release(self):
+        """Give back the probe slot of a call that neither succeeded nor failed"""
+        with self._lock:
+            if self.state == HALF_OPEN and self.probes > 0:
+                self.probes -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                    self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                logger.warning(
+                    f"🔴 Circuit {self.name} opened after {self.failures} consecutive failures"
+                )
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout_seconds': self.reset_timeout,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'open_for_seconds': round(time.monotonic() - self.opened_at, 3)
+                if self.state != CLOSED else 0.0
+            }
@@ -0,0 +1,35 @@
+"""Environment-driven configuration shared by the services.
+
+Every value has a default that matches the single-host development setup,
+so the services still start with no environment at all.
+"""
+import os
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+SERVICE_URLS = {
+    'order': os.environ.get('ORDER_SERVICE_URL', 'http://localhost:5001'),
+    'inventory': os.environ.get('INVENTORY_SERVICE_URL', 'http://localhost:5002'),
+    'pricing': os.environ.get('PRICING_SERVICE_URL', 'http://localhost:5003'),
+    'customer': os.environ.get('CUSTOMER_SERVICE_URL', 'http://localhost:5004'),
+    'notification': os.environ.get('NOTIFICATION_SERVICE_URL', 'http://localhost:5005'),
+}
+
+
+def service_url(name):
+    """Base URL of another service, without a trailing slash."""
+    return SERVICE_URLS[name].rstrip('/')
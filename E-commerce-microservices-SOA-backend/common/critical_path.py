@@ -0,0 +1,155 @@
+"""Rebuild a request's critical path from exported spans.
+
+The critical path is the chain of spans that actually determined the
+request's latency: starting at the root, the child that finished last is
+what the parent waited on, then whatever finished before that child
+started, and so on. Each span on the path is reported with the time it
+alone accounts for (its duration minus the critical children's), which
+is where shaving time would shorten the request.
+
+Usage:
+    python -m common.critical_path [TRACE_ID] [--file traces.jsonl ...]
+    python -m common.critical_path TRACE_ID --collect
+
+Without a trace id the most recent trace in the files is used. --collect
+reads the spans from every service's GET /traces/<id> (TRACE_EXPORTER=memory)
+instead of from files.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.config import SERVICE_URLS
+
+# Span clocks come from different processes; a child may appear to end a
+# little after its parent
+CLOCK_TOLERANCE = 0.002
+
+
+def load_spans(paths, trace_id=None):
+    """Spans from JSON-lines files, for one trace or the most recent one"""
+    spans = []
+    for path in paths:
+        with open(path, encoding='utf-8') as source:
+            for line in source:
+                line = line.strip()
+                if line:
+                    spans.append(json.loads(line))
+    if trace_id is None:
+        roots = [s for s in spans if s['parent_id'] is None]
+        if not roots:
+            return None, []
+        trace_id = max(roots, key=lambda s: s['start'])['trace_id']
+    return trace_id, [s for s in spans if s['trace_id'] == trace_id]
+
+
+def collect_spans(trace_id, timeout=5):
+    """Spans of one trace from every service's in-memory exporter"""
+    import requests
+    spans = {}
+    for name, url in SERVICE_URLS.items():
+        try:
+            response = requests.get(f"{url}/traces/{trace_id}", timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            print(f"  ⚠️ {name}: {e}", file=sys.stderr)
+            continue
+        if response.status_code == 200:
+            for span in response.json().get('spans', []):
+                spans[span['span_id']] = span
+    return list(spans.values())
+
+
+def span_end(span):
+    return span['start'] + span['duration_ms'] / 1000.0
+
+
+def critical_path(span, children, depth=0):
+    """[(span, self_seconds, depth)] along the critical path under ``span``"""
+    start = span['start']
+    cursor = span_end(span)
+    below = []
+    for child in sorted(children.get(span['span_id'], []), key=span_end, reverse=True):
+        if cursor <= start:
+            break
+        if span_end(child) > cursor + CLOCK_TOLERANCE or child['start'] >= cursor:
+            # Ran alongside a child already on the path
+            continue
+        below = critical_path(child, children, depth + 1) + below
+        cursor = min(cursor, child['start'])
+    own = span['duration_ms'] / 1000.0 - sum(
+        entry[1] for entry in below
+    )
+    return [(span, max(0.0, own), depth)] + below
+
+
+def analyse(spans):
+    """Return (root, path) for a trace's spans"""
+    by_id = {span['span_id']: span for span in spans}
+    children = {}
+    roots = []
+    for span in spans:
+        if span['parent_id'] in by_id:
+            children.setdefault(span['parent_id'], []).append(span)
+        else:
+            roots.append(span)
+    if not roots:
+        return None, []
+    root = min(roots, key=lambda s: s['start'])
+    return root, critical_path(root, children)
+
+
+def report(trace_id, spans, out=sys.stdout):
+    root, path = analyse(spans)
+    if root is None:
+        print(f"No spans found for trace {trace_id}", file=out)
+        return 1
+
+    total = root['duration_ms']
+    print(f"Critical path of trace {trace_id}: {root['name']} ({root['service']}) {total:.1f} ms, "
+          f"{len(spans)} spans", file=out)
+    print(file=out)
+    for span, own, depth in path:
+        own_ms = own * 1000
+        share = own_ms / total * 100 if total else 0.0
+        flag = ' ❌' if span['status'] == 'error' else ''
+        label = f"{'  ' * depth}{span['name']}"
+        print(f"  {span['service']:<13} {label:<60} {span['duration_ms']:>9.1f} ms"
+              f"  self {own_ms:>8.1f} ms {share:5.1f}%{flag}", file=out)
+
+    by_service = {}
+    for span, own, _ in path:
+        by_service[span['service']] = by_service.get(span['service'], 0.0) + own * 1000
+    print(file=out)
+    print("Time on the critical path by service:", file=out)
+    for service, own_ms in sorted(by_service.items(), key=lambda item: -item[1]):
+        share = own_ms / total * 100 if total else 0.0
+        print(f"  {service:<13} {own_ms:>9.1f} ms {share:5.1f}%", file=out)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace_id', nargs='?')
+    parser.add_argument('--file', action='append', dest='files',
+                        help='JSON-lines span file (repeatable, default traces.jsonl)')
+    parser.add_argument('--collect', action='store_true',
+                        help="read spans from the services' /traces endpoints")
+    args = parser.parse_args(argv)
+
+    if args.collect:
+        if not args.trace_id:
+            parser.error('--collect needs a trace id')
+        trace_id, spans = args.trace_id, collect_spans(args.trace_id)
+    else:
+        trace_id, spans = load_spans(args.files or ['traces.jsonl'], args.trace_id)
+        if trace_id is None:
+            print("No traces found")
+            return 1
+    return report(trace_id, spans)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Request deadlines propagated across service hops.
+
+The entry point of a request sets a deadline; every outbound call made
+while handling it is cut to whatever time is left and carries the
+remainder in ``X-Request-Deadline-Ms``. The receiving service adopts that
+deadline for its own calls and answers 504 straight away when it arrives
+already spent, so no service keeps working for a caller that gave up.
+
+The header carries milliseconds left rather than a wall-clock instant, so
+the hosts' clocks need not agree. The deadline lives in a context
+variable; ``common.fanout`` copies it into its worker threads.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+from flask import jsonify, request
+
+DEADLINE_HEADER = 'X-Request-Deadline-Ms'
+
+_deadline = ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The request deadline passed before an outbound call could start."""
+
+
+def remaining():
+    """Seconds left before the current deadline, or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def deadline_expired():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def set_deadline(seconds):
+    """Set a deadline ``seconds`` from now; an earlier one is kept"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None and current < deadline:
+        deadline = current
+    return _deadline.set(deadline)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def call_timeout(budget):
+    """Timeout for one outbound call: its stage budget, cut to what is left"""
+    left = remaining()
+    if left is None:
+        return budget
+    if left <= 0:
+        raise DeadlineExceeded('Request deadline exceeded')
+    return left if budget is None else min(budget, left)
+
+
+def outbound_headers():
+    """Headers that hand the current deadline to the next service"""
+    left = remaining()
+    if left is None:
+        return {}
+    return {DEADLINE_HEADER: str(max(0, int(left * 1000)))}
+
+
+def install_deadline(app):
+    """Adopt the caller's deadline on every request to ``app``"""
+
+    @app.before_request
+    def adopt_deadline():
+        _deadline.set(None)
+        value = request.headers.get(DEADLINE_HEADER)
+        if value is None:
+            return None
+        try:
+            left_ms = float(value)
+        except ValueError:
+            return None
+        if left_ms <= 0:
+            return jsonify({'error': 'Request deadline exceeded'}), 504
+        set_deadline(left_ms / 1000.0)
+        return None
+
+    @app.teardown_request
+    def clear_deadline(exc):
+        _deadline.set(None)
@@ -0,0 +1,46 @@
+"""Conditional GET for read endpoints.
+
+ETags are strong. Endpoints served from a versioned source (the catalog
+cache) derive the tag from that version, the path and the normalized
+query string, and answer a matching ``If-None-Match`` with ``not_modified``
+before building the body. Other endpoints tag the exact response body,
+or pass a tag they already hold. Either way every worker and replica
+gives the same content the same tag, and any change to the content,
+which includes a product's ``last_updated``, gives a new one.
+"""
+import hashlib
+
+from flask import Response, request
+
+
+def body_etag(body):
+    """Strong entity tag of a response body (bytes)"""
+    return hashlib.sha1(body).hexdigest()
+
+
+def version_etag(version):
+    """Strong entity tag of the response to this request when built from
+    data at ``version``; query parameters are taken in sorted order"""
+    args = sorted(request.args.lists())
+    return hashlib.sha1(repr((version, request.path, args)).encode()).hexdigest()
+
+
+def not_modified(etag, cache_control):
+    """An empty 304 when the client's copy already has ``etag``, else None"""
+    if not request.if_none_match.contains(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def conditional(response, cache_control, etag=None):
+    """Tag a 200 response (with a digest of its body unless ``etag`` is
+    given), set its Cache-Control and answer 304 when the client's copy
+    is current"""
+    if response.status_code != 200:
+        return response
+    response.set_etag(etag or body_etag(response.get_data()))
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
@@ -0,0 +1,141 @@
+"""Bounded-concurrency fan-out for per-item inter-service calls.
+
+One process-wide thread pool is shared by every caller; each call to
+``fan_out`` limits how many of its own items run at once, stops at an
+overall deadline, and can stop early once one result settles the answer.
+Workers run in a copy of the caller's context, so the request deadline
+follows the calls, and the fan-out deadline never outlives it.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from common import deadlines
+
+FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', 32))
+FANOUT_PARALLELISM = int(os.environ.get('FANOUT_PARALLELISM', 8))
+FANOUT_DEADLINE = float(os.environ.get('FANOUT_DEADLINE', 30))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the shared thread pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=FANOUT_MAX_WORKERS,
+                    thread_name_prefix='fanout'
+                )
+    return _executor
+
+
+def _drop_inherited_executor():
+    # The pool's threads do not exist in a forked child
+    global _executor
+    _executor = None
+
+
+os.register_at_fork(after_in_child=_drop_inherited_executor)
+
+
+class FanOutResult:
+    """Outcome of a fan-out call.
+
+    ``results`` and ``errors`` are aligned with the input items; entries for
+    items that never finished stay ``None``.
+    """
+
+    def __init__(self, size):
+        self.results = [None] * size
+        self.errors = [None] * size
+        self.completed = 0
+        self.aborted = False
+        self.timed_out = False
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return not self.aborted and not self.timed_out and not any(self.errors)
+
+    def first_error(self):
+        for error in self.errors:
+            if error is not None:
+                return error
+        return None
+
+
+def fan_out(fn, items, parallelism=None, deadline=None, stop_when=None,
+            stop_on_error=True):
+    """Call ``fn(item)`` for every item with at most ``parallelism`` in flight.
+
+    - ``deadline``: seconds for the whole call; remaining items are dropped
+      and ``timed_out`` is set when it passes.
+    - ``stop_when(result)``: return True to stop early (e.g. an item is
+      short); items not yet started are never submitted.
+    - ``stop_on_error``: stop at the first exception raised by ``fn``.
+
+    Calls already running when the fan-out stops finish in the background;
+    their results are discarded.
+    """
+    items = list(items)
+    parallelism = max(1, parallelism or FANOUT_PARALLELISM)
+    deadline = FANOUT_DEADLINE if deadline is None else deadline
+    request_left = deadlines.remaining()
+    if request_left is not None:
+        deadline = min(deadline, max(0.0, request_left))
+    outcome = FanOutResult(len(items))
+    if not items:
+        return outcome
+
+    started = time.monotonic()
+    stop_at = started + deadline
+    executor = get_executor()
+    pending = {}
+    next_index = 0
+
+    def submit_more():
+        nonlocal next_index
+        while next_index < len(items) and len(pending) < parallelism:
+            context = contextvars.copy_context()
+            future = executor.submit(context.run, fn, items[next_index])
+            pending[future] = next_index
+            next_index += 1
+
+    submit_more()
+    while pending:
+        remaining = stop_at - time.monotonic()
+        if remaining <= 0:
+            outcome.timed_out = True
+            break
+
+        done, _ = wait(list(pending), timeout=remaining, return_when=FIRST_COMPLETED)
+        stop = False
+        for future in done:
+            index = pending.pop(future)
+            outcome.completed += 1
+            try:
+                outcome.results[index] = future.result()
+            except Exception as e:
+                outcome.errors[index] = e
+                if stop_on_error:
+                    stop = True
+                continue
+            if stop_when is not None and stop_when(outcome.results[index]):
+                stop = True
+
+        if stop:
+            outcome.aborted = True
+            break
+        submit_more()
+
+    for future in pending:
+        future.cancel()
+
+    outcome.elapsed = time.monotonic() - started
+    return outcome
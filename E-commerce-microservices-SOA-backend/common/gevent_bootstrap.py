@@ -0,0 +1,31 @@
+"""Entry point for the async (gevent) worker model.
+
+gevent has to patch the standard library before the service module
+creates its locks, queues and threads; objects built earlier stay real
+OS primitives and block the whole worker when waited on. ``run_service``
+re-executes the service through this module when the async model is
+asked for, so nothing is imported unpatched:
+
+    python -m common.gevent_bootstrap OrderService/app.py --worker-model async
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os  # noqa: E402
+import runpy  # noqa: E402
+import sys  # noqa: E402
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m common.gevent_bootstrap <service app.py> [options]")
+    path = os.path.abspath(sys.argv[1])
+    # As if the script had been run directly: its directory comes first
+    sys.argv = [path] + sys.argv[2:]
+    sys.path.insert(0, os.path.dirname(path))
+    runpy.run_path(path, run_name='__main__')
+
+
+if __name__ == '__main__':
+    main()
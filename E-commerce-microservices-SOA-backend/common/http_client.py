@@ -0,0 +1,204 @@
+"""Pooled keep-alive HTTP clients for inter-service calls.
+
+Each destination service gets one ``requests.Session`` whose connection
+pool is reused by every request thread, so a hop no longer pays for TCP
+setup or burns an ephemeral port per call. Calls raise the usual
+``requests`` exceptions, so existing error handling keeps working.
+
+Every client also has a circuit breaker and cuts each call's timeout to
+the current request deadline (see ``common.breaker`` and
+``common.deadlines``). Breaker settings can be overridden per destination,
+e.g. ``BREAKER_PRICING_FAILURE_THRESHOLD``.
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.breaker import CircuitBreaker, CircuitOpenError
+from common.config import env_float, env_int, service_url
+from common.deadlines import DeadlineExceeded, call_timeout, deadline_expired, outbound_headers
+from common.metrics import CLIENT_SECONDS, METRICS_ENABLED
+from common.tracing import TRACEPARENT_HEADER, start_span
+
+HTTP_POOL_CONNECTIONS = env_int('HTTP_POOL_CONNECTIONS', 4)
+HTTP_POOL_MAXSIZE = env_int('HTTP_POOL_MAXSIZE', 20)
+
+BREAKER_FAILURE_THRESHOLD = env_int('BREAKER_FAILURE_THRESHOLD', 5)
+BREAKER_RESET_TIMEOUT = env_float('BREAKER_RESET_TIMEOUT', 10)
+BREAKER_HALF_OPEN_CALLS = env_int('BREAKER_HALF_OPEN_CALLS', 1)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class ServiceClient:
+    """HTTP client bound to one destination service."""
+
+    def __init__(self, name, base_url, pool_connections=None, pool_maxsize=None, breaker=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Connection'] = 'keep-alive'
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections or HTTP_POOL_CONNECTIONS,
+            pool_maxsize=pool_maxsize or HTTP_POOL_MAXSIZE
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._adapter = adapter
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.breaker = breaker
+        self.rejected = 0
+        self.deadline_exceeded = 0
+
+    def request(self, method, path, enforce_deadline=True, **kwargs):
+        """Send one request.
+
+        Raises ``DeadlineExceeded`` when the request deadline has already
+        passed and ``CircuitOpenError`` when the breaker is open; neither
+        reaches the network. Pass ``enforce_deadline=False`` for calls that
+        must go out regardless, such as compensations.
+        """
+        with start_span(f"{method} {self.name}", 'client', {
+            'peer.service': self.name, 'http.method': method, 'http.target': path
+        }) as span:
+            response = self._send(method, path, enforce_deadline, span, kwargs)
+            span.attributes['http.status_code'] = response.status_code
+            if response.status_code >= 500:
+                span.set_error(f"HTTP {response.status_code}")
+            return response
+
+    def _send(self, method, path, enforce_deadline, span, kwargs):
+        headers = {}
+        if enforce_deadline:
+            try:
+                kwargs['timeout'] = call_timeout(kwargs.get('timeout'))
+            except DeadlineExceeded:
+                with self._lock:
+                    self.deadline_exceeded += 1
+                raise
+            headers.update(outbound_headers())
+        if span.traceparent:
+            headers[TRACEPARENT_HEADER] = span.traceparent
+        if headers:
+            headers.update(kwargs.get('headers') or {})
+            kwargs['headers'] = headers
+        
+        if self.breaker is not None and not self.breaker.allow():
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpenError(f"Circuit for {self.name} service is open")
+        
+        started = time.perf_counter()
+        outcome = 'error'
+        settled = False
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            outcome = f"{response.status_code // 100}xx"
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self.errors += 1
+            if self.breaker is not None:
+                self.breaker.record_failure()
+                settled = True
+            raise
+        else:
+            if self.breaker is not None:
+                settled = self.breaker.record_response(response.status_code, deadline_expired())
+            return response
+        finally:
+            if self.breaker is not None and not settled:
+                self.breaker.release()
+            elapsed = time.perf_counter() - started
+            if METRICS_ENABLED:
+                CLIENT_SECONDS.observe(elapsed, self.name, method, outcome)
+            with self._lock:
+                self.requests += 1
+                self.total_latency += elapsed
+                self.max_latency = max(self.max_latency, elapsed)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def stats(self):
+        # urllib3 counts new connections and requests per host pool; the
+        # difference is how many requests rode an existing connection.
+        connections = 0
+        pooled_requests = 0
+        for key in list(self._adapter.poolmanager.pools.keys()):
+            pool = self._adapter.poolmanager.pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+        with self._lock:
+            return {
+                'base_url': self.base_url,
+                'requests': self.requests,
+                'errors': self.errors,
+                'rejected_by_breaker': self.rejected,
+                'deadline_exceeded': self.deadline_exceeded,
+                'connections_opened': connections,
+                'connections_reused': max(0, pooled_requests - connections),
+                'avg_latency_ms': round(self.total_latency / self.requests * 1000, 2) if self.requests else 0.0,
+                'max_latency_ms': round(self.max_latency * 1000, 2),
+                'breaker': self.breaker.stats() if self.breaker is not None else None
+            }
+
+
+def make_breaker(name):
+    """Breaker for one destination, with per-destination env overrides"""
+    prefix = f"BREAKER_{name.upper()}_"
+    return CircuitBreaker(
+        name,
+        failure_threshold=env_int(prefix + 'FAILURE_THRESHOLD', BREAKER_FAILURE_THRESHOLD),
+        reset_timeout=env_float(prefix + 'RESET_TIMEOUT', BREAKER_RESET_TIMEOUT),
+        half_open_calls=env_int(prefix + 'HALF_OPEN_CALLS', BREAKER_HALF_OPEN_CALLS)
+    )
+
+
+def get_client(name):
+    """Return the shared client for a destination service."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = ServiceClient(name, service_url(name), breaker=make_breaker(name))
+                _clients[name] = client
+    return client
+
+
+def client_stats():
+    """Per-destination connection-reuse and latency counters."""
+    return {name: client.stats() for name, client in list(_clients.items())}
+
+
+def _drop_inherited_connections():
+    # Sockets opened before a fork would be shared with the parent
+    for client in list(_clients.values()):
+        client.session.close()
+
+
+os.register_at_fork(after_in_child=_drop_inherited_connections)
+
+
+def breaker_stats():
+    """Breaker state and trip counts per destination."""
+    return {
+        name: client.breaker.stats()
+        for name, client in list(_clients.items())
+        if client.breaker is not None
+    }
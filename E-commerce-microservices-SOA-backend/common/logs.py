@@ -0,0 +1,194 @@
+"""Asynchronous, structured, sampled logging for the services.
+
+``configure_logging(service)`` replaces ``logging.basicConfig``: request
+threads only put the record on a bounded queue and a background thread
+formats and writes it. Formatting (``msg % args``, JSON encoding, the
+traceback) happens on that thread, so hot paths should log with
+``%s``-style arguments rather than f-strings, and pass values that are
+not modified afterwards. When the queue is full records are dropped and
+counted instead of blocking the request.
+
+``LOG_FORMAT`` is ``json`` (one object per line, with the trace id when
+tracing is on) or ``text``. ``sampled_logger(name, rate)`` returns a
+logger for high-volume per-item messages that keeps only a fraction of
+its INFO/DEBUG records; rates can be overridden per logger with
+``LOG_SAMPLE_RATES="pricing.lines=0.01,notification.messages=0"``.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+
+from common import tracing
+from common.config import env_int
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').strip().lower()
+LOG_QUEUE_SIZE = env_int('LOG_QUEUE_SIZE', 10000)
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_service = {'name': 'unknown'}
+
+
+def parse_sample_rates(value):
+    rates = {}
+    for part in (value or '').split(','):
+        name, _, rate = part.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+LOG_SAMPLE_RATES = parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES'))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'service': _service['name'],
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id:
+            entry['trace_id'] = trace_id
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """Hands records to a writer thread without formatting them.
+
+    The writer thread is started on first use in each process, so the
+    handler survives a pre-fork server.
+    """
+
+    def __init__(self, target, maxsize):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # The stdlib version formats here, on the request thread
+        if tracing.TRACING_ENABLED and not hasattr(record, 'trace_id'):
+            span = tracing.current_span()
+            record.trace_id = span.trace_id if span is not None else None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start_writer()
+        super().emit(record)
+
+    def _start_writer(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.maxsize)
+            thread = threading.Thread(target=self._run, args=(self.queue,), name='log-writer', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def _run(self, records):
+        while True:
+            self._write(records.get())
+
+    def _write(self, record):
+        try:
+            self.target.handle(record)
+        except Exception:
+            self.target.handleError(record)
+
+    def flush(self):
+        """Write what is still queued (at exit)"""
+        while True:
+            try:
+                self._write(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self.target.flush()
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps ``rate`` of a logger's records below WARNING."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return self.rate > 0.0 and random.random() < self.rate
+
+
+_sampling_filters = {}
+_handler = None
+
+
+def sampled_logger(name, rate):
+    """Logger for per-item messages; ``LOG_SAMPLE_RATES`` overrides ``rate``"""
+    logger = logging.getLogger(name)
+    if name not in _sampling_filters:
+        _sampling_filters[name] = SamplingFilter(LOG_SAMPLE_RATES.get(name, rate))
+        logger.addFilter(_sampling_filters[name])
+    return logger
+
+
+def configure_logging(service, stream=None):
+    """Route every log record through the asynchronous handler"""
+    global _handler
+    _service['name'] = service
+
+    target = logging.StreamHandler(stream or sys.stderr)
+    if LOG_FORMAT == 'text':
+        target.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        target.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _handler = AsyncQueueHandler(target, LOG_QUEUE_SIZE)
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+
+    for name, rate in LOG_SAMPLE_RATES.items():
+        sampled_logger(name, rate)
+
+    atexit.register(_handler.flush)
+    return _handler
+
+
+def log_stats():
+    """Queue depth and dropped records of the async handler"""
+    if _handler is None:
+        return {'configured': False}
+    return {
+        'configured': True,
+        'format': LOG_FORMAT,
+        'queue_depth': _handler.queue.qsize(),
+        'queue_size': LOG_QUEUE_SIZE,
+        'dropped': _handler.dropped,
+        'sample_rates': {name: f.rate for name, f in sorted(_sampling_filters.items())}
+    }
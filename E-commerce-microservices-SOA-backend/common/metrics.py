@@ -0,0 +1,344 @@
+"""Prometheus metrics for the services, in the plain text exposition format.
+
+``install_metrics(app)`` adds ``GET /metrics`` and times every request by
+route; ``instrument_connection`` times SQL statements and commits (and
+opens a span for each when tracing is on, see ``common.tracing``);
+``common.http_client`` times outbound calls by destination; ``stage(name)``
+times one step of a multi-step handler such as create_order.
+
+Histograms keep per-bucket counts under one lock, so an observation is a
+few dict and list operations. With ``METRICS_ENABLED=false`` nothing is
+hooked into the app, connections are returned unwrapped and every timer
+is a shared no-op, so the instrumented code pays one attribute lookup.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+from common import tracing
+from common.config import env_bool
+
+METRICS_ENABLED = env_bool('METRICS_ENABLED', True)
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    """One metric family; samples are keyed by their label values."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}"
+        ]
+        with self._lock:
+            samples = list(self._values.items())
+        for labels, value in samples:
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_TIMER = _NoopTimer()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket counts (the last one is +Inf), sum, count
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[labels] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels):
+        """Context manager observing the duration of its block"""
+        if not METRICS_ENABLED:
+            return NOOP_TIMER
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}"
+        ]
+        with self._lock:
+            samples = [(labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items()]
+        for labels, (counts, total, count) in samples:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = format_labels(self.labelnames, labels, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {format_value(total)}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+def _reset_after_fork():
+    # A worker reports its own samples, not the ones the master made
+    # before forking
+    for metric in _registry:
+        metric._lock = threading.Lock()
+        metric._values = {}
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def render():
+    """All registered metrics in the Prometheus text format"""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ============================================================
+# Metrics shared by every service
+# ============================================================
+
+REQUEST_SECONDS = Histogram(
+    'http_server_request_duration_seconds',
+    'Time to serve a request, by route and status.',
+    ('method', 'route', 'status')
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_server_requests_in_flight',
+    'Requests being served right now, by route.',
+    ('route',)
+)
+CLIENT_SECONDS = Histogram(
+    'http_client_request_duration_seconds',
+    'Time of calls to other services, by destination and outcome.',
+    ('destination', 'method', 'outcome')
+)
+DB_SECONDS = Histogram(
+    'db_query_duration_seconds',
+    'Time to execute SQL statements and commits, by statement kind.',
+    ('operation',)
+)
+STAGE_SECONDS = Histogram(
+    'stage_duration_seconds',
+    'Time spent in each stage of multi-step handlers such as create_order.',
+    ('stage',)
+)
+
+
+class _StageSpan:
+    __slots__ = ('timer', 'span')
+
+    def __init__(self, timer, span):
+        self.timer = timer
+        self.span = span
+
+    def __enter__(self):
+        self.timer.__enter__()
+        self.span.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.span.__exit__(*exc)
+        self.timer.__exit__(*exc)
+        return False
+
+
+def stage(name):
+    """Time one stage, e.g. ``with stage('pricing'):``; also a span when
+    tracing is on"""
+    if not tracing.TRACING_ENABLED:
+        return STAGE_SECONDS.time(name)
+    return _StageSpan(STAGE_SECONDS.time(name), tracing.start_span(name))
+
+
+# ============================================================
+# Flask integration
+# ============================================================
+
+def install_metrics(app):
+    """Time every request to ``app`` and serve ``GET /metrics``"""
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        g.metrics_started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc(g.metrics_route)
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                request.method, g.metrics_route, str(response.status_code)
+            )
+        return response
+
+    @app.teardown_request
+    def end_request(exc):
+        route = g.pop('metrics_route', None)
+        if route is not None:
+            REQUESTS_IN_FLIGHT.dec(route)
+
+    def metrics_endpoint():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint, methods=['GET'])
+
+
+# ============================================================
+# Database timing
+# ============================================================
+
+STATEMENT_KINDS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'SAVEPOINT', 'RELEASE', 'ROLLBACK')
+
+
+def statement_kind(operation):
+    words = operation.split(None, 1)
+    kind = words[0].upper() if words else ''
+    return kind if kind in STATEMENT_KINDS else 'OTHER'
+
+
+class TimedCursor:
+    """Cursor wrapper timing execute/executemany; everything else passes through."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, *args, **kwargs):
+        kind = statement_kind(operation)
+        with DB_SECONDS.time(kind), tracing.db_span(kind, operation):
+            return self._cursor.execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        kind = statement_kind(operation)
+        with DB_SECONDS.time(kind), tracing.db_span(kind, operation):
+            return self._cursor.executemany(operation, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Connection wrapper handing out timed cursors and timing commits."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._connection.cursor(*args, **kwargs))
+
+    def commit(self):
+        with DB_SECONDS.time('COMMIT'), tracing.db_span('COMMIT', 'COMMIT'):
+            return self._connection.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def instrument_connection(connection):
+    """Wrap a DB connection for timing and SQL spans; unchanged when both
+    metrics and tracing are off"""
+    if not METRICS_ENABLED and not tracing.TRACING_ENABLED:
+        return connection
+    return TimedConnection(connection)
@@ -0,0 +1,67 @@
+"""Keyset (cursor) pagination helpers shared by the list endpoints.
+
+A cursor is the sort key of the last row of a page, serialized to an
+opaque URL-safe token. The next page is read with ``WHERE key < cursor``
+over an index, so every page costs the same however deep it is, unlike
+OFFSET which has to walk past every skipped row.
+"""
+import base64
+import binascii
+import json
+
+
+def encode_cursor(values):
+    """Turn a dict of sort-key values into an opaque token"""
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of ``encode_cursor``; raises ValueError on a bad token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, dict):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def parse_page_size(value, default, maximum):
+    """Page size from a query-string value, capped at ``maximum``"""
+    if value is None or value == '':
+        return default
+    try:
+        size = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if size < 1:
+        raise ValueError('limit must be at least 1')
+    return min(size, maximum)
+
+
+def parse_fields(value, allowed, always=()):
+    """Projection from a comma-separated ``fields=`` value.
+
+    Returns None when no projection was asked for. Fields in ``always``
+    are added because the caller needs them (e.g. for the cursor).
+    """
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    for field in always:
+        if field not in fields:
+            fields.append(field)
+    return fields
+
+
+def page(rows, limit, cursor_for):
+    """Split a ``limit + 1`` fetch into (rows, next_cursor)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(cursor_for(rows[-1]))
@@ -0,0 +1,22 @@
+"""Price versions shared by the Order and Pricing services.
+
+A price version is a short digest of the unit prices a step worked with,
+by product. Pricing quotes from its own cached copy of the price table
+while Order checks stock at the same time; when both report the same
+version they used the same prices, otherwise one of them was stale.
+"""
+import hashlib
+
+
+def price_version(prices):
+    """Digest of ``{product_id: unit_price}``, to the cent"""
+    canonical = ','.join(
+        f"{int(product_id)}:{float(price):.2f}"
+        for product_id, price in sorted(prices.items())
+    )
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+
+def item_prices(items):
+    """``{product_id: unit_price}`` of priced or checked cart lines"""
+    return {item['product_id']: item['unit_price'] for item in items}
@@ -0,0 +1,184 @@
+"""Serving entry point shared by the services.
+
+``run_service(app, name, port)`` replaces ``app.run(debug=True)`` in each
+service's ``__main__``. By default it serves through gunicorn with
+pre-forked worker processes:
+
+    python app.py --workers 8 --worker-model threaded --threads 16
+    python app.py --worker-model async          # gevent workers
+    python app.py --dev                         # Werkzeug debug server
+
+Every option also has an environment variable (``SERVE_WORKERS``,
+``SERVE_WORKER_MODEL``, ``SERVE_THREADS``, ``SERVE_HOST``,
+``SERVE_TIMEOUT``, ``SERVE_GRACEFUL_TIMEOUT``, ``SERVE_KEEPALIVE``,
+``SERVE_MAX_REQUESTS``, ``SERVE_DEV``); the command line wins.
+
+The async model needs gevent's monkey-patching before the service module
+is imported, so ``run_service`` re-executes the process through
+``common.gevent_bootstrap`` first (see there).
+
+The app is imported once in the master and then forked, so anything that
+owns sockets or threads must start in the worker: register it with
+``@after_fork`` (background relays, sweepers) and create connection pools
+lazily. ``@on_shutdown`` functions run when a worker exits; SIGTERM lets
+in-flight requests finish for up to the graceful timeout first.
+
+gunicorn (and gevent for the async model) are optional: without gunicorn
+the service falls back to one threaded Werkzeug process and says so.
+"""
+import argparse
+import atexit
+import logging
+import os
+import sys
+
+from common.config import env_bool, env_int
+
+logger = logging.getLogger(__name__)
+
+SERVE_HOST = os.environ.get('SERVE_HOST', '0.0.0.0')
+SERVE_WORKERS = env_int('SERVE_WORKERS', os.cpu_count() or 1)
+SERVE_WORKER_MODEL = os.environ.get('SERVE_WORKER_MODEL', 'threaded')
+SERVE_THREADS = env_int('SERVE_THREADS', 8)
+SERVE_TIMEOUT = env_int('SERVE_TIMEOUT', 60)
+SERVE_GRACEFUL_TIMEOUT = env_int('SERVE_GRACEFUL_TIMEOUT', 30)
+SERVE_KEEPALIVE = env_int('SERVE_KEEPALIVE', 5)
+SERVE_MAX_REQUESTS = env_int('SERVE_MAX_REQUESTS', 0)
+SERVE_DEV = env_bool('SERVE_DEV', False)
+
+# Worker model -> gunicorn worker class
+WORKER_CLASSES = {
+    'threaded': 'gthread',
+    'async': 'gevent',
+    'sync': 'sync'
+}
+
+_after_fork = []
+_on_shutdown = []
+
+
+def after_fork(fn):
+    """Run ``fn()`` in every worker process before it serves requests"""
+    _after_fork.append(fn)
+    return fn
+
+
+def on_shutdown(fn):
+    """Run ``fn()`` when a worker process exits"""
+    _on_shutdown.append(fn)
+    return fn
+
+
+def _run_hooks(hooks, stage):
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.error(f"❌ {stage} hook {hook.__name__} failed: {e}")
+
+
+def _gevent_patched():
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def _reexec_under_gevent(argv):
+    """Restart this service through ``common.gevent_bootstrap``"""
+    script = os.path.abspath(sys.modules['__main__'].__file__)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    os.execve(sys.executable, [
+        sys.executable, '-m', 'common.gevent_bootstrap', script
+    ] + list(sys.argv[1:] if argv is None else argv), env)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run the service')
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS,
+                        help='worker processes (default: SERVE_WORKERS or CPU count)')
+    parser.add_argument('--worker-model', choices=sorted(WORKER_CLASSES), default=SERVE_WORKER_MODEL,
+                        help='threaded (gthread), async (gevent) or sync')
+    parser.add_argument('--threads', type=int, default=SERVE_THREADS,
+                        help='threads per worker for the threaded model')
+    parser.add_argument('--host', default=SERVE_HOST)
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--dev', action='store_true', default=SERVE_DEV,
+                        help='single-process Werkzeug server with debugger and reloader')
+    return parser.parse_args(argv)
+
+
+def gunicorn_options(args, port):
+    options = {
+        'bind': f"{args.host}:{port}",
+        'workers': max(1, args.workers),
+        'worker_class': WORKER_CLASSES[args.worker_model],
+        'timeout': SERVE_TIMEOUT,
+        'graceful_timeout': SERVE_GRACEFUL_TIMEOUT,
+        'keepalive': SERVE_KEEPALIVE,
+        'max_requests': SERVE_MAX_REQUESTS,
+        'max_requests_jitter': SERVE_MAX_REQUESTS // 10,
+        'preload_app': True,
+        'post_fork': lambda server, worker: _run_hooks(_after_fork, 'post-fork'),
+        'worker_exit': lambda server, worker: _run_hooks(_on_shutdown, 'shutdown')
+    }
+    if args.worker_model == 'threaded':
+        options['threads'] = max(1, args.threads)
+    elif args.worker_model == 'async':
+        options['worker_connections'] = max(1, args.threads) * 100
+    return options
+
+
+def run_service(app, name, port, argv=None):
+    """Serve ``app`` as configured by the command line and environment"""
+    args = parse_args(argv)
+    port = args.port or port
+
+    if args.dev:
+        logger.info(f"🛠️  {name}: development server on port {port}")
+        _run_hooks(_after_fork, 'startup')
+        atexit.register(_run_hooks, _on_shutdown, 'shutdown')
+        app.run(host=args.host, port=port, debug=True)
+        return
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        logger.error("❌ gunicorn is not installed (pip install gunicorn); "
+                     "serving from a single threaded process instead")
+        _run_hooks(_after_fork, 'startup')
+        atexit.register(_run_hooks, _on_shutdown, 'shutdown')
+        app.run(host=args.host, port=port, debug=False, threaded=True)
+        return
+
+    class ServiceApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    if args.worker_model == 'async' and not _gevent_patched():
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            logger.error("❌ gevent is not installed (pip install gevent); "
+                         "using threaded workers instead")
+            args.worker_model = 'threaded'
+        else:
+            # Everything imported so far holds unpatched locks and queues
+            logger.info(f"🔁 {name}: restarting under gevent's monkey-patching")
+            _reexec_under_gevent(argv)
+
+    options = gunicorn_options(args, port)
+    logger.info(
+        f"🚀 {name}: {options['workers']} {args.worker_model} workers on {options['bind']}"
+        + (f", {options['threads']} threads each" if 'threads' in options else '')
+    )
+    ServiceApplication(app, options).run()
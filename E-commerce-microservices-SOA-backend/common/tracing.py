@@ -0,0 +1,347 @@
+"""Distributed tracing across the services.
+
+Trace context travels in the W3C ``traceparent`` header
+(``00-<trace id>-<parent span id>-<flags>``). ``install_tracing`` opens a
+server span for every request, continuing the caller's trace when the
+header is present; ``common.http_client`` opens a client span around every
+outbound call and sends its id on; ``common.metrics.instrument_connection``
+opens a span around every SQL statement made inside a traced request. The
+current span lives in a context variable, so ``common.fanout`` workers
+stay in the right trace.
+
+Finished spans go to the exporter picked by ``TRACE_EXPORTER``:
+
+* ``none`` (default): tracing is off and costs one flag check per call
+* ``file``: one JSON object per line appended to ``TRACE_FILE`` by a
+  background writer; every service may share the file
+* ``memory``: the last ``TRACE_MEMORY_SPANS`` spans kept in-process and
+  served at ``GET /traces`` and ``GET /traces/<trace_id>``
+
+``python -m common.critical_path`` rebuilds a request's critical path from
+either.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from flask import g, jsonify, request
+
+from common.config import env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'none').strip().lower()
+TRACE_FILE = os.environ.get('TRACE_FILE', 'traces.jsonl')
+TRACE_MEMORY_SPANS = env_int('TRACE_MEMORY_SPANS', 10000)
+TRACE_SAMPLE_RATE = env_float('TRACE_SAMPLE_RATE', 1.0)
+TRACING_ENABLED = TRACE_EXPORTER in ('file', 'memory')
+
+TRACEPARENT_HEADER = 'traceparent'
+MAX_STATEMENT_LENGTH = 300
+
+_current_span = ContextVar('current_span', default=None)
+_service = {'name': 'unknown'}
+
+
+def new_id(hex_digits):
+    return f"{random.getrandbits(hex_digits * 4):0{hex_digits}x}"
+
+
+def parse_traceparent(value):
+    """Return (trace_id, parent_id, sampled) or None for a malformed header"""
+    parts = value.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+# ============================================================
+# Spans
+# ============================================================
+
+class Span:
+    """One timed operation; finished spans are handed to the exporter."""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'sampled',
+                 'attributes', 'status', 'start', '_started', 'duration', '_token')
+
+    def __init__(self, name, kind, trace_id, parent_id, sampled, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = new_id(16)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.attributes = attributes or {}
+        self.status = 'ok'
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self._token = None
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_error(self, message):
+        self.status = 'error'
+        self.attributes['error'] = str(message)[:MAX_STATEMENT_LENGTH]
+
+    def finish(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if self.sampled:
+            export(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'service': _service['name'],
+            'name': self.name,
+            'kind': self.kind,
+            'start': self.start,
+            'duration_ms': round(self.duration * 1000, 3),
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and self.status == 'ok':
+            self.set_error(exc)
+        _current_span.reset(self._token)
+        self.finish()
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+    traceparent = None
+
+    @property
+    def attributes(self):
+        return {}
+
+    def set_error(self, message):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    return _current_span.get()
+
+
+def start_span(name, kind='internal', attributes=None):
+    """Span as a child of the current one, or the root of a new trace"""
+    if not TRACING_ENABLED:
+        return NOOP_SPAN
+    parent = _current_span.get()
+    if parent is None:
+        return Span(name, kind, new_id(32), None, random.random() < TRACE_SAMPLE_RATE, attributes)
+    return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled, attributes)
+
+
+def db_span(kind, operation):
+    """Span around one SQL statement of a traced request.
+
+    Statements outside a request (e.g. the outbox poller) are not traced,
+    so background loops do not flood the exporter with one-span traces.
+    """
+    if not TRACING_ENABLED or _current_span.get() is None:
+        return NOOP_SPAN
+    return start_span(
+        f"SQL {kind}", 'db',
+        {'db.statement': ' '.join(operation.split())[:MAX_STATEMENT_LENGTH]}
+    )
+
+
+# ============================================================
+# Exporters
+# ============================================================
+
+class FileExporter:
+    """Appends spans as JSON lines from a background thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def export(self, span):
+        # Started lazily, and again after a fork, since threads do not
+        # survive fork()
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+        self._queue.put(span.to_dict())
+
+    def _run(self):
+        spans = self._queue
+        while True:
+            batch = [spans.get()]
+            while True:
+                try:
+                    batch.append(spans.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        data = ''.join(json.dumps(span, separators=(',', ':')) + '\n' for span in batch)
+        try:
+            with open(self.path, 'a', encoding='utf-8') as out:
+                out.write(data)
+        except OSError as e:
+            logger.error(f"❌ Cannot write spans to {self.path}: {e}")
+
+    def flush(self):
+        """Write whatever is still queued (at exit)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+
+class MemoryExporter:
+    """Keeps the most recent spans in a ring buffer."""
+
+    def __init__(self, max_spans):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        record = span.to_dict()
+        with self._lock:
+            self._spans.append(record)
+
+    def trace(self, trace_id):
+        with self._lock:
+            return [span for span in self._spans if span['trace_id'] == trace_id]
+
+    def recent_traces(self, limit=50):
+        """Most recent root spans seen here, newest first"""
+        with self._lock:
+            spans = list(self._spans)
+        roots = [span for span in reversed(spans) if span['kind'] == 'server']
+        seen = set()
+        traces = []
+        for span in roots:
+            if span['trace_id'] in seen:
+                continue
+            seen.add(span['trace_id'])
+            traces.append({
+                'trace_id': span['trace_id'],
+                'name': span['name'],
+                'start': span['start'],
+                'duration_ms': span['duration_ms'],
+                'status': span['status']
+            })
+            if len(traces) >= limit:
+                break
+        return traces
+
+
+if TRACE_EXPORTER == 'file':
+    exporter = FileExporter(TRACE_FILE)
+    atexit.register(exporter.flush)
+elif TRACE_EXPORTER == 'memory':
+    exporter = MemoryExporter(TRACE_MEMORY_SPANS)
+else:
+    exporter = None
+
+
+def export(span):
+    if exporter is not None:
+        exporter.export(span)
+
+
+# ============================================================
+# Flask integration
+# ============================================================
+
+def install_tracing(app, service):
+    """Open a server span per request and, with the memory exporter, serve
+    ``GET /traces`` and ``GET /traces/<trace_id>``"""
+    _service['name'] = service
+    if not TRACING_ENABLED:
+        return
+
+    @app.before_request
+    def start_server_span():
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        attributes = {'http.method': request.method, 'http.target': request.full_path.rstrip('?')}
+        incoming = request.headers.get(TRACEPARENT_HEADER)
+        context = parse_traceparent(incoming) if incoming else None
+        if context is None:
+            span = start_span(f"{request.method} {route}", 'server', attributes)
+        else:
+            trace_id, parent_id, sampled = context
+            span = Span(f"{request.method} {route}", 'server', trace_id, parent_id, sampled, attributes)
+        _current_span.set(span)
+        g.trace_span = span
+
+    @app.after_request
+    def tag_response(response):
+        span = g.get('trace_span')
+        if span is not None:
+            span.attributes['http.status_code'] = response.status_code
+            if response.status_code >= 500:
+                span.status = 'error'
+            response.headers['X-Trace-Id'] = span.trace_id
+        return response
+
+    @app.teardown_request
+    def finish_server_span(exc):
+        span = g.pop('trace_span', None)
+        if span is not None:
+            if exc is not None:
+                span.set_error(exc)
+            span.finish()
+        _current_span.set(None)
+
+    if TRACE_EXPORTER == 'memory':
+        def list_traces():
+            return jsonify({'service': service, 'traces': exporter.recent_traces()}), 200
+
+        def get_trace(trace_id):
+            return jsonify({'service': service, 'trace_id': trace_id, 'spans': exporter.trace(trace_id)}), 200
+
+        app.add_url_rule('/traces', 'list_traces', list_traces, methods=['GET'])
+        app.add_url_rule('/traces/<trace_id>', 'get_trace', get_trace, methods=['GET'])
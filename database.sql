@@ -13,10 +13,15 @@ CREATE TABLE IF NOT EXISTS inventory (
     product_id INT PRIMARY KEY AUTO_INCREMENT,
     product_name VARCHAR(100) NOT NULL,
     quantity_available INT NOT NULL,
+    quantity_reserved INT NOT NULL DEFAULT 0,
     unit_price DECIMAL(10,2) NOT NULL,
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_product_name (product_name),
-    INDEX idx_quantity (quantity_available)
+    INDEX idx_quantity (quantity_available),
+    -- Catalog and price caches re-read rows with last_updated within
+    -- their longest transaction time of their previous refresh.
+    -- Existing databases: ALTER TABLE inventory ADD INDEX idx_last_updated (last_updated);
+    INDEX idx_last_updated (last_updated)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================================
@@ -45,10 +50,16 @@ CREATE TABLE IF NOT EXISTS orders (
     tax DECIMAL(10,2) NOT NULL,
     status VARCHAR(50) DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Checkout hold the stock came from; lets Inventory refuse to cancel
+    -- the reservation of an order that was placed.
+    -- Existing databases: ALTER TABLE orders ADD COLUMN reservation_id CHAR(32) NULL,
+    --                     ADD UNIQUE INDEX idx_reservation_id (reservation_id);
+    reservation_id CHAR(32) NULL,
     FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
     INDEX idx_customer_id (customer_id),
     INDEX idx_status (status),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    UNIQUE INDEX idx_reservation_id (reservation_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================================
@@ -102,11 +113,101 @@ CREATE TABLE IF NOT EXISTS notification_log (
     sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (order_id) REFERENCES orders(order_id),
     FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
+    -- One notification per order and type; redelivered events are skipped.
+    -- Existing databases: ALTER TABLE notification_log
+    --     ADD UNIQUE INDEX idx_order_notification (order_id, notification_type);
+    UNIQUE INDEX idx_order_notification (order_id, notification_type),
     INDEX idx_order_id (order_id),
     INDEX idx_customer_id (customer_id),
     INDEX idx_sent_at (sent_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- ============================================================
+-- Table 8: Order Outbox (side effects committed with the order)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS order_outbox (
+    outbox_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    order_id INT NOT NULL,
+    event_type VARCHAR(50) NOT NULL,
+    payload JSON NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP NULL,
+    FOREIGN KEY (order_id) REFERENCES orders(order_id) ON DELETE CASCADE,
+    INDEX idx_status_next_attempt (status, next_attempt_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ============================================================
+-- Table 9: Reservations (stock holds for checkout sessions)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS reservations (
+    reservation_id CHAR(32) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'active',
+    expires_at TIMESTAMP NOT NULL,
+    order_id INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    closed_at TIMESTAMP NULL,
+    INDEX idx_status_expires (status, expires_at),
+    -- The sweeper looks for committed reservations no order used.
+    -- Existing databases: ALTER TABLE reservations
+    --     ADD INDEX idx_status_order_closed (status, order_id, closed_at);
+    INDEX idx_status_order_closed (status, order_id, closed_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ============================================================
+-- Table 10: Reservation Items
+-- ============================================================
+CREATE TABLE IF NOT EXISTS reservation_items (
+    reservation_id CHAR(32) NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    PRIMARY KEY (reservation_id, product_id),
+    FOREIGN KEY (reservation_id) REFERENCES reservations(reservation_id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES inventory(product_id),
+    INDEX idx_product_id (product_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ============================================================
+-- Table 11: Order Requests (Idempotency-Key results)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS order_requests (
+    idempotency_key VARCHAR(100) PRIMARY KEY,
+    request_hash CHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'in_progress',
+    response_code INT NULL,
+    response_body MEDIUMTEXT NULL,
+    order_id INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ============================================================
+-- Table 12: Loyalty Ledger (points credited per order, once)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS loyalty_ledger (
+    order_id INT PRIMARY KEY,
+    customer_id INT NOT NULL,
+    points INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
+    INDEX idx_customer_id (customer_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ============================================================
+-- Table 13: Read Stickiness (read-your-writes across services)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS read_stickiness (
+    sticky_key VARCHAR(64) PRIMARY KEY,
+    primary_until TIMESTAMP(3) NOT NULL,
+    -- Every process re-reads the unexpired markers twice a second.
+    -- Existing databases: ALTER TABLE read_stickiness ADD INDEX idx_primary_until (primary_until);
+    INDEX idx_primary_until (primary_until)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- ============================================================
 -- Sample Data: Inventory
 -- ============================================================
@@ -225,6 +326,12 @@ Tables created:
   ✓ pricing_rules
   ✓ tax_rates
   ✓ notification_log
+  ✓ order_outbox
+  ✓ reservations
+  ✓ reservation_items
+  ✓ order_requests
+  ✓ loyalty_ledger
+  ✓ read_stickiness
 
 Sample data inserted:
   ✓ 10 products